@@ -1,7 +1,10 @@
 #!/usr/bin/env python
 
 from utility.common import print_warning
+from utility.process import run_process
+import os
 import re
+import functools
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -21,6 +24,8 @@ class Action(object):
         self.error = ''
         self.warnings = []
         self.build_meta = kwargs['build_meta'] if 'build_meta' in kwargs else None
+        # Prepended to the names of the logs of this action, so steps running at the same time don't share logs
+        self.log_prefix = kwargs['log_prefix'] if 'log_prefix' in kwargs else ''
 
     @staticmethod
     def get_arg_docs():
@@ -47,6 +52,29 @@ class Action(object):
         """
         return False
 
+    def plan(self):
+        """
+        Describe what run would do without doing any of it, for build plans (build_script.py --plan).
+        Only called once verify succeeded.
+        :return: Json serializable dict, actions launching tools list their command lines under "commands", each
+                 a list of the command and its arguments.
+        """
+        return {}
+
+    def run_tool(self, cmd, args, log_name, **kwargs):
+        """
+        Run a tool process for this action, streaming its output to the console and to a log file.
+        See utility.process.run_process for the supported keyword arguments.
+        :param cmd: The command to run
+        :param args: The arguments to pass to that command (a str list)
+        :param log_name: The name of the log file (without extension) to create in the projects logs folder
+        :return: ProcessResult of the run
+        """
+        log_path = ''
+        if self.config.logs_path != '':
+            log_path = os.path.join(self.config.logs_path, '{}{}.log'.format(self.log_prefix, log_name))
+        return run_process(cmd, args, log_path=log_path, **kwargs)
+
     def warning(self, msg):
         """
         Add a warning to output from this action. Prints the warning to screen and saves it for later summary.
@@ -64,21 +92,84 @@ class Action(object):
 
     @staticmethod
     def replace_tagged_sections(path, var_class):
-        re_exp = re.compile('({[0-9a-z_-]+})', re.IGNORECASE)
-        splits = re_exp.split(path)
-        path_out = path
-        if len(splits):
-            path_out = ''
-            for split in splits:
-                var_name = Action.replace_chars(['{', '}'], '', split)
-                if hasattr(var_class, var_name):
-                    path_out += getattr(var_class, var_name)
-                else:
-                    path_out += split
-        return path_out
+        return compile_tag_template(path).expand(var_class, {})
 
     def replace_tags(self, tagged_string):
-        tagged_string = Action.replace_tagged_sections(tagged_string, self.config)
-        if self.build_meta is not None:
-            tagged_string = Action.replace_tagged_sections(tagged_string, self.build_meta)
-        return tagged_string
+        return self.replace_tags_bulk([tagged_string])[0]
+
+    def replace_tags_in_value(self, value):
+        """
+        Replace the {tags} of every string in json like data, ex. the arguments of a step
+        :param value: A string, or lists and dicts of strings and other values
+        :return: A copy of the value with the tags of all its strings replaced
+        """
+        if isinstance(value, str):
+            return self.replace_tags(value)
+        if isinstance(value, list):
+            return [self.replace_tags_in_value(item) for item in value]
+        if isinstance(value, dict):
+            return {k: self.replace_tags_in_value(v) for k, v in value.items()}
+        return value
+
+    def replace_tags_bulk(self, tagged_strings):
+        """
+        Replace the {tags} of many strings, ex. thousands of paths, with values of the config and then the build meta.
+        Each tag is looked up once for all of the strings.
+        :param tagged_strings: The strings to replace tags in
+        :return: List of the strings with their tags replaced
+        """
+        var_classes = [self.config] if self.build_meta is None else [self.config, self.build_meta]
+        resolved_values = [{} for _ in var_classes]
+        strings_out = []
+        for tagged_string in tagged_strings:
+            for var_class, values in zip(var_classes, resolved_values):
+                if '{' not in tagged_string:
+                    break
+                tagged_string = compile_tag_template(tagged_string).expand(var_class, values)
+            strings_out.append(tagged_string)
+        return strings_out
+
+
+tag_pattern = re.compile('({[0-9a-z_-]+})', re.IGNORECASE)
+tag_not_found = object()
+tag_unresolved = object()
+
+
+class TagTemplate(object):
+    """
+    A string split into its literal text and {tags}, ready to have the tags replaced
+    """
+    def __init__(self, tagged_string):
+        splits = tag_pattern.split(tagged_string)
+        # Splitting on the capturing pattern alternates literal text and tags, starting and ending with literal text
+        self.literals = splits[0::2]
+        self.tags = splits[1::2]
+        self.tag_names = [tag[1:-1] for tag in self.tags]
+
+    def expand(self, var_class, resolved_values):
+        """
+        Replace the tags with attributes of a class, tags the class has no attribute for are left as they are
+        :param var_class: The object to read tag values from, ex. the config
+        :param resolved_values: Dict caching the values read from var_class, shared between expansions
+        :return: The expanded string
+        """
+        if not len(self.tags):
+            return self.literals[0]
+        parts = [self.literals[0]]
+        for tag, tag_name, literal in zip(self.tags, self.tag_names, self.literals[1:]):
+            value = resolved_values.get(tag_name, tag_unresolved)
+            if value is tag_unresolved:
+                value = getattr(var_class, tag_name, tag_not_found)
+                resolved_values[tag_name] = value
+            parts.append(tag if value is tag_not_found else str(value))
+            parts.append(literal)
+        return ''.join(parts)
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_tag_template(tagged_string):
+    """
+    :param tagged_string: A string containing {tags}
+    :return: The cached TagTemplate of the string
+    """
+    return TagTemplate(tagged_string)
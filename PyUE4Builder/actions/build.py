@@ -1,10 +1,9 @@
 #!/usr/bin/env python
 
 import os
-import stat
-import shutil
 from actions.action import Action
-from utility.common import get_visual_studio_version, launch, print_action
+from utility.common import get_visual_studio_version, print_action, print_action_info
+from utility.filesystem import delete_trees
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -21,13 +20,16 @@ class Build(Action):
         self.build_name = kwargs['build_name'] if 'build_name' in kwargs else ''
         self.build_names = kwargs['build_names'] if 'build_names' in kwargs else ''
         self.force_clean = kwargs["force_clean"] if "force_clean" in kwargs else False
+        self.batch = kwargs['batch'] if 'batch' in kwargs else config.batch_build_targets
 
     @staticmethod
     def get_arg_docs():
         return {
             'build_name': 'The name of the project to build.',
             'build_names': 'Same as build_name but accepts a list of builds',
-            'force_clean': 'Force this build/s to be cleaned, regardless of the global clean flag'
+            'force_clean': 'Force this build/s to be cleaned, regardless of the global clean flag',
+            'batch': '(optional) Build all targets in one UnrealBuildTool run. Defaults to the batch_build_targets '
+                     'configuration setting.'
         }
 
     def verify(self):
@@ -38,88 +40,200 @@ class Build(Action):
             return 'Cannot build "{}" because editor is running!'.format(self.build_name)
         return ''
 
-    def run(self):
+    def get_build_names(self):
+        build_names = []
         if len(self.build_name) != 0:
-            if not self.do_build(self.build_name):
-                return False
-
+            build_names.append(self.build_name)
         if len(self.build_names) != 0:
-            for build_name in self.build_names:
-                if not self.do_build(build_name):
-                    return False
+            build_names.extend(self.build_names)
+        return build_names
+
+    def should_batch_build(self, build_names):
+        return self.batch and len(build_names) > 1 and self.can_batch_build()
+
+    def run(self):
+        build_names = self.get_build_names()
+        if self.should_batch_build(build_names):
+            return self.do_batch_build(build_names)
+
+        for build_name in build_names:
+            if not self.do_build(build_name):
+                return False
         return True
 
-    def do_build(self, build_name):
+    def plan(self):
+        build_names = self.get_build_names()
+        should_clean = self.config.clean or self.force_clean
+        commands = []
+        clean_dirs = []
+        for build_name in build_names if should_clean else []:
+            if self.is_game_project(build_name):
+                clean_dirs.extend(self.get_intermediate_target_dirs(build_name))
+            else:
+                commands.append([self.config.UE4CleanBatchPath] + self.get_target_args(build_name) +
+                                self.get_common_args())
+        if self.should_batch_build(build_names):
+            commands.append([self.config.UE4BuildBatchPath] + self.get_batch_args(build_names))
+        else:
+            commands.extend([self.config.UE4BuildBatchPath] + self.get_target_args(build_name) +
+                            self.get_common_args() for build_name in build_names)
+        return {'commands': commands, 'clean_dirs': clean_dirs}
+
+    def can_batch_build(self):
+        """
+        :return: True if the engines UnrealBuildTool can build several targets in one run (-Target= arguments)
+        """
+        return self.config.engine_major_version > 4 or \
+            (self.config.engine_major_version == 4 and self.config.engine_minor_version >= 22)
+
+    def is_game_project(self, build_name):
         # If the build starts with the project name, we know this is a game project being built
-        is_game_project = build_name.startswith(self.config.uproject_name)
+        return build_name.startswith(self.config.uproject_name)
 
-        print_action('{} {}'.format('Building' if not self.config.clean else 'Cleaning', build_name))
+    def get_target_args(self, build_name):
+        """
+        :return: The UnrealBuildTool arguments selecting a target to build
+        """
+        target_args = [build_name, self.config.platform, self.config.configuration]
+        if self.is_game_project(build_name):
+            target_args.append(self.config.uproject_file_path)
+        return target_args
 
-        cmd_args = [build_name, self.config.platform, self.config.configuration]
-        if is_game_project:
-            cmd_args.append(self.config.uproject_file_path)
-        cmd_args += ['-NoHotReload', '-waitmutex']
+    def get_common_args(self):
+        """
+        :return: The UnrealBuildTool arguments which apply to every target
+        """
+        common_args = ['-NoHotReload', '-waitmutex']
         if self.config.engine_major_version == 4 and self.config.engine_minor_version <= 25:
-            cmd_args.append('-VS{}'.format(get_visual_studio_version(self.config.get_suitable_vs_versions())))
+            common_args.append('-VS{}'.format(get_visual_studio_version(self.config.get_suitable_vs_versions())))
         else:
             # Engine versions greater than 25 can determine visual studios location and will do it automatically.
             # We include -FromMsBuild which is common beyond version 25 but it is just a format specifier.
-            cmd_args.append('-FromMsBuild')
+            common_args.append('-FromMsBuild')
+        return common_args
+
+    def pre_clean(self, build_name):
+        """
+        Clean a target before it is built
+        :return: False if the clean failed, the reason is stored in self.error
+        """
+        if self.is_game_project(build_name):
+            return self.clean_game_project_folder(build_name)
+        cmd_args = self.get_target_args(build_name) + self.get_common_args()
+        result = self.run_tool(self.config.UE4CleanBatchPath, cmd_args, 'Clean-{}'.format(build_name))
+        if result.exit_code != 0:
+            self.error = 'Failed to clean project {}\n{}'.format(build_name, result.get_failure_summary())
+            return False
+        return True
+
+    def do_build(self, build_name, allow_clean=True):
+        print_action('{} {}'.format('Building' if not self.config.clean else 'Cleaning', build_name))
+
+        cmd_args = self.get_target_args(build_name) + self.get_common_args()
 
         # Do any pre cleaning
-        if self.config.clean or self.force_clean:
-            if is_game_project:
-                self.clean_game_project_folder()
-            else:
-                if launch(self.config.UE4CleanBatchPath, cmd_args) != 0:
-                    self.error = 'Failed to clean project {}'.format(build_name)
-                    return False
+        if allow_clean and (self.config.clean or self.force_clean):
+            if not self.pre_clean(build_name):
+                return False
 
         # Do the actual build
-        if launch(self.config.UE4BuildBatchPath, cmd_args) != 0:
-            self.error = 'Failed to build "{}"!'.format(build_name)
+        result = self.run_tool(self.config.UE4BuildBatchPath, cmd_args, 'Build-{}'.format(build_name))
+        if result.exit_code != 0:
+            self.error = 'Failed to build "{}"!\n{}'.format(build_name, result.get_failure_summary())
             return False
         return True
 
-    def clean_game_project_folder(self):
+    def get_batch_args(self, build_names):
+        """
+        :return: The UnrealBuildTool arguments building all of the targets in one run
+        """
+        cmd_args = []
+        for build_name in build_names:
+            target_args = self.get_target_args(build_name)
+            if self.is_game_project(build_name):
+                target_args[-1] = '-Project="{}"'.format(target_args[-1])
+            cmd_args.append('-Target={}'.format(' '.join(target_args)))
+        return cmd_args + self.get_common_args()
+
+    def do_batch_build(self, build_names):
+        """
+        Build several targets in a single UnrealBuildTool run, so its startup, makefile loading and dependency
+        scanning is only paid once.
+        """
+        print_action('{} {}'.format('Building' if not self.config.clean else 'Cleaning', ', '.join(build_names)))
+
+        if self.config.clean or self.force_clean:
+            for build_name in build_names:
+                if not self.pre_clean(build_name):
+                    return False
+
+        result = self.run_tool(self.config.UE4BuildBatchPath, self.get_batch_args(build_names), 'Build-Batch')
+        if result.exit_code == 0:
+            return True
+
+        # The output of a batched build doesn't say which target failed. Build the targets one at a time to find
+        # it, targets which did build are up to date and quickly skipped.
+        self.warning('Batched build of {} failed (exit code {}, log: {}), building the targets one at a time to '
+                     'find the failing target.'.format(', '.join(build_names), result.exit_code, result.log_path))
+        for build_name in build_names:
+            if not self.do_build(build_name, allow_clean=False):
+                return False
+        return True
+
+    def get_plugin_dirs(self):
+        """
+        Find the projects plugins. Plugins can be grouped into sub folders of the Plugins folder, any folder containing
+        a .uplugin file is a plugin and is not searched further.
+        :return: List of plugin directory paths
+        """
+        plugin_dirs = []
+        dirs_to_scan = [os.path.join(self.config.uproject_dir_path, 'Plugins')]
+        while dirs_to_scan:
+            dir_path = dirs_to_scan.pop()
+            try:
+                with os.scandir(dir_path) as it:
+                    entries = list(it)
+            except (FileNotFoundError, NotADirectoryError):
+                continue
+            if any(entry.name.endswith('.uplugin') and entry.is_file() for entry in entries):
+                plugin_dirs.append(dir_path)
+            else:
+                dirs_to_scan.extend(entry.path for entry in entries if entry.is_dir(follow_symlinks=False))
+        return plugin_dirs
+
+    def get_intermediate_target_dirs(self, build_name):
+        """
+        :param build_name: The game project target being cleaned
+        :return: The existing intermediate build directories of the target in the project and all its plugins
+        """
+        target_names = [build_name]
+        if build_name.endswith('Editor'):
+            target_names.append('UE4Editor' if self.config.engine_major_version < 5 else 'UnrealEditor')
+        target_dirs = []
+        for module_dir in [self.config.uproject_dir_path] + self.get_plugin_dirs():
+            platform_dir = os.path.join(module_dir, 'Intermediate', 'Build', self.config.platform)
+            for target_name in target_names:
+                target_dir = os.path.join(platform_dir, target_name)
+                if os.path.isdir(target_dir):
+                    target_dirs.append(target_dir)
+        return target_dirs
+
+    def clean_game_project_folder(self, build_name):
         """
         Backstory:
             We need to manually clean the game project folder because calling clean normally also forcibly cleans
             the engine which is always un-desirable since the engine would have been cleaned and re-built already
             prior to the game build step. This is an Unreal issue which I hope they resolve one day.
+        :param build_name: The game project target to clean
+        :return: False if the intermediates could not be deleted, the reason is stored in self.error
         """
-        # Kill the build directories
-        def on_rm_error(func, path, exc_info):
-            # path contains the path of the file that couldn't be removed
-            # let's just assume that it's read-only and unlink it.
-            del func  # Unused
-            if exc_info[0] is not FileNotFoundError:
-                os.chmod(path, stat.S_IWRITE)
-                os.unlink(path)
-
-        # First delete the intermediates of the game project
-        if self.build_name.endswith('Editor'):
-            shutil.rmtree(
-                os.path.join(self.config.uproject_dir_path,
-                             'Intermediate\\Build\\{}\\UE4Editor'.format(self.config.platform)),
-                onerror=on_rm_error)
-
-        shutil.rmtree(
-            os.path.join(self.config.uproject_dir_path,
-                         'Intermediate\\Build\\{}\\{}'.format(self.config.platform, self.build_name)),
-            onerror=on_rm_error)
-
-        # Traverse the plugins and delete the plugins intermediates as well
-        plugins_dir_path = os.path.join(self.config.uproject_dir_path, 'Plugins')
-        plugin_dirs = [os.path.join(self.config.uproject_dir_path, 'Plugins', plugin_dir)
-                       for plugin_dir in os.listdir(plugins_dir_path)]
-        for plugin_dir in plugin_dirs:
-            if self.build_name.endswith('Editor'):
-                shutil.rmtree(
-                    os.path.join(plugin_dir,
-                                 'Intermediate\\Build\\{}\\UE4Editor'.format(self.config.platform)),
-                    onerror=on_rm_error)
-            shutil.rmtree(
-                os.path.join(plugin_dir,
-                             'Intermediate\\Build\\{}\\{}'.format(self.config.platform, self.build_name)),
-                onerror=on_rm_error)
+        # Kill the build directories of the game project and all of its plugins at once
+        target_dirs = self.get_intermediate_target_dirs(build_name)
+        try:
+            files_deleted, bytes_freed = delete_trees(target_dirs)
+        except OSError as e:
+            self.error = 'Unable to clean the intermediates of "{}": {}'.format(build_name, e)
+            return False
+        print_action_info('Cleaned {} intermediate directories, {} files, {:.1f} MB freed'.format(
+            len(target_dirs), files_deleted, bytes_freed / (1024 * 1024)))
+        return True
@@ -1,10 +1,19 @@
 #!/usr/bin/env python
 
 from actions.action import Action
+from actions.registry import action_registry
 from utility.common import print_action
-import importlib
+import os
+import re
+import heapq
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from copy import deepcopy
 from build_meta import BuildMeta
+from utility.frozen import thaw
+from utility.conditions import compile_condition
+from utility.step_cache import StepCache
+from utility.trace import tracer
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -26,13 +35,22 @@ class Buildsteps(Action):
         self.steps_name = kwargs['steps_name'] if 'steps_name' in kwargs else ''
         self.push_meta = kwargs['push_meta'] if 'push_meta' in kwargs else {}
         self.complain_missing_step = kwargs['complain_missing_step'] if 'complain_missing_step' in kwargs else True
+        self.max_parallel_steps = kwargs['max_parallel_steps'] if 'max_parallel_steps' in kwargs \
+            else config.max_parallel_steps
+        # The persistent meta and the lock guarding it are shared with the sub build steps of steps, so steps
+        # running at the same time save each others meta instead of overwriting it
+        self.base_build_meta = kwargs['base_build_meta'] if 'base_build_meta' in kwargs else None
+        self.meta_lock = kwargs['meta_lock'] if 'meta_lock' in kwargs else threading.Lock()
+        self.step_cache = StepCache(config.step_cache_dir, config.step_cache_max_bytes)
 
     @staticmethod
     def get_arg_docs():
         return {
             'steps_name': 'The steps to perform, defined in the script',
             'push_meta': 'Pass a dict of meta overrides for these steps. Useful for specialization.',
-            'complain_missing_step': 'True if you would like the steps runner to complain about this step not existing.'
+            'complain_missing_step': 'True if you would like the steps runner to complain about this step not existing.',
+            'max_parallel_steps': 'Maximum steps to run at once when steps declare depends_on. '
+                                  '0 uses the number of CPUs.'
         }
 
     def verify(self):
@@ -40,11 +58,94 @@ class Buildsteps(Action):
             return 'Steps name is not set!'
         if self.steps_name not in self.config.script and self.complain_missing_step:
             return 'Invalid build steps name {}'.format(self.steps_name)
+        if self.steps_name in self.config.script:
+            _, dep_error = self.get_step_dependencies(self.config.script[self.steps_name])
+            if dep_error != '':
+                return dep_error
+            # Compile every condition up front so a broken one fails before any step runs
+            for index, step in enumerate(self.config.script[self.steps_name]):
+                if 'condition' in step:
+                    try:
+                        compile_condition(step['condition'])
+                    except ValueError as e:
+                        return 'Invalid condition of step ({}): {}'.format(self.get_step_id(step, index), e)
         return ''
 
-    def run(self):
-        base_build_meta = BuildMeta('project_build_meta')
-        build_meta = deepcopy(base_build_meta)
+    @staticmethod
+    def get_step_id(step, index):
+        """
+        Get the identifier other steps use to depend on this step
+        :param step: The step definition from the script
+        :param index: The index of the step within its steps list, used when no id or desc exists
+        :return: The step identifier
+        """
+        if 'id' in step:
+            return step['id']
+        if 'desc' in step:
+            return step['desc']
+        return '#{}'.format(index)
+
+    @staticmethod
+    def get_step_dependencies(steps):
+        """
+        Resolve the dependency graph of a list of steps.
+        Steps can declare "depends_on", a list of step ids (or descs) which must finish before the step can start.
+        An empty list means the step can start right away. In a steps list where any step declares "depends_on",
+        steps which do not declare it depend on the step listed before them, so ordering is kept unless asked otherwise.
+        :param steps: The steps list from the script
+        :return: (dependencies, error) where dependencies is a list of dependency index sets per step, or None if no
+                 step declares dependencies and the steps should simply run in order.
+        """
+        if not any('depends_on' in step for step in steps):
+            return None, ''
+
+        step_indices = {}
+        for index, step in enumerate(steps):
+            step_id = Buildsteps.get_step_id(step, index)
+            if step_id in step_indices:
+                step_indices[step_id] = None  # Ambiguous, only an error if something depends on it
+            else:
+                step_indices[step_id] = index
+
+        dependencies = []
+        for index, step in enumerate(steps):
+            if 'depends_on' not in step:
+                dependencies.append({index - 1} if index > 0 else set())
+                continue
+            depends_on = step['depends_on']
+            if isinstance(depends_on, str):
+                depends_on = [depends_on]
+            step_deps = set()
+            for dep_id in depends_on:
+                if dep_id not in step_indices:
+                    return None, 'Step ({}) depends on unknown step ({})'.format(
+                        Buildsteps.get_step_id(step, index), dep_id)
+                if step_indices[dep_id] is None:
+                    return None, 'Step ({}) depends on ({}) but more than one step has that id. ' \
+                                 'Give the steps a unique "id".'.format(Buildsteps.get_step_id(step, index), dep_id)
+                step_deps.add(step_indices[dep_id])
+            dependencies.append(step_deps)
+
+        # Make sure the graph can actually complete
+        remaining = [set(deps) for deps in dependencies]
+        resolved = set()
+        while len(resolved) != len(steps):
+            ready = [i for i in range(len(steps)) if i not in resolved and not (remaining[i] - resolved)]
+            if not ready:
+                cycle_ids = [Buildsteps.get_step_id(steps[i], i) for i in range(len(steps)) if i not in resolved]
+                return None, 'Step dependencies form a cycle between ({})'.format(', '.join(cycle_ids))
+            resolved.update(ready)
+        return dependencies, ''
+
+    def get_build_metas(self):
+        """
+        :return: (base_build_meta, build_meta) the persistent meta and the meta shared by the steps of this run
+        """
+        base_build_meta = self.base_build_meta
+        if base_build_meta is None:
+            base_build_meta = BuildMeta('project_build_meta')
+        with self.meta_lock:
+            build_meta = deepcopy(base_build_meta)
 
         # If this is a sub build steps, it continues the meta of the previous steps
         if self.build_meta is not None:
@@ -54,106 +155,168 @@ class Buildsteps(Action):
         # Push steps meta
         for k, v in self.push_meta.items():
             setattr(build_meta, k, v)
+        return base_build_meta, build_meta
 
+    def run(self):
+        base_build_meta, build_meta = self.get_build_metas()
         steps = self.config.script[self.steps_name]
-        for step in steps:
-            if "enabled" in step and step["enabled"] is False:
-                continue
+        dependencies, dep_error = self.get_step_dependencies(steps)
+        if dep_error != '':
+            self.error = dep_error
+            return False
 
-            # Check step conditions
-            # comma separated conditions using 'not' for negation.
-            # Conditions are vars found in meta or config, ex: "not automated, clean"
-            conditions_passed = True
-            cond_not_met = ''
-            if "condition" in step:
-                try:
-                    cond_splits = step["condition"].split(' ')
-                    cur_index = 0
-                    while cur_index < len(cond_splits):
-                        cond = True
-                        if cond_splits[cur_index] == 'not':
-                            cur_index += 1
-                            cond_to_check = cond_splits[cur_index]
-                            cond = False
-                        else:
-                            cond_to_check = cond_splits[cur_index]
-                        cond_to_check = cond_to_check.replace(',', '')
-
-                        # Get the attribute from either meta or config
-                        attr_to_test = None
-                        if hasattr(build_meta, cond_to_check):
-                            attr_to_test = getattr(build_meta, cond_to_check)
-                            if type(attr_to_test) is not bool:
-                                attr_to_test = None
-                        elif hasattr(self.config, cond_to_check):
-                            attr_to_test = getattr(self.config, cond_to_check)
-                            if type(attr_to_test) is not bool:
-                                attr_to_test = None
-
-                        # Test the attribute against our condition
-                        if attr_to_test is not None:
-                            if cond != attr_to_test:
-                                conditions_passed = False
-                                if cond:
-                                    cond_not_met = cond_to_check
-                                else:
-                                    cond_not_met = 'not {0}'.format(cond_to_check)
-                                break
-
-                        cur_index += 1
-                except Exception:
-                    self.error = 'Invalid conditional statement!'
-                    return False
-
-            if not conditions_passed:
-                step_name = 'unknown' if 'desc' not in step else step['desc']
-                self.warning('Skipping ({0}) step because condition ({1}) was not met'.format(step_name, cond_not_met))
-                continue
+        with tracer.span(self.steps_name, 'steps'):
+            if dependencies is None:
+                for index, step in enumerate(steps):
+                    step_error = self.run_step(step, index, build_meta, base_build_meta)
+                    if step_error != '':
+                        self.error = step_error
+                        return False
+                return True
+            return self.run_step_graph(steps, dependencies, build_meta, base_build_meta)
+
+    def run_step_graph(self, steps, dependencies, build_meta, base_build_meta):
+        """
+        Run steps as a dependency graph on a bounded pool of workers.
+        A step starts once every step it depends on has finished. If a step fails, no new steps are started and
+        the steps already running are waited on before returning.
+        :return: True if all steps completed successfully
+        """
+        max_workers = self.max_parallel_steps if self.max_parallel_steps > 0 else (os.cpu_count() or 1)
+        waiting_on = [set(deps) for deps in dependencies]
+        dependents = [[] for _ in steps]
+        for index, deps in enumerate(dependencies):
+            for dep in deps:
+                dependents[dep].append(index)
+
+        # Ready steps are started in script order
+        ready = [index for index, deps in enumerate(waiting_on) if not deps]
+        heapq.heapify(ready)
+        running = {}
+        trace_parent = tracer.current_span()
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            while ready or running:
+                while ready and self.error == '':
+                    index = heapq.heappop(ready)
+                    running[pool.submit(self.run_step, steps[index], index, build_meta, base_build_meta,
+                                        trace_parent, True)] = index
+                if not running:
+                    break
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    index = running.pop(future)
+                    step_error = future.result()
+                    if step_error != '':
+                        if self.error == '':
+                            self.error = step_error
+                        continue
+                    for dependent in dependents[index]:
+                        waiting_on[dependent].discard(index)
+                        if not waiting_on[dependent]:
+                            heapq.heappush(ready, dependent)
+        return self.error == ''
+
+    def check_conditions(self, step, build_meta):
+        """
+        Check step conditions
+        Conditions are vars found in meta or config combined with and, or, not, parentheses and comparisons,
+        ex: "not automated, clean" or "(platform == 'Win64' or platform == 'Linux') and engine_major_version >= 5".
+        Vars which don't exist are ignored. See utility.conditions for the details.
+        :raise ValueError: If the condition is invalid
+        :return: empty string if the conditions passed, the condition which was not met if not
+        """
+        if "condition" not in step:
+            return ''
+        # Vars are read from meta first, then config
+        return compile_condition(step["condition"]).check((build_meta, self.config))
+
+    def run_step(self, step, index, build_meta, base_build_meta, trace_parent=None, in_parallel=False):
+        """
+        Run a single step
+        :param step: The step definition from the script
+        :param index: The index of the step within its steps list
+        :param build_meta: The meta shared by the steps of this run
+        :param base_build_meta: The persistent meta saved beyond program scope
+        :param trace_parent: The trace span to record this step under, defaults to the current span of this thread
+        :param in_parallel: True if other steps may be running at the same time
+        :return: empty string if the step completed or was skipped, error string if not
+        """
+        if "enabled" in step and step["enabled"] is False:
+            return ''
+
+        try:
+            cond_not_met = self.check_conditions(step, build_meta)
+        except ValueError as e:
+            return 'Invalid conditional statement! {}'.format(e)
 
-            print_action('Performing un-described step' if 'desc' not in step else step['desc'])
+        if cond_not_met != '':
+            step_name = 'unknown' if 'desc' not in step else step['desc']
+            self.warning('Skipping ({0}) step because condition ({1}) was not met'.format(step_name, cond_not_met))
+            return ''
 
-            # Get the step class
-            step_module = importlib.import_module(step['action']['module'])
-            class_name = step['action']['module'].split('.')[-1]
-            action_class = getattr(step_module, class_name.title(), None)
-            if action_class is None:
-                self.error = 'action class ({}) could not be found!'.format(class_name.title())
-                return False
+        print_action('Performing un-described step' if 'desc' not in step else step['desc'])
+        step_name = step.get('desc', 'un-described step')
 
-            # Create kwargs of requested arguments
-            kwargs = {'build_meta': build_meta}
-            if 'args' in step['action']:
-                kwargs.update(step['action']['args'])
+        # Get the step class, action modules are imported on first use
+        step_module = action_registry.get_action_module(step['action']['module'])
+        action_class = action_registry.get_action_class(step['action']['module'])
+        if action_class is None:
+            return 'action class ({}) could not be found!'.format(
+                action_registry.get_class_name(step['action']['module']))
 
-            # Run the action
-            # We deep copy the configuration so it cannot be tampered with from inside the action.
-            b = action_class(deepcopy(self.config), **kwargs)
+        kwargs = self.get_action_kwargs(step, build_meta)
+
+        # Skip the step if it already completed successfully with the exact same inputs
+        fingerprint = ''
+        if step.get('cache', False) is not False and not self.config.clean:
+            fingerprint = self.get_step_fingerprint(step, step_module, kwargs, build_meta)
+            cached_result = self.step_cache.load_result(fingerprint)
+            if cached_result is not None:
+                print_action('Step inputs unchanged since last success, replaying cached result')
+                with self.meta_lock:
+                    if 'persist_meta' in cached_result:
+                        for k, v in cached_result['persist_meta'].items():
+                            setattr(base_build_meta, k, v)
+                            setattr(build_meta, k, v)
+                        base_build_meta.save_meta()
+                    for k, v in cached_result['push_meta'].items():
+                        setattr(build_meta, k, v)
+                return ''
+
+        # Run the action
+        # The action gets a copy on write view of the configuration so it cannot be tampered with from inside the
+        # action.
+        kwargs.update(self.get_run_kwargs(step, index, action_class, base_build_meta, in_parallel))
+        b = action_class(self.config.view(), **kwargs)
+        with tracer.span('{} (verify)'.format(step_name), 'verify', parent=trace_parent):
             verify_error = b.verify()
-            if verify_error != '':
-                if "allow_failure" in step and step["allow_failure"] is True:
-                    self.warning(verify_error)
-                    self.warning('Verification of this action failed. Skipping because of allow_failure flag.')
-                    continue
-                else:
-                    self.error = verify_error
-                    return False
-
-            if not b.run():
-                if "allow_failure" in step and step["allow_failure"] is True:
-                    self.warning(b.error)
-                    self.warning('Running of this action failed. Skipping because of allow_failure flag.')
-                    continue
-                else:
-                    self.error = b.error
-                    return False
+        if verify_error != '':
+            if "allow_failure" in step and step["allow_failure"] is True:
+                self.warning(verify_error)
+                self.warning('Verification of this action failed. Skipping because of allow_failure flag.')
+                return ''
+            return verify_error
+
+        with tracer.span(step_name, 'step', parent=trace_parent):
+            run_succeeded = b.run()
+        if not run_succeeded:
+            if "allow_failure" in step and step["allow_failure"] is True:
+                self.warning(b.error)
+                self.warning('Running of this action failed. Skipping because of allow_failure flag.')
+                return ''
+            return b.error
 
+        cached_result = {'push_meta': {}}
+        with self.meta_lock:
             # Persist meta updates globally (this persists meta beyond program scope)
             if 'persist_meta' in step['action']:
+                cached_result['persist_meta'] = {}
                 for k, v in step['action']['persist_meta'].items():
                     meta_item = getattr(b, v, None)
                     if meta_item is not None:
                         setattr(base_build_meta, k, meta_item)
                         setattr(build_meta, k, meta_item)
+                        cached_result['persist_meta'][k] = meta_item
                 base_build_meta.save_meta()
             # Push meta updates to local meta
             if 'push_meta' in step['action']:
@@ -161,4 +324,118 @@ class Buildsteps(Action):
                     meta_item = getattr(b, v, None)
                     if meta_item is not None:
                         setattr(build_meta, k, meta_item)
-        return True
+                        cached_result['push_meta'][k] = meta_item
+
+        if fingerprint != '' and not self.step_cache.save_result(fingerprint, cached_result):
+            self.warning('Unable to cache the result of this step, its meta could not be saved.')
+        return ''
+
+    def get_run_kwargs(self, step, index, action_class, base_build_meta, in_parallel):
+        """
+        The kwargs of a running step which are not arguments of the step, so they are not part of its fingerprint
+        """
+        run_kwargs = {}
+        if in_parallel or self.log_prefix != '':
+            step_id = re.sub(r'[^\w.-]+', '_', self.get_step_id(step, index))
+            run_kwargs['log_prefix'] = '{}{}-'.format(self.log_prefix, step_id)
+        if issubclass(action_class, Buildsteps):
+            run_kwargs.update(base_build_meta=base_build_meta, meta_lock=self.meta_lock)
+        return run_kwargs
+
+    @staticmethod
+    def get_action_kwargs(step, build_meta):
+        """
+        Create kwargs of requested arguments. The script is read only, actions get their own copy of their args.
+        """
+        kwargs = {'build_meta': build_meta}
+        if 'args' in step['action']:
+            kwargs.update(thaw(step['action']['args']))
+        return kwargs
+
+    def plan(self):
+        _, build_meta = self.get_build_metas()
+        steps = self.config.script[self.steps_name]
+        dependencies, _ = self.get_step_dependencies(steps)
+        step_plans = []
+        for index, step in enumerate(steps):
+            step_plan = self.plan_step(step, index, build_meta)
+            if dependencies is not None:
+                step_plan['depends_on'] = [self.get_step_id(steps[dep], dep) for dep in sorted(dependencies[index])]
+            step_plans.append(step_plan)
+        return {'steps_name': self.steps_name, 'steps': step_plans}
+
+    def plan_step(self, step, index, build_meta):
+        """
+        Resolve a step the way run_step would, without running it.
+        Meta the steps before it would push or persist is not known, conditions are checked against the meta as it
+        is before the steps run.
+        :return: Dict describing the step. Its "status" is one of disabled, skipped, cached, run, allowed_failure
+                 or error, errors are described by "error".
+        """
+        step_plan = {'id': self.get_step_id(step, index), 'desc': step.get('desc', '')}
+        if "enabled" in step and step["enabled"] is False:
+            step_plan['status'] = 'disabled'
+            return step_plan
+
+        try:
+            cond_not_met = self.check_conditions(step, build_meta)
+        except ValueError as e:
+            step_plan.update(status='error', error='Invalid conditional statement! {}'.format(e))
+            return step_plan
+        if cond_not_met != '':
+            step_plan.update(status='skipped', condition_not_met=cond_not_met)
+            return step_plan
+
+        if 'action' not in step or 'module' not in step['action']:
+            step_plan.update(status='error', error='Step has no action module!')
+            return step_plan
+        step_plan['module'] = step['action']['module']
+        try:
+            step_module = action_registry.get_action_module(step['action']['module'])
+            action_class = action_registry.get_action_class(step['action']['module'])
+        except ImportError as e:
+            step_plan.update(status='error', error='action module ({}) could not be imported: {}'.format(
+                step['action']['module'], e))
+            return step_plan
+        if action_class is None:
+            step_plan.update(status='error', error='action class ({}) could not be found!'.format(
+                action_registry.get_class_name(step['action']['module'])))
+            return step_plan
+
+        kwargs = self.get_action_kwargs(step, build_meta)
+        tagger = Action(self.config, build_meta=build_meta)
+        step_plan['args'] = tagger.replace_tags_in_value({k: v for k, v in kwargs.items() if k != 'build_meta'})
+
+        if step.get('cache', False) is not False and not self.config.clean:
+            fingerprint = self.get_step_fingerprint(step, step_module, kwargs, build_meta)
+            if self.step_cache.load_result(fingerprint) is not None:
+                step_plan['status'] = 'cached'
+                return step_plan
+
+        b = action_class(self.config.view(), **kwargs)
+        verify_error = b.verify()
+        if len(b.warnings):
+            step_plan['warnings'] = b.warnings
+        if verify_error != '':
+            allowed = "allow_failure" in step and step["allow_failure"] is True
+            step_plan.update(status='allowed_failure' if allowed else 'error', error=verify_error)
+            return step_plan
+        step_plan['status'] = 'run'
+        step_plan.update(b.plan())
+        return step_plan
+
+    def get_step_fingerprint(self, step, step_module, kwargs, build_meta):
+        """
+        Fingerprint a cached step from its action module, its arguments after tag replacement, the config fields it
+        depends on and the state of its declared input paths.
+        The step "cache" entry can be true, or a dict with "config_fields" and "inputs" (paths relative to the
+        project, tags are replaced).
+        :return: The fingerprint hex string
+        """
+        cache_settings = step['cache'] if isinstance(step['cache'], dict) else {}
+        tagger = Action(self.config, build_meta=build_meta)
+        resolved_kwargs = tagger.replace_tags_in_value({k: v for k, v in kwargs.items() if k != 'build_meta'})
+        input_paths = [os.path.join(self.config.uproject_dir_path, tagger.replace_tags(input_path))
+                       for input_path in cache_settings.get('inputs', [])]
+        return self.step_cache.get_fingerprint(step_module, resolved_kwargs, self.config,
+                                               cache_settings.get('config_fields', []), input_paths)
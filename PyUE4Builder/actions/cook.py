@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
 from actions.action import Action
-from utility.common import launch
 import os
 
 __author__ = "Ryan Sheffer"
@@ -38,12 +37,26 @@ class Cook(Action):
         return ''
 
     def run(self):
-        exe_path = 'UE4Editor-Win64-Debug-Cmd.exe' if self.config.debug else 'UE4Editor-Cmd.exe'
-        exe_path = os.path.join(self.config.UE4EnginePath, 'Engine/Binaries/Win64', exe_path)
+        exe_path = self.get_exe_path()
         if not os.path.isfile(exe_path):
             self.error = 'Unable to resolve path to unreal cmd "{}"'.format(exe_path)
             return False
 
+        result = self.run_tool(exe_path, self.get_cmd_args(), 'Cook-{}'.format(self.config.platform))
+        if result.exit_code != 0:
+            self.error = 'Unable to complete cook action. Check output.\n{}'.format(result.get_failure_summary())
+            return False
+
+        return True
+
+    def plan(self):
+        return {'commands': [[self.get_exe_path()] + self.get_cmd_args()]}
+
+    def get_exe_path(self):
+        exe_path = 'UE4Editor-Win64-Debug-Cmd.exe' if self.config.debug else 'UE4Editor-Cmd.exe'
+        return os.path.join(self.config.UE4EnginePath, 'Engine/Binaries/Win64', exe_path)
+
+    def get_cmd_args(self):
         # Cook command parameters
         cmd_args = ['-run=Cook']
 
@@ -65,9 +78,4 @@ class Cook(Action):
 
         if self.config.debug:
             cmd_args.append('-debug')
-
-        if launch(exe_path, cmd_args) != 0:
-            self.error = 'Unable to complete cook action. Check output.'
-            return False
-
-        return True
+        return cmd_args
@@ -1,10 +1,12 @@
 #!/usr/bin/env python
 
 from actions.action import Action
+from utility.common import print_action, print_action_info
+from utility.filesystem import scan_files, files_match, copy_file
+from concurrent.futures import ThreadPoolExecutor
 import os
-import contextlib
-import re
-import shutil
+import glob
+import time
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -14,35 +16,124 @@ __credits__ = ["Ryan Sheffer", "VREAL"]
 class Copy(Action):
     """
     Copy Action
-    An action designed to copy file/s as part of a build process.
-    TODO: Setup wildcard like copying? Take advantage of a copy module with a lot of options.
-    TODO: Have many copying options, like many files in a folder to another folder. Whole dir trees, etc.
+    An action designed to copy files, whole directory trees or glob matches as part of a build process.
+    Files are copied in parallel and files already matching their destination are skipped.
     """
+    link_modes = ['', 'hardlink', 'reflink']
+
     def __init__(self, config, **kwargs):
         super().__init__(config, **kwargs)
         self.copy_items = kwargs['copy'] if 'copy' in kwargs else []
+        self.max_parallel = kwargs['max_parallel'] if 'max_parallel' in kwargs else 0
+        self.skip_unchanged = kwargs['skip_unchanged'] if 'skip_unchanged' in kwargs else True
+        self.compare_hash = kwargs['compare_hash'] if 'compare_hash' in kwargs else False
+        self.link_mode = kwargs['link_mode'] if 'link_mode' in kwargs else ''
+
+    @staticmethod
+    def get_arg_docs():
+        return {
+            'copy': 'List of [source, destination] pairs. The source can be a file (destination is the file to '
+                    'create), a directory (its whole tree is copied into the destination directory) or a glob '
+                    'pattern like "Binaries/**/*.dll" (matches are copied into the destination directory, keeping '
+                    'their path relative to the non wildcard part of the pattern).',
+            'max_parallel': '(optional) The number of files to copy at the same time, 0 uses the number of CPUs',
+            'skip_unchanged': '(optional) Skip files whose destination has the same size and modified time. '
+                              'Defaults to true.',
+            'compare_hash': '(optional) Compare unchanged files by content hash instead of modified time',
+            'link_mode': '(optional) "hardlink" or "reflink" to link files instead of copying them when the source '
+                         'and destination are on the same filesystem. Hard linked files share their content, '
+                         'modifying one modifies the other!'
+        }
 
     def verify(self):
         if not len(self.copy_items):
             return 'No items to copy!'
+        if self.link_mode not in self.link_modes:
+            return 'Invalid link_mode "{}", expected one of {}'.format(self.link_mode, self.link_modes)
         for item in self.copy_items:
             if type(item) is not list or len(item) != 2:
                 return 'Invalid copy item found in copy list!'
 
-            item[0] = self.replace_tags(item[0])
-            item[1] = self.replace_tags(item[1])
-
-            if not os.path.isfile(item[0]):
+        item_paths = self.replace_tags_bulk([path for item in self.copy_items for path in item])
+        self.copy_items = [item_paths[index:index + 2] for index in range(0, len(item_paths), 2)]
+        for item in self.copy_items:
+            if glob.has_magic(item[0]):
+                if not len(glob.glob(item[0], recursive=True)):
+                    return 'Copy item ({}) matches no files!'.format(item[0])
+            elif not os.path.exists(item[0]):
                 return 'Copy item ({}) does not exist!'.format(item[0])
         return ''
 
+    @staticmethod
+    def get_glob_base(pattern):
+        """
+        :return: The leading directories of a glob pattern which contain no wildcards
+        """
+        base_parts = []
+        for part in os.path.normpath(pattern).split(os.sep):
+            if glob.has_magic(part):
+                break
+            base_parts.append(part)
+        return os.sep.join(base_parts)
+
+    def get_file_pairs(self, src, dst):
+        """
+        Expand a copy item into the files it copies
+        :param src: The source file, directory or glob pattern
+        :param dst: The destination
+        :return: Generator of (source file, destination file)
+        """
+        if glob.has_magic(src):
+            glob_base = self.get_glob_base(src)
+            for file_path in glob.iglob(src, recursive=True):
+                if os.path.isfile(file_path):
+                    yield file_path, os.path.join(dst, os.path.relpath(file_path, glob_base))
+        elif os.path.isdir(src):
+            for entry in scan_files(src):
+                yield entry.path, os.path.join(dst, os.path.relpath(entry.path, src))
+        else:
+            yield src, dst
+
+    def copy_file(self, file_pair):
+        """
+        Copy a single file unless it is unchanged
+        :return: 'skipped' or the way the file was placed, see utility.filesystem.copy_file
+        """
+        src, dst = file_pair
+        if self.skip_unchanged and files_match(src, dst, self.compare_hash):
+            return 'skipped'
+        return copy_file(src, dst, self.link_mode)
+
     def run(self):
+        start_time = time.perf_counter()
+        file_pairs = []
         for item in self.copy_items:
-            with contextlib.suppress(FileNotFoundError):
-                os.unlink(item[1])
-            os.makedirs(os.path.dirname(item[1]), exist_ok=True)
-            print('Copying {} to {}'.format(item[0], item[1]))
-            shutil.copy2(item[0], item[1])
+            print_action('Copying {} to {}'.format(item[0], item[1]))
+            file_pairs.extend(self.get_file_pairs(item[0], item[1]))
+
+        # Create the destination directories up front so the copy workers don't race creating them
+        for dst_dir in {os.path.dirname(dst) for _, dst in file_pairs}:
+            if dst_dir != '':
+                os.makedirs(dst_dir, exist_ok=True)
+
+        max_workers = self.max_parallel if self.max_parallel > 0 else (os.cpu_count() or 1)
+        results = {}
+        errors = []
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            futures = [(file_pair, pool.submit(self.copy_file, file_pair)) for file_pair in file_pairs]
+            for file_pair, future in futures:
+                try:
+                    result = future.result()
+                    results[result] = results.get(result, 0) + 1
+                except OSError as e:
+                    errors.append('Unable to copy {} to {}: {}'.format(file_pair[0], file_pair[1], e))
+
+        print_action_info('{} files in {:.1f}s: {}'.format(len(file_pairs), time.perf_counter() - start_time,
+                                                          ', '.join('{} {}'.format(count, result) for result, count
+                                                                    in sorted(results.items()))))
+        if len(errors):
+            self.error = '\n'.join(errors)
+            return False
         return True
 
 
@@ -1,9 +1,9 @@
 #!/usr/bin/env python
 
 from actions.action import Action
+from utility.common import print_action, print_action_info
+from utility.filesystem import delete_tree, remove_file, deferred_deletions
 import os
-import stat
-import shutil
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -19,41 +19,46 @@ class Delete(Action):
         super().__init__(config, **kwargs)
         self.paths = kwargs['paths'] if 'paths' in kwargs else []
         self.verify_exist = kwargs['verify_exist'] if 'verify_exist' in kwargs else False
+        self.max_parallel = kwargs['max_parallel'] if 'max_parallel' in kwargs else 0
+        self.background = kwargs['background'] if 'background' in kwargs else False
+
+    @staticmethod
+    def get_arg_docs():
+        return {
+            'paths': 'List of files and folders to delete',
+            'verify_exist': '(optional) Fail if a path does not exist',
+            'max_parallel': '(optional) The number of folders to delete files from at the same time, '
+                            '0 uses the number of CPUs',
+            'background': '(optional) Rename folders aside and delete them while the following steps run. '
+                          'The build waits for them to be deleted before it exits.'
+        }
 
     def verify(self):
         if not len(self.paths):
             return 'No deletion paths specified!'
-        updated_paths = []
-        for file_path in self.paths:
-            file_path = self.replace_tags(file_path)
-
-            if self.verify_exist and (not os.path.isdir(file_path) or not os.path.isfile(file_path)):
-                return 'Invalid deletion path specified : "{}"'.format(file_path)
-            updated_paths.append(file_path)
-        self.paths = updated_paths
+        self.paths = self.replace_tags_bulk(self.paths)
+        if self.verify_exist:
+            for file_path in self.paths:
+                if not os.path.exists(file_path):
+                    return 'Invalid deletion path specified : "{}"'.format(file_path)
         return ''
 
     def run(self):
         for file_path in self.paths:
             if os.path.isdir(file_path):
-                def on_rm_error(func, path, exc_info):
-                        # path contains the path of the file that couldn't be removed
-                        # let's just assume that it's read-only and unlink it.
-                        del func  # unused
-                        if exc_info[0] is not FileNotFoundError:
-                            os.chmod(path, stat.S_IWRITE)
-                            os.unlink(path)
-
                 try:
-                    shutil.rmtree(file_path, onerror=on_rm_error)
+                    if self.background:
+                        print_action('Deleting {} in the background'.format(file_path))
+                        deferred_deletions.delete_tree(file_path, self.max_parallel)
+                    else:
+                        print_action('Deleting {}'.format(file_path))
+                        files_deleted, bytes_freed = delete_tree(file_path, self.max_parallel)
+                        print_action_info('Deleted {} files, {:.1f} MB freed'.format(files_deleted,
+                                                                                     bytes_freed / (1024 * 1024)))
                 except Exception as e:
                     self.error = 'Unable to delete the directory: {}. Error: {}. ' \
                                  'Check that the files in the folder are not open / held by another process and try again.'.format(file_path, str(e))
                     return False
             elif os.path.isfile(file_path):
-                try:
-                    os.unlink(file_path)
-                except Exception:
-                    os.chmod(file_path, stat.S_IWRITE)
-                    os.unlink(file_path)
+                remove_file(file_path)
         return True
@@ -5,13 +5,25 @@ import os
 import stat
 import shutil
 import subprocess
-from utility.common import print_action, push_directory, launch
+import threading
+from utility.common import print_action
 import click
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
 __credits__ = ["Ryan Sheffer", "VREAL"]
 
+# Several repos can be synced at the same time (see actions.gitsync), only one may talk to the user at a time
+prompt_lock = threading.Lock()
+
+
+def confirm(msg, **kwargs):
+    """
+    click.confirm which waits for any other repo sync to finish prompting first
+    """
+    with prompt_lock:
+        return click.confirm(msg, **kwargs)
+
 
 class Git(Action):
     """
@@ -29,7 +41,30 @@ class Git(Action):
         self.force_repull = kwargs['force_repull'] if 'force_repull' in kwargs else False
         self.disable_strict_hostkey_check = \
             kwargs['disable_strict_hostkey_check'] if 'disable_strict_hostkey_check' in kwargs else False
+        self.depth = kwargs['depth'] if 'depth' in kwargs else 0
+        self.filter = kwargs['filter'] if 'filter' in kwargs else ''
+        self.single_branch = kwargs['single_branch'] if 'single_branch' in kwargs else False
+        self.sparse_paths = kwargs['sparse_paths'] if 'sparse_paths' in kwargs else []
         self.branch_switched = False
+        # If true, git output is only logged and not echoed to the console
+        self.quiet = False
+
+    @staticmethod
+    def get_arg_docs():
+        return {
+            'branch': 'The branch to sync',
+            'similar_branches': 'Branches which can be switched between without clobbering the repo',
+            'repo': 'The repo url to sync from',
+            'output_folder': 'The folder to sync the repo into, relative to the project',
+            'rsa_path': 'Path to an rsa key, relative to the project, used if no ssh credentials exist',
+            'force_repull': 'Delete the folder and sync the repo from scratch',
+            'disable_strict_hostkey_check': 'Trust github.com without prompting for host key checking',
+            'depth': '(optional) Only fetch this many commits of history when cloning. 0 fetches all history.',
+            'filter': '(optional) Partial clone filter, ex. "blob:none" fetches file contents only when checked out.',
+            'single_branch': '(optional) Only fetch the synced branch instead of every branch of the remote.',
+            'sparse_paths': '(optional) List of directories to check out (cone mode sparse checkout). '
+                            'Empty checks out everything.'
+        }
 
     def verify(self):
         if self.branch_name == '':
@@ -43,9 +78,36 @@ class Git(Action):
 
         return ''
 
+    def get_fetch_args(self):
+        """
+        :return: The git fetch arguments for the requested history depth and partial clone filter
+        """
+        fetch_args = []
+        if self.depth > 0:
+            fetch_args.append('--depth={}'.format(self.depth))
+        if self.filter != '':
+            fetch_args.append('--filter={}'.format(self.filter))
+        return fetch_args
+
+    def get_log_name(self, git_command):
+        """
+        :param git_command: The git command being run, ex. fetch
+        :return: The name of the log for a git command run on this actions repo
+        """
+        return 'Git-{}-{}'.format(os.path.basename(os.path.normpath(self.output_folder)), git_command)
+
+    def run_git(self, repo_dir, args, **kwargs):
+        """
+        Run a git command on a repo
+        :param repo_dir: The repo directory to run git in
+        :param args: The git arguments, the first is the git command
+        :return: ProcessResult of the run
+        """
+        return self.run_tool('git', args, self.get_log_name(args[0]), cwd=repo_dir, quiet=self.quiet, **kwargs)
+
     @staticmethod
-    def get_current_branch():
-        branches = subprocess.check_output(["git", "branch"]).decode("utf-8").splitlines()
+    def get_current_branch(repo_dir):
+        branches = subprocess.check_output(["git", "branch"], cwd=repo_dir).decode("utf-8").splitlines()
         for branch in branches:
             if branch.strip().startswith('*'):
                 return branch.replace('*', '', 1).strip()
@@ -53,22 +115,10 @@ class Git(Action):
 
     def run(self):
         if not self.config.automated:
-            # First make sure we actually have git credentials
-            ssh_path = os.path.join(os.environ['USERPROFILE'], '.ssh')
-            if not os.path.exists(ssh_path) and self.rsa_path != '':
-                rsa_file = os.path.join(self.config.uproject_dir_path, self.rsa_path)
-                if not os.path.isfile(rsa_file):
-                    self.error = 'No git credentials exists at rsa_path! ' \
-                                 'Check rsa_path is relative to the project path and exists.'
+            # Make sure repos synced at the same time don't race setting up the credentials
+            with prompt_lock:
+                if not self.setup_credentials():
                     return False
-                os.mkdir(ssh_path)
-                shutil.copy2(rsa_file, ssh_path)
-
-            # To get around the annoying user prompt, lets just set github to be trusted, no key checking
-            if self.disable_strict_hostkey_check:
-                if not os.path.isfile(os.path.join(ssh_path, 'config')):
-                    with open(os.path.join(ssh_path, 'config'), 'w') as fp:
-                        fp.write('Host github.com\nStrictHostKeyChecking no')
 
         output_dir = os.path.join(self.config.uproject_dir_path, self.output_folder)
 
@@ -77,46 +127,48 @@ class Git(Action):
         elif os.path.isdir(os.path.join(output_dir, '.git')):
             # check if the repo in the folder is on the correct branch. If not, delete the folder so we can
             # start over.
-            with push_directory(output_dir, False):
-                cur_branch = self.get_current_branch()
-                if cur_branch != self.branch_name:
-                    if cur_branch in self.similar_branches and self.branch_name in self.similar_branches:
-                        do_branch_switch = click.confirm('Branch mismatch but both branches are similar. '
-                                                         'Do branch switch? (If you have unsaved changes in this repo '
-                                                         'this will clobber them!)')
-                        if not do_branch_switch:
-                            self.error = 'Clean up your repo manually so a branch switch can be made.'
-                            return False
-                        err = launch('git', ['fetch', 'origin'])
-                        if err != 0:
-                            self.error = 'Git fetch failed...'
-                            return False
-                        # Cleanup before branch switch
-                        launch('git', ['checkout', '--', '*'])
-                        cmd_args = ['checkout', '-b', self.branch_name, 'origin/{}'.format(self.branch_name)]
-                        err = launch('git', cmd_args)
-                        if err != 0:
-                            ask_do_repull = click.confirm('Tried to switch branches but failed. '
-                                                          'Would you like to clobber and re-pull?')
-                            if ask_do_repull:
-                                self.force_repull = True
-                            else:
-                                self.error = 'Please correct the issue manually. Check the errors above for hints.'
-                                return False
-                        else:
-                            # Cleanup again just in case
-                            launch('git', ['checkout', '--', '*'])
-                            self.branch_switched = True
-                    else:
-                        ask_do_repull = click.confirm('Branch mismatch ("{}" should equal "{}"). Clobber this entire '
-                                                      'repo and do a re-pull?'.format(cur_branch,
-                                                                                      self.branch_name),
-                                                      default=False)
+            cur_branch = self.get_current_branch(output_dir)
+            if cur_branch != self.branch_name:
+                if cur_branch in self.similar_branches and self.branch_name in self.similar_branches:
+                    do_branch_switch = confirm('Branch mismatch in "{}" but both branches are similar. '
+                                               'Do branch switch? (If you have unsaved changes in this repo '
+                                               'this will clobber them!)'.format(self.output_folder))
+                    if not do_branch_switch:
+                        self.error = 'Clean up your repo manually so a branch switch can be made.'
+                        return False
+                    if self.single_branch:
+                        # Only the old branch is configured to be fetched
+                        self.run_git(output_dir, ['remote', 'set-branches', '--add', 'origin', self.branch_name])
+                    result = self.run_git(output_dir, ['fetch'] + self.get_fetch_args() + ['origin'])
+                    if result.exit_code != 0:
+                        self.error = 'Git fetch failed...\n{}'.format(result.get_failure_summary())
+                        return False
+                    # Cleanup before branch switch
+                    self.run_git(output_dir, ['checkout', '--', '*'])
+                    cmd_args = ['checkout', '-b', self.branch_name, 'origin/{}'.format(self.branch_name)]
+                    result = self.run_git(output_dir, cmd_args)
+                    if result.exit_code != 0:
+                        ask_do_repull = confirm('Tried to switch branches of "{}" but failed. '
+                                                'Would you like to clobber and re-pull?'.format(self.output_folder))
                         if ask_do_repull:
                             self.force_repull = True
                         else:
-                            self.error = 'Branch mismatch caused pull to be halted. Please correct the issue manually.'
+                            self.error = 'Please correct the issue manually. Check the errors above for hints.'
                             return False
+                    else:
+                        # Cleanup again just in case
+                        self.run_git(output_dir, ['checkout', '--', '*'])
+                        self.branch_switched = True
+                else:
+                    ask_do_repull = confirm('Branch mismatch in "{}" ("{}" should equal "{}"). Clobber this entire '
+                                            'repo and do a re-pull?'.format(self.output_folder, cur_branch,
+                                                                            self.branch_name),
+                                            default=False)
+                    if ask_do_repull:
+                        self.force_repull = True
+                    else:
+                        self.error = 'Branch mismatch caused pull to be halted. Please correct the issue manually.'
+                        return False
 
         if self.force_repull:
             print_action("Deleting the folder '{}' for a complete re-pull".format(self.output_folder))
@@ -139,35 +191,67 @@ class Git(Action):
             os.makedirs(output_dir)
 
         if not os.path.isdir(os.path.join(output_dir, '.git')):
-            with push_directory(output_dir, False):
-                print_action("Cloning from Git '{}' branch '{}'".format(self.repo_name, self.branch_name))
-                def check_launch(cmd, args, err):
-                    if launch(cmd, args) != 0:
-                        raise Exception(err)
-                # We allow git folders to already have content because the binary content might be stored on P4 or other and already be
-                # resident in the content folders.
-                # The steps below might seem unusual but is the only way to clone into a folder already containing content
-                try:
-                    check_launch('git', ['init'], 'Failed to init repo!')  # Init git for this folder
-                    check_launch('git', ['remote', 'add', 'origin', self.repo_name], 'Failed to add remote!')  # Add the remote to pull from
-                    check_launch('git', ['fetch'], 'Failed to fetch from remote!')  # Fetch the remote repo
-                    check_launch('git', ['branch', self.branch_name, 'origin/{}'.format(self.branch_name)], 'Failed to create new branch!')  # Create branch from origin
-                    check_launch('git', ['checkout', self.branch_name], 'Failed to checkout branch!')  # Checkout branch
-                except Exception as e:
-                    self.error = e
-                    return False
-                #cmd_args = ['clone', '-b', self.branch_name, self.repo_name, output_dir]
-                #err = launch('git', cmd_args)
-                #if err != 0:
-                #    self.error = 'Git clone failed!'
-                #    return False
+            print_action("Cloning from Git '{}' branch '{}'".format(self.repo_name, self.branch_name))
+            def check_launch(cmd, args, err):
+                result = self.run_git(output_dir, args)
+                if result.exit_code != 0:
+                    raise Exception('{}\n{}'.format(err, result.get_failure_summary()))
+            # We allow git folders to already have content because the binary content might be stored on P4 or other and already be
+            # resident in the content folders.
+            # The steps below might seem unusual but is the only way to clone into a folder already containing content
+            try:
+                check_launch('git', ['init'], 'Failed to init repo!')  # Init git for this folder
+                remote_args = ['remote', 'add']
+                if self.single_branch:
+                    remote_args.extend(['-t', self.branch_name])  # Only track the branch we sync
+                check_launch('git', remote_args + ['origin', self.repo_name], 'Failed to add remote!')  # Add the remote to pull from
+                if self.filter != '':
+                    # Mark the remote as a partial clone source so later fetches and checkouts use the filter
+                    check_launch('git', ['config', 'remote.origin.promisor', 'true'], 'Failed to configure remote!')
+                    check_launch('git', ['config', 'remote.origin.partialclonefilter', self.filter],
+                                 'Failed to configure remote!')
+                if len(self.sparse_paths):
+                    check_launch('git', ['sparse-checkout', 'set', '--cone'] + list(self.sparse_paths),
+                                 'Failed to setup sparse checkout!')
+                check_launch('git', ['fetch'] + self.get_fetch_args(), 'Failed to fetch from remote!')  # Fetch the remote repo
+                check_launch('git', ['branch', self.branch_name, 'origin/{}'.format(self.branch_name)], 'Failed to create new branch!')  # Create branch from origin
+                check_launch('git', ['checkout', self.branch_name], 'Failed to checkout branch!')  # Checkout branch
+            except Exception as e:
+                self.error = e
+                return False
+            #cmd_args = ['clone', '-b', self.branch_name, self.repo_name, output_dir]
+            #err = launch('git', cmd_args)
+            #if err != 0:
+            #    self.error = 'Git clone failed!'
+            #    return False
         else:
-            with push_directory(output_dir, False):
-                print_action("Pulling from Git '{}' branch '{}'".format(self.repo_name, self.branch_name))
-                err = launch('git', ['pull', 'origin', self.branch_name], silent=True)
-                if err != 0:
-                    self.error = 'Git pull failed!'
-                    return False
+            print_action("Pulling from Git '{}' branch '{}'".format(self.repo_name, self.branch_name))
+            result = self.run_git(output_dir, ['pull', 'origin', self.branch_name], silent=True)
+            if result.exit_code != 0:
+                self.error = 'Git pull failed!\n{}'.format(result.get_failure_summary())
+                return False
+        return True
+
+    def setup_credentials(self):
+        """
+        Make sure we actually have git credentials
+        :return: False if credentials could not be setup, the reason is stored in self.error
+        """
+        ssh_path = os.path.join(os.environ['USERPROFILE'], '.ssh')
+        if not os.path.exists(ssh_path) and self.rsa_path != '':
+            rsa_file = os.path.join(self.config.uproject_dir_path, self.rsa_path)
+            if not os.path.isfile(rsa_file):
+                self.error = 'No git credentials exists at rsa_path! ' \
+                             'Check rsa_path is relative to the project path and exists.'
+                return False
+            os.mkdir(ssh_path)
+            shutil.copy2(rsa_file, ssh_path)
+
+        # To get around the annoying user prompt, lets just set github to be trusted, no key checking
+        if self.disable_strict_hostkey_check:
+            if not os.path.isfile(os.path.join(ssh_path, 'config')):
+                with open(os.path.join(ssh_path, 'config'), 'w') as fp:
+                    fp.write('Host github.com\nStrictHostKeyChecking no')
         return True
 
 # if __name__ == "__main__":
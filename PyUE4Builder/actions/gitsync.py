@@ -0,0 +1,100 @@
+#!/usr/bin/env python
+
+from actions.action import Action
+from actions.git import Git
+from utility.common import print_action
+from concurrent.futures import ThreadPoolExecutor
+import time
+import click
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class Gitsync(Action):
+    """
+    Git Sync Action
+    An action for syncing several git repos at the same time. Each repo is synced exactly like the git action
+    would sync it, including branch mismatch handling and similar branch switching.
+    """
+
+    def __init__(self, config, **kwargs):
+        super().__init__(config, **kwargs)
+        self.repos = kwargs['repos'] if 'repos' in kwargs else []
+        self.max_parallel = kwargs['max_parallel'] if 'max_parallel' in kwargs else 4
+        # Git arguments given to this action apply to every repo which doesn't set them itself
+        self.repo_defaults = {k: v for k, v in kwargs.items() if k in Git.get_arg_docs()}
+        self.branch_switched = False
+
+    @staticmethod
+    def get_arg_docs():
+        return {
+            'repos': 'List of repos to sync. Each is a dict of git action arguments, at least "repo", "branch" '
+                     'and "output_folder".',
+            'max_parallel': 'The maximum number of repos to sync at the same time',
+            '<git action arguments>': 'Any git action argument set on this action applies to every repo'
+        }
+
+    def create_git_actions(self):
+        git_actions = []
+        for repo_spec in self.repos:
+            git_kwargs = dict(self.repo_defaults)
+            git_kwargs.update(repo_spec)
+            git_kwargs['build_meta'] = self.build_meta
+            git_kwargs['log_prefix'] = self.log_prefix
+            git_action = Git(self.config, **git_kwargs)
+            # Output of repos syncing at the same time would be interleaved, it is logged instead
+            git_action.quiet = True
+            git_actions.append(git_action)
+        return git_actions
+
+    def verify(self):
+        if not len(self.repos):
+            return 'No repos to sync!'
+        if self.max_parallel < 1:
+            return 'max_parallel must be at least 1!'
+        for repo_spec in self.repos:
+            if type(repo_spec) is not dict:
+                return 'Invalid repo found in repos list, expected a dict of git arguments!'
+        for git_action in self.create_git_actions():
+            verify_error = git_action.verify()
+            if verify_error != '':
+                return 'Repo "{}": {}'.format(git_action.output_folder, verify_error)
+        return ''
+
+    @staticmethod
+    def sync_repo(git_action):
+        """
+        Sync a single repo
+        :return: (success, seconds taken)
+        """
+        start_time = time.perf_counter()
+        try:
+            success = git_action.run()
+        except Exception as e:
+            git_action.error = str(e)
+            success = False
+        return success, time.perf_counter() - start_time
+
+    def run(self):
+        git_actions = self.create_git_actions()
+        print_action('Syncing {} repos, {} at a time'.format(len(git_actions), self.max_parallel))
+        with ThreadPoolExecutor(max_workers=self.max_parallel) as pool:
+            results = list(pool.map(self.sync_repo, git_actions))
+
+        errors = []
+        click.secho('\n{:<60} {:<10} {:>10}'.format('Repo', 'Result', 'Time (s)'))
+        for git_action, (success, seconds) in zip(git_actions, results):
+            click.secho('{:<60} {:<10} {:>10.1f}'.format(git_action.output_folder[-60:],
+                                                        'synced' if success else 'FAILED', seconds),
+                        fg=None if success else 'red')
+            if not success:
+                errors.append('Repo "{}" failed to sync: {}'.format(git_action.output_folder, git_action.error))
+            if git_action.branch_switched:
+                self.branch_switched = True
+
+        if len(errors):
+            self.error = '\n'.join(errors)
+            return False
+        return True
@@ -1,7 +1,7 @@
 #!/usr/bin/env python
 
 from actions.action import Action
-from utility.common import launch, print_action
+from utility.common import print_action
 from config import platform_long_names
 import shutil
 import os
@@ -123,6 +123,31 @@ class Package(Action):
             shutil.copyfile(os.path.join(self.config.uproject_dir_path, self.content_black_list),
                             build_blacklist_file_path)
 
+        # TODO: determine engine bug or issue in this script. Fails if previous cooked content exists already.
+        if len(self.cook_output_dir) > 0:
+            # manual clean everytime because of bug...
+            shutil.rmtree(os.path.join(self.config.uproject_dir_path, self.cook_output_dir), onerror=on_rm_error)
+
+        # print_action('Building, Cooking, and Packaging {} Build'.format(cap_build_name))
+        result = self.run_tool(self.config.UE4RunUATBatPath, self.get_cmd_args(),
+                               'Package-{}-{}'.format(self.config.uproject_name, self.build_type))
+        if result.exit_code != 0:
+            self.error = 'Unable to build {}!\n{}'.format(self.config.uproject_name, result.get_failure_summary())
+            return False
+
+        # Don't leave blacklist around
+        if os.path.isfile(build_blacklist_file_path):
+            os.unlink(build_blacklist_file_path)
+
+        return True
+
+    def plan(self):
+        return {'commands': [[self.config.UE4RunUATBatPath] + self.get_cmd_args()]}
+
+    def get_cmd_args(self):
+        """
+        :return: The arguments of the BuildCookRun run of RunUAT
+        """
         cmd_args = ['-ScriptsForProject={}'.format(self.config.uproject_file_path),
                     'BuildCookRun', '-NoHotReload', '-nop4',
                     '-project={}'.format(self.config.uproject_file_path),
@@ -181,10 +206,7 @@ class Package(Action):
         if len(self.cook_dirs) > 0:
             cmd_args.append('-cookdir={}'.format('+'.join(self.cook_dirs)))
 
-        # TODO: determine engine bug or issue in this script. Fails if previous cooked content exists already.
         if len(self.cook_output_dir) > 0:
-            # manual clean everytime because of bug...
-            shutil.rmtree(os.path.join(self.config.uproject_dir_path, self.cook_output_dir), onerror=on_rm_error)
             cmd_args.extend(['-iterate', '-iterativecooking'])
         else:
             if self.config.clean or self.full_rebuild:
@@ -193,14 +215,4 @@ class Package(Action):
                 cmd_args.extend(['-iterate', '-iterativecooking'])
 
         cmd_args.append('-compile')
-
-        # print_action('Building, Cooking, and Packaging {} Build'.format(cap_build_name))
-        if launch(self.config.UE4RunUATBatPath, cmd_args) != 0:
-            self.error = 'Unable to build {}!'.format(self.config.uproject_name)
-            return False
-
-        # Don't leave blacklist around
-        if os.path.isfile(build_blacklist_file_path):
-            os.unlink(build_blacklist_file_path)
-
-        return True
+        return cmd_args
@@ -1,15 +1,76 @@
 #!/usr/bin/env python
 
 from actions.action import Action
-from utility.common import launch
+from utility.common import print_action_info
+from utility.filesystem import scan_directories, hash_files
 import os
-import glob
+import json
+import hashlib
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
 __credits__ = ["Ryan Sheffer", "VREAL"]
 
 
+class PakManifest(object):
+    """
+    The state of a paks input files from the previous run, persisted next to the pak list.
+    For each content directory it stores the (size, mtime, content hash) of every file and the pak list lines of that
+    directory, so the lines are only regenerated for directories which changed. It also records the inputs of the last
+    successful pak so an unchanged pak doesn't need to be created again.
+    """
+    def __init__(self, file_path, content_dir, asset_root_path):
+        self.file_path = file_path
+        self.content_dir = content_dir
+        self.asset_root_path = asset_root_path
+        self.dirs = {}
+        self.last_pak = None
+
+    def get_inputs_digest(self, pak_settings):
+        """
+        :param pak_settings: Everything besides the content which affects the pak, ex. the UnrealPak arguments
+        :return: A digest of the content hashes and pak settings
+        """
+        hasher = hashlib.sha256()
+        hasher.update(json.dumps(pak_settings).encode())
+        for dir_path in sorted(self.dirs):
+            files = self.dirs[dir_path]['files']
+            for file_name in sorted(files):
+                hasher.update('{}|{}\n'.format(os.path.join(dir_path, file_name), files[file_name][2]).encode())
+        return hasher.hexdigest()
+
+    def is_pak_current(self, inputs_digest, pak_path):
+        """
+        :return: True if the last successful pak had the same inputs and is still in place untouched
+        """
+        if self.last_pak is None or self.last_pak['digest'] != inputs_digest or not os.path.isfile(pak_path):
+            return False
+        stat_info = os.stat(pak_path)
+        return self.last_pak['size'] == stat_info.st_size and self.last_pak['mtime_ns'] == stat_info.st_mtime_ns
+
+    def set_last_pak(self, inputs_digest, pak_path):
+        stat_info = os.stat(pak_path)
+        self.last_pak = {'digest': inputs_digest, 'size': stat_info.st_size, 'mtime_ns': stat_info.st_mtime_ns}
+
+    def load(self):
+        try:
+            with open(self.file_path, 'r') as fp:
+                json_s = json.load(fp)
+            # Pak list lines depend on these, a manifest for other roots is useless
+            if json_s['content_dir'] == self.content_dir and json_s['asset_root_path'] == self.asset_root_path:
+                self.dirs = json_s['dirs']
+                self.last_pak = json_s.get('last_pak')
+        except (IOError, ValueError, KeyError):
+            pass
+
+    def save(self):
+        with open(self.file_path, 'w') as fp:
+            json.dump({'content_dir': self.content_dir,
+                       'asset_root_path': self.asset_root_path,
+                       'dirs': self.dirs,
+                       'last_pak': self.last_pak}, fp)
+
+
 class Pak(Action):
     """
     Pak Action
@@ -52,37 +113,128 @@ class Pak(Action):
             return 'output_dir is not set. Set the argument output_dir to a valid output path relative to the project.'
         return ''
 
-    def run(self):
-        pak_list_file_path = os.path.join(os.getcwd(), '{}_pak_list.txt'.format(self.pak_name))
-        with open(pak_list_file_path, 'w') as fp:
-            for content_path in self.content_paths:
-                asset_paths = glob.glob(os.path.join(self.content_dir, content_path) + os.path.sep + '**',
-                                        recursive=True)
-                for asset_path in asset_paths:
-                    if os.path.isdir(asset_path):
+    def get_pak_list_line(self, asset_path):
+        reduced_root = asset_path.replace(self.content_dir, '')
+        if reduced_root[0] == '\\' or reduced_root[0] == '/':
+            reduced_root = reduced_root[1:]
+        content_asset_path = os.path.join(self.asset_root_path, reduced_root)
+        return '"{0}" "{1}" -compress\n'.format(asset_path, content_asset_path.replace('\\', '/'))
+
+    def update_pak_list(self, pak_list_file_path, manifest):
+        """
+        Scan the content paths and write the pak list response file.
+        Pak list lines are reused from the manifest for directories whose files did not change, and the list file
+        is only rewritten if any directory changed.
+        :param pak_list_file_path: The pak list response file to write
+        :param manifest: The PakManifest of the previous run, updated to the current state of the content
+        """
+        new_dirs = {}
+        changed_dirs = 0
+        files_to_hash = []
+        for content_path in self.content_paths:
+            for dir_path, file_entries in scan_directories(os.path.join(self.content_dir, content_path),
+                                                           include_hidden=False):
+                if dir_path in new_dirs:
+                    continue  # Overlapping content paths
+                old_dir = manifest.dirs.get(dir_path)
+                old_files = old_dir['files'] if old_dir is not None else {}
+                files = {}
+                dir_changed = old_dir is None or len(file_entries) != len(old_files)
+                for entry in file_entries:
+                    stat_info = entry.stat()
+                    old_file = old_files.get(entry.name)
+                    if old_file is not None and len(old_file) == 3 and old_file[0] == stat_info.st_size \
+                            and old_file[1] == stat_info.st_mtime_ns:
+                        files[entry.name] = old_file
                         continue
-                    reduced_root = asset_path.replace(self.content_dir, '')
-                    if reduced_root[0] == '\\' or reduced_root[0] == '/':
-                        reduced_root = reduced_root[1:]
-                    content_asset_path = os.path.join(self.asset_root_path, reduced_root)
-                    write_line = '"{0}" "{1}" -compress\n'.format(asset_path, content_asset_path.replace('\\', '/'))
-                    fp.write(write_line)
-
-        unreal_pak_path = os.path.join(self.config.UE4EnginePath, 'Engine\\Binaries\\Win64\\UnrealPak.exe')
+                    # New or modified, the content hash is filled in below
+                    files[entry.name] = [stat_info.st_size, stat_info.st_mtime_ns, '']
+                    files_to_hash.append((files[entry.name], entry.path))
+                    dir_changed = True
+                if not dir_changed:
+                    new_dirs[dir_path] = old_dir
+                    continue
+                changed_dirs += 1
+                new_dirs[dir_path] = {'files': files,
+                                      'lines': [self.get_pak_list_line(os.path.join(dir_path, file_name))
+                                                for file_name in sorted(files)]}
+
+        if len(files_to_hash):
+            print_action_info('Hashing {} new or modified files'.format(len(files_to_hash)))
+            file_hashes = hash_files([file_path for _, file_path in files_to_hash])
+            for (file_info, _), file_hash in zip(files_to_hash, file_hashes):
+                file_info[2] = file_hash
+
+        removed_dirs = len(set(manifest.dirs) - set(new_dirs))
+        manifest.dirs = new_dirs
+        if changed_dirs == 0 and removed_dirs == 0 and os.path.isfile(pak_list_file_path):
+            print_action_info('Pak list up to date ({} directories unchanged)'.format(len(new_dirs)))
+            return
+
+        print_action_info('Writing pak list ({} of {} directories changed, {} removed)'.format(
+            changed_dirs, len(new_dirs), removed_dirs))
+        with open(pak_list_file_path, 'w') as fp:
+            for dir_info in new_dirs.values():
+                fp.writelines(dir_info['lines'])
+
+    def get_pak_list_file_path(self):
+        return os.path.join(os.getcwd(), '{}_pak_list.txt'.format(self.pak_name))
+
+    def get_pak_path(self):
+        return os.path.join(self.config.uproject_dir_path, self.output_dir, self.pak_name + '.pak')
+
+    def get_unreal_pak_path(self):
+        return os.path.join(self.config.UE4EnginePath, 'Engine\\Binaries\\Win64\\UnrealPak.exe')
+
+    def get_cmd_args(self):
+        """
+        :return: The arguments of the UnrealPak run creating the pak from the pak list
+        """
+        return [self.get_pak_path(),
+                '-create={}'.format(self.get_pak_list_file_path()),
+                '-encryptionini',
+                '-enginedir={}'.format(self.config.UE4EnginePath),
+                '-projectdir={}'.format(self.config.uproject_dir_path),
+                '-platform={}'.format(self.config.platform),
+                '-UTF8Output',
+                '-multiprocess']
+
+    def plan(self):
+        # The content isn't scanned, whether UnrealPak would be skipped is only known once the pak list is made
+        return {'commands': [[self.get_unreal_pak_path()] + self.get_cmd_args()]}
+
+    def run(self):
+        pak_list_file_path = self.get_pak_list_file_path()
+        pak_path = self.get_pak_path()
+        manifest = PakManifest(os.path.join(os.getcwd(), '{}_pak_manifest.json'.format(self.pak_name)),
+                               self.content_dir, self.asset_root_path)
+        manifest.load()
+        self.update_pak_list(pak_list_file_path, manifest)
+
+        unreal_pak_path = self.get_unreal_pak_path()
+        cmd_args = self.get_cmd_args()
+
+        inputs_digest = manifest.get_inputs_digest({'pak_name': self.pak_name, 'cmd_args': cmd_args,
+                                                    'pak_list': os.path.basename(pak_list_file_path)})
+        if not self.config.clean and manifest.is_pak_current(inputs_digest, pak_path):
+            manifest.save()
+            print_action_info('Pak "{}" inputs are unchanged, skipping UnrealPak'.format(self.pak_name))
+            return True
+
+        # Forget the last pak until this one succeeds, a failed pak may have left a broken file behind
+        manifest.last_pak = None
+        manifest.save()
+
         if not os.path.isfile(unreal_pak_path):
             self.error = 'Unable to find path to UnrealPak.exe. Is it compiled?'
             return False
 
-        cmd_args = [os.path.join(self.config.uproject_dir_path, self.output_dir, self.pak_name + '.pak'),
-                    '-create={}'.format(pak_list_file_path),
-                    '-encryptionini',
-                    '-enginedir={}'.format(self.config.UE4EnginePath),
-                    '-projectdir={}'.format(self.config.uproject_dir_path),
-                    '-platform={}'.format(self.config.platform),
-                    '-UTF8Output',
-                    '-multiprocess']
-
-        if launch(unreal_pak_path, cmd_args) != 0:
-            self.error = 'Unable to pak!'
+        result = self.run_tool(unreal_pak_path, cmd_args, 'Pak-{}'.format(self.pak_name))
+        if result.exit_code != 0:
+            self.error = 'Unable to pak!\n{}'.format(result.get_failure_summary())
             return False
+
+        if os.path.isfile(pak_path):
+            manifest.set_last_pak(inputs_digest, pak_path)
+            manifest.save()
         return True
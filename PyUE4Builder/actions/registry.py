@@ -0,0 +1,158 @@
+#!/usr/bin/env python
+
+import os
+import json
+import importlib
+import threading
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class ActionRegistry(object):
+    """
+    Index of the actions in an actions package.
+    The index is made by reading the source of the action modules, so listing actions and their argument docs imports
+    nothing. It is cached on disk and only modules which changed since are read again. Action modules are imported
+    when an action is first used.
+    """
+
+    # Modules of the package which are not actions
+    ignored_modules = ['__init__', 'action', 'registry']
+
+    def __init__(self, package_dir, package_name, cache_path):
+        self.package_dir = package_dir
+        self.package_name = package_name
+        self.cache_path = cache_path
+        self.lock = threading.Lock()
+        self.index = None
+        self.action_classes = {}
+
+    @staticmethod
+    def get_class_name(module_name):
+        # The action class is named after its module, ex. actions.steamupload is Steamupload
+        return module_name.split('.')[-1].title()
+
+    @staticmethod
+    def read_module_info(file_path, class_name):
+        """
+        Read the documentation of an action class from its module source
+        :return: Dict of the class doc and arg docs (None if get_arg_docs isn't a plain dict), None if the module has
+                 no such class
+        """
+        import ast
+        with open(file_path, 'rb') as fp:
+            tree = ast.parse(fp.read(), file_path)
+        for node in tree.body:
+            if not isinstance(node, ast.ClassDef) or node.name != class_name:
+                continue
+            arg_docs = {}
+            for class_node in node.body:
+                if isinstance(class_node, ast.FunctionDef) and class_node.name == 'get_arg_docs':
+                    returns = [n for n in ast.walk(class_node) if isinstance(n, ast.Return)]
+                    try:
+                        arg_docs = ast.literal_eval(returns[0].value) if len(returns) == 1 else None
+                    except ValueError:
+                        arg_docs = None  # Built at run time, the module has to be imported to get them
+            return {'doc': ast.get_docstring(node) or '', 'arg_docs': arg_docs}
+        return None
+
+    def load_index(self):
+        """
+        Load the cached index and bring it up to date with the action modules on disk
+        :return: Dict of action module name to its index entry
+        """
+        try:
+            with open(self.cache_path, 'r') as fp:
+                cached_index = json.load(fp)
+        except (IOError, ValueError):
+            cached_index = {}
+
+        index = {}
+        changed = False
+        with os.scandir(self.package_dir) as it:
+            entries = sorted((entry for entry in it if entry.name.endswith('.py')), key=lambda e: e.name)
+        for entry in entries:
+            name = entry.name[:-3]
+            if name in self.ignored_modules:
+                continue
+            module_name = '{}.{}'.format(self.package_name, name)
+            stat_info = entry.stat()
+            cached = cached_index.get(module_name)
+            if cached is not None and cached['size'] == stat_info.st_size and \
+                    cached['mtime_ns'] == stat_info.st_mtime_ns:
+                index[module_name] = cached
+                continue
+            changed = True
+            try:
+                module_info = self.read_module_info(entry.path, self.get_class_name(module_name))
+            except (SyntaxError, ValueError, OSError):
+                module_info = None  # Reported when the action is used
+            if module_info is None:
+                module_info = {'doc': '', 'arg_docs': None, 'missing_class': True}
+            module_info.update(size=stat_info.st_size, mtime_ns=stat_info.st_mtime_ns)
+            index[module_name] = module_info
+
+        if changed or len(index) != len(cached_index):
+            try:
+                os.makedirs(os.path.dirname(self.cache_path), exist_ok=True)
+                temp_path = '{}.{}.tmp'.format(self.cache_path, os.getpid())
+                with open(temp_path, 'w') as fp:
+                    json.dump(index, fp, indent=1)
+                os.replace(temp_path, self.cache_path)
+            except OSError:
+                pass  # A read only install, the index is simply made again next time
+        return index
+
+    def get_index(self):
+        with self.lock:
+            if self.index is None:
+                self.index = self.load_index()
+            return self.index
+
+    def get_action_names(self):
+        """
+        :return: Sorted list of the module names of the actions in the package
+        """
+        return sorted(name for name, info in self.get_index().items() if not info.get('missing_class', False))
+
+    def get_action_doc(self, module_name):
+        info = self.get_index().get(module_name)
+        return info['doc'] if info is not None else ''
+
+    def get_arg_docs(self, module_name):
+        """
+        :return: The argument documentation of an action. Read from the index when possible, otherwise the action is
+                 imported and asked.
+        """
+        info = self.get_index().get(module_name)
+        if info is not None and info['arg_docs'] is not None:
+            return info['arg_docs']
+        action_class = self.get_action_class(module_name)
+        return action_class.get_arg_docs() if action_class is not None else {}
+
+    def get_action_module(self, module_name):
+        """
+        Import an action module, any module path works, not just the ones in the package
+        :raise ImportError: If the module can't be imported
+        :return: The module
+        """
+        return importlib.import_module(module_name)
+
+    def get_action_class(self, module_name):
+        """
+        :raise ImportError: If the module can't be imported
+        :return: The action class of an action module, None if the module has no class named after it
+        """
+        action_class = self.action_classes.get(module_name)
+        if action_class is None:
+            action_class = getattr(self.get_action_module(module_name), self.get_class_name(module_name), None)
+            if action_class is not None:
+                self.action_classes[module_name] = action_class
+        return action_class
+
+
+action_registry = ActionRegistry(os.path.dirname(os.path.abspath(__file__)), 'actions',
+                                 os.path.join(os.path.dirname(os.path.abspath(__file__)), '__pycache__',
+                                              'action_index.json'))
@@ -3,7 +3,7 @@
 import os
 import shutil
 from actions.action import Action
-from utility.common import print_action, launch
+from utility.common import print_action
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -51,6 +51,12 @@ class Steamupload(Action):
         if self.config.clean:
             return True
 
+        if STEAMWORKS_USER_ENV_VAR not in os.environ or STEAMWORKS_PASS_ENV_VAR not in os.environ:
+            self.error = 'Unable to upload build {} to steam, set the {} and {} environment variables to the ' \
+                         'Steamworks user and password!'.format(self.build_name, STEAMWORKS_USER_ENV_VAR,
+                                                                STEAMWORKS_PASS_ENV_VAR)
+            return False
+
         template_file_path = os.path.join(self.config.uproject_dir_path, self.steam_app_template)
 
         auto_file_path = os.path.join(self.config.uproject_dir_path,
@@ -77,18 +83,36 @@ class Steamupload(Action):
             pass
 
         print_action('Uploading {} Build to Steam'.format(self.config.uproject_name))
-        cmd_args = ['+login',
-                    os.environ[STEAMWORKS_USER_ENV_VAR],
-                    os.environ[STEAMWORKS_PASS_ENV_VAR],
-                    '+run_app_build',
-                    '..\\scripts\\{}_build.vdf'.format(self.config.uproject_name.lower()),
-                    '+quit']
-
-        if launch(os.path.join(self.config.uproject_dir_path, self.builder_exe_path), cmd_args) != 0:
-            self.error = 'Unable to upload build {} to steam!'.format(self.config.uproject_name)
+        cmd_args = self.get_cmd_args(os.environ[STEAMWORKS_USER_ENV_VAR], os.environ[STEAMWORKS_PASS_ENV_VAR])
+        result = self.run_tool(self.get_builder_exe_path(), cmd_args, 'SteamUpload-{}'.format(self.build_name),
+                               silent=True)
+        if result.exit_code != 0:
+            self.error = 'Unable to upload build {} to steam!\n{}'.format(self.config.uproject_name,
+                                                                          result.get_failure_summary())
             return False
         return True
 
+    def plan(self):
+        if self.config.clean:
+            return {}
+        # Never put the password in a plan, plans are meant to be saved and compared. A plan doesn't need the login.
+        return {'commands': [[self.get_builder_exe_path()] +
+                             self.get_cmd_args(os.environ.get(STEAMWORKS_USER_ENV_VAR, '<unset>'), '********')]}
+
+    def get_builder_exe_path(self):
+        return os.path.join(self.config.uproject_dir_path, self.builder_exe_path)
+
+    def get_cmd_args(self, user, password):
+        """
+        :return: The arguments of the steamcmd run uploading the build
+        """
+        return ['+login',
+                user,
+                password,
+                '+run_app_build',
+                '..\\scripts\\{}_build.vdf'.format(self.config.uproject_name.lower()),
+                '+quit']
+
     @staticmethod
     def create_app_build_script(template_file_path, auto_file_path, content_root, version_str, build_to_set_live=''):
         """
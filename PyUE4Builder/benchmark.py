@@ -0,0 +1,638 @@
+#!/usr/bin/env python
+
+import os
+import re
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+import click
+import shutil
+import tempfile
+import threading
+import tracemalloc
+import contextlib
+from copy import deepcopy
+from urllib.request import urlopen
+from http.server import ThreadingHTTPServer, SimpleHTTPRequestHandler
+from utility.downloaders import download_file
+from utility.frozen import freeze, thaw
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+@click.group()
+def benchmark():
+    """ Benchmarks of the builders hot paths, run them before and after optimizing to compare """
+    pass
+
+
+class RangeRequestHandler(SimpleHTTPRequestHandler):
+    """
+    Static file handler which also serves byte ranges, like the servers large dependencies are downloaded from
+    """
+    def log_message(self, *args):
+        pass
+
+    def send_head(self):
+        file_path = self.translate_path(self.path)
+        if not os.path.isfile(file_path):
+            self.send_error(404)
+            return None
+        file_size = os.path.getsize(file_path)
+        start = 0
+        end = file_size - 1
+        range_match = re.match(r'bytes=(\d+)-(\d*)', self.headers.get('Range', ''))
+        if range_match:
+            start = int(range_match.group(1))
+            end = int(range_match.group(2) or end)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, file_size))
+        else:
+            self.send_response(200)
+        self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.send_header('Last-Modified', self.date_time_string(int(os.path.getmtime(file_path))))
+        self.end_headers()
+        fp = open(file_path, 'rb')
+        fp.seek(start)
+        self.range_remaining = end + 1 - start
+        return fp
+
+    def copyfile(self, source, outputfile):
+        while self.range_remaining > 0:
+            buff = source.read(min(1024 * 1024, self.range_remaining))
+            if not buff:
+                break
+            outputfile.write(buff)
+            self.range_remaining -= len(buff)
+
+
+@contextlib.contextmanager
+def serve_directory(dir_path):
+    """
+    Serve a directory over http on a free local port for the duration of the with block
+    :return: The base url of the server
+    """
+    class Handler(RangeRequestHandler):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, directory=dir_path, **kwargs)
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        yield 'http://127.0.0.1:{}'.format(server.server_address[1])
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+def legacy_download_file(file_url, output_folder='.', simple_loading=False):
+    """
+    The download loop before buffering and segments were added, kept to compare against
+    """
+    file_name = file_url.split('/')[-1]
+    u = urlopen(file_url)
+    file_name_out = os.path.join(output_folder, file_name)
+    with open(file_name_out, 'wb') as fp:
+        file_size = int(dict(u.info())["Content-Length"])
+        file_size_dl = 0
+        block_sz = 8192
+        simple_loading_sz = 524288
+        cur_simple_loading = 0
+        while True:
+            buff = u.read(block_sz)
+            if not buff:
+                break
+            file_size_dl += len(buff)
+            fp.write(buff)
+            status = r"%10d  [%3.2f%%]" % (file_size_dl, file_size_dl * 100.0 / file_size)
+            if simple_loading:
+                if file_size_dl > cur_simple_loading or file_size_dl >= file_size:
+                    cur_simple_loading += simple_loading_sz
+                    print(status, flush=True)
+            else:
+                status += chr(8) * len(status)
+                print(status, end='', flush=True)
+
+
+def run_download_benchmark(size_mb, segments, repeat):
+    """
+    Download a file from a local server with the legacy loop and with download_file
+    :return: List of (name, list of seconds per run)
+    """
+    results = []
+    temp_dir = tempfile.mkdtemp(prefix='pyue4builder_benchmark_')
+    try:
+        serve_dir = os.path.join(temp_dir, 'serve')
+        out_dir = os.path.join(temp_dir, 'out')
+        os.makedirs(serve_dir)
+        os.makedirs(out_dir)
+        with open(os.path.join(serve_dir, 'payload.bin'), 'wb') as fp:
+            for _ in range(size_mb):
+                fp.write(os.urandom(1024 * 1024))
+
+        with serve_directory(serve_dir) as base_url:
+            file_url = '{}/payload.bin'.format(base_url)
+            methods = [('legacy 8KB loop', lambda: legacy_download_file(file_url, out_dir)),
+                       ('download_file 1 segment', lambda: download_file(file_url, out_dir, segments=1)),
+                       ('download_file {} segments'.format(segments),
+                        lambda: download_file(file_url, out_dir, segments=segments, min_segment_size=1))]
+            for name, method in methods:
+                timings = []
+                for _ in range(repeat):
+                    with contextlib.suppress(FileNotFoundError):
+                        os.unlink(os.path.join(out_dir, 'payload.bin'))
+                    # Progress goes to the console in real use, discard it so terminal speed doesn't skew results
+                    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                        start_time = time.perf_counter()
+                        method()
+                        timings.append(time.perf_counter() - start_time)
+                results.append((name, timings))
+    finally:
+        shutil.rmtree(temp_dir, ignore_errors=True)
+    return results
+
+
+def print_results(results, size_mb):
+    click.secho('\n{:<40} {:>10} {:>10}'.format('Benchmark', 'Best (s)', 'MB/s'))
+    for name, timings in results:
+        click.secho('{:<40} {:>10.3f} {:>10.1f}'.format(name, min(timings), size_mb / min(timings)))
+
+
+@benchmark.command()
+@click.option('--size', '-m',
+              type=click.INT,
+              default=256,
+              show_default=True,
+              help='The size of the file to download in MB')
+@click.option('--segments',
+              type=click.INT,
+              default=4,
+              show_default=True,
+              help='The number of segments of the segmented download')
+@click.option('--repeat', '-r',
+              type=click.INT,
+              default=3,
+              show_default=True,
+              help='The number of times to run each download, the best time is reported')
+def download(size, segments, repeat):
+    """ Download throughput against a local http server, legacy loop vs download_file """
+    print_results(run_download_benchmark(size, segments, repeat), size)
+
+
+def make_synthetic_script(num_steps):
+    """
+    :return: A build script json with a large config and a list of num_steps steps
+    """
+    steps = []
+    for index in range(num_steps):
+        steps.append({'id': 'step{}'.format(index),
+                      'desc': 'Synthetic step {}'.format(index),
+                      'depends_on': ['step{}'.format(index - 1)] if index else [],
+                      'action': {'module': 'actions.copy',
+                                 'args': {'copy': [['{{uproject_dir_path}}\\Binaries\\{}.dll'.format(index),
+                                                    '{{builds_path}}\\{}.dll'.format(index)]]},
+                                 'push_meta': {'step{}_result'.format(index): 'error'}}})
+    return {'config': {'project_path': '..\\MyGame.uproject',
+                       'build_engine_tools': ['ShaderCompileWorker', 'UnrealLightmass', 'CrashReportClient'],
+                       'extra_dependency_excludes': ['Engine/Extras/{}'.format(index) for index in range(200)]},
+            'steps': steps}
+
+
+def hand_out_configs_legacy(script_json):
+    """
+    The configuration hand out of a build before config views: the script is deep copied at load and the whole
+    configuration is deep copied for every step
+    """
+    from config import ProjectConfig
+    config = ProjectConfig()
+    config.script = deepcopy(script_json)
+    for k, v in config.script['config'].items():
+        setattr(config, k, deepcopy(v))
+    for step in config.script['steps']:
+        action_config = deepcopy(config)
+        action_args = step['action']['args']
+        del action_config, action_args
+
+
+def hand_out_configs(script_json):
+    """
+    The configuration hand out of a build with config views: the script is frozen at load and every step gets a
+    view of the configuration and a copy of its own arguments
+    """
+    from config import ProjectConfig
+    config = ProjectConfig()
+    config.script = freeze(script_json)
+    for k, v in config.script['config'].items():
+        setattr(config, k, thaw(v))
+    for step in config.script['steps']:
+        action_config = config.view()
+        action_args = thaw(step['action']['args'])
+        del action_config, action_args
+
+
+def run_config_benchmark(num_steps, repeat):
+    """
+    :return: List of (name, best seconds, peak MB allocated)
+    """
+    script_json = make_synthetic_script(num_steps)
+    results = []
+    for name, method in [('deepcopy per step', hand_out_configs_legacy), ('config view per step', hand_out_configs)]:
+        timings = []
+        for _ in range(repeat):
+            start_time = time.perf_counter()
+            method(script_json)
+            timings.append(time.perf_counter() - start_time)
+        tracemalloc.start()
+        method(script_json)
+        peak_bytes = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+        results.append((name, min(timings), peak_bytes / (1024 * 1024)))
+    return results
+
+
+@benchmark.command()
+@click.option('--steps', '-n',
+              type=click.INT,
+              default=1000,
+              show_default=True,
+              help='The number of steps of the synthetic build script')
+@click.option('--repeat', '-r',
+              type=click.INT,
+              default=3,
+              show_default=True,
+              help='The number of times to run each benchmark, the best time is reported')
+def config(steps, repeat):
+    """ Handing the configuration to every step of a large script, deepcopy vs config views """
+    results = run_config_benchmark(steps, repeat)
+    click.secho('\n{:<40} {:>10} {:>10}'.format('Benchmark', 'Best (s)', 'Peak MB'))
+    for name, seconds, peak_mb in results:
+        click.secho('{:<40} {:>10.3f} {:>10.1f}'.format(name, seconds, peak_mb))
+
+
+import_time_pattern = re.compile(r'import time:\s+(\d+) \|\s+(\d+) \| (.*)$')
+
+# The most milliseconds starting a command may spend importing modules, see tests/test_import_time.py
+import_time_budget_ms = 120.0
+
+
+def measure_import_time(command_args):
+    """
+    Run a command of the builder with python -X importtime
+    :param command_args: The script and its arguments, ex. ['tools.py', '--help']
+    :return: (total seconds spent importing, list of (module, cumulative seconds) of the top level imports)
+    """
+    result = subprocess.run([sys.executable, '-X', 'importtime'] + command_args,
+                            cwd=os.path.dirname(os.path.abspath(__file__)), stdout=subprocess.DEVNULL,
+                            stderr=subprocess.PIPE, universal_newlines=True)
+    if result.returncode != 0:
+        raise click.ClickException('{} failed:\n{}'.format(' '.join(command_args), result.stderr[-2000:]))
+    modules = []
+    for line in result.stderr.splitlines():
+        match = import_time_pattern.match(line)
+        # Nested imports are indented, their time is already part of the cumulative time of their importer
+        if match is not None and not match.group(3).startswith(' '):
+            modules.append((match.group(3), int(match.group(2)) / 1000000))
+    return sum(seconds for _, seconds in modules), modules
+
+
+@benchmark.command()
+@click.option('--budget', '-b',
+              type=click.FLOAT,
+              default=import_time_budget_ms,
+              show_default=True,
+              help='The most milliseconds the command may spend importing modules')
+@click.option('--repeat', '-r',
+              type=click.INT,
+              default=5,
+              show_default=True,
+              help='The number of times to run the command, the best run is compared to the budget')
+@click.option('--top', '-n',
+              type=click.INT,
+              default=10,
+              show_default=True,
+              help='The number of slowest top level imports to list')
+@click.argument('command_args', nargs=-1)
+def importtime(budget, repeat, top, command_args):
+    """
+    Import time of starting a command, tools.py --help by default. Fails if the best run is over the budget, so CI
+    can catch an import which slows down every command (ex. a platform module imported at module level).
+    """
+    command_args = list(command_args) if len(command_args) else ['tools.py', '--help']
+    runs = [measure_import_time(command_args) for _ in range(repeat)]
+    total, modules = min(runs, key=lambda run: run[0])
+
+    click.secho('\nSlowest top level imports of {}'.format(' '.join(command_args)))
+    for name, seconds in sorted(modules, key=lambda module: module[1], reverse=True)[:top]:
+        click.secho('{:<40} {:>10.1f} ms'.format(name, seconds * 1000))
+    over_budget = total * 1000 > budget
+    click.secho('\n{:<40} {:>10.1f} ms (budget {:.1f} ms)'.format('Total', total * 1000, budget),
+                fg='red' if over_budget else 'green')
+    if over_budget:
+        raise click.ClickException('Import time of {} is over budget'.format(' '.join(command_args)))
+
+
+class SuiteFixtures(object):
+    """
+    Synthetic project, engine, action and content trees for the benchmark suite, created in a temporary directory
+    """
+    def __init__(self, pak_files):
+        self.dir_path = tempfile.mkdtemp(prefix='pyue4builder_suite_')
+        self.pak_files = pak_files
+        self.project_dir = os.path.join(self.dir_path, 'MyGame')
+        self.engine_dir = os.path.join(self.dir_path, 'UnrealEngine')
+        self.pak_content_dir = ''
+
+        os.makedirs(os.path.join(self.project_dir, 'Config'))
+        with open(os.path.join(self.project_dir, 'MyGame.uproject'), 'w') as fp:
+            fp.write('{}')
+        with open(os.path.join(self.project_dir, 'Config', 'DefaultGame.ini'), 'w') as fp:
+            fp.write('[/Script/EngineSettings.GeneralProjectSettings]\nProjectVersion=1.2.3.4\n')
+        os.makedirs(os.path.join(self.engine_dir, 'Engine', 'Binaries', 'DotNET'))
+        with open(os.path.join(self.engine_dir, 'Engine', 'Binaries', 'DotNET', 'GitDependencies.exe'), 'w') as fp:
+            fp.write('')
+        build_version = json.dumps({'MajorVersion': 4, 'MinorVersion': 27, 'PatchVersion': 2})
+        os.makedirs(os.path.join(self.engine_dir, 'Engine', 'Build'))
+        for version_path in {os.path.join(self.engine_dir, 'Engine', 'Build', 'Build.version'),
+                             os.path.join(self.engine_dir, 'Engine\\Build\\Build.version')}:
+            with open(version_path, 'w') as fp:
+                fp.write(build_version)
+
+        # An action which does nothing, so step dispatch is measured on its own
+        os.makedirs(os.path.join(self.dir_path, 'suite_actions'))
+        with open(os.path.join(self.dir_path, 'suite_actions', '__init__.py'), 'w') as fp:
+            fp.write('')
+        with open(os.path.join(self.dir_path, 'suite_actions', 'noop.py'), 'w') as fp:
+            fp.write('from actions.action import Action\n\n\n'
+                     'class Noop(Action):\n'
+                     '    def run(self):\n'
+                     '        return True\n')
+        sys.path.insert(0, self.dir_path)
+
+    def get_script(self, steps=None):
+        script_json = {'config': {'project_path': os.path.join(self.project_dir, 'MyGame.uproject'),
+                                  'engine_path_name': self.engine_dir,
+                                  'UE4EngineKeyName': '',
+                                  'extra_dependency_excludes': ['Engine/Extras/{}'.format(i) for i in range(200)]}}
+        if steps is not None:
+            script_json['steps'] = steps
+        return script_json
+
+    def get_config(self, steps=None):
+        from config import ProjectConfig
+        config = ProjectConfig()
+        config.load_configuration(self.get_script(steps), ensure_engine=False)
+        return config
+
+    def get_pak_content_dir(self):
+        """
+        :return: The cooked content directory of the pak benchmark, a Game folder of pak_files files
+        """
+        if self.pak_content_dir == '':
+            self.pak_content_dir = os.path.join(self.dir_path, 'Cooked')
+            files_per_dir = 1000
+            for index in range(self.pak_files):
+                dir_path = os.path.join(self.pak_content_dir, 'Game', 'Dir{:04d}'.format(index // files_per_dir))
+                if index % files_per_dir == 0:
+                    os.makedirs(dir_path)
+                with open(os.path.join(dir_path, 'Asset{:05d}.uasset'.format(index)), 'wb') as fp:
+                    fp.write(b'x' * (index % 64))
+        return self.pak_content_dir
+
+    def cleanup(self):
+        sys.path.remove(self.dir_path)
+        shutil.rmtree(self.dir_path, ignore_errors=True)
+
+
+def time_rounds(func, rounds, setup=None):
+    """
+    :param func: The function to time
+    :param rounds: The number of times to run it
+    :param setup: Optional function run before every round, not timed
+    :return: List of seconds per round
+    """
+    timings = []
+    for _ in range(rounds):
+        if setup is not None:
+            setup()
+        start_time = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start_time)
+    return timings
+
+
+def bench_replace_tags(fixtures, rounds):
+    from actions.action import Action
+    from build_meta import BuildMeta
+    config = fixtures.get_config()
+    build_meta = BuildMeta(os.path.join(fixtures.dir_path, 'tags_meta'))
+    build_meta.build_number = '1234'
+    action = Action(config, build_meta=build_meta)
+    paths = ['{{uproject_dir_path}}/Binaries/{{platform}}/Module{}/{{build_number}}/{}.dll'.format(i % 100, i)
+             for i in range(10000)]
+    return {'replace_tags.single': (time_rounds(lambda: [action.replace_tags(path) for path in paths], rounds),
+                                    len(paths)),
+            'replace_tags.bulk': (time_rounds(lambda: action.replace_tags_bulk(paths), rounds), len(paths))}
+
+
+def bench_conditions(fixtures, rounds):
+    from actions.buildsteps import Buildsteps
+    from build_meta import BuildMeta
+    conditions = ['not automated', 'clean', 'not automated clean', 'built_once', 'not built_once debug',
+                  "(platform == 'Win64' or platform == 'Linux') and engine_major_version >= 4",
+                  'not (clean or debug) and engine_minor_version > 20']
+    steps = [{'desc': 'Step {}'.format(i), 'condition': conditions[i % len(conditions)],
+              'action': {'module': 'suite_actions.noop'}} for i in range(1000)]
+    config = fixtures.get_config(steps)
+    build_meta = BuildMeta(os.path.join(fixtures.dir_path, 'conditions_meta'))
+    build_meta.built_once = True
+    build_steps = Buildsteps(config, steps_name='steps')
+    return {'buildsteps.conditions': (time_rounds(lambda: [build_steps.check_conditions(step, build_meta)
+                                                           for step in config.script['steps']], rounds), len(steps))}
+
+
+def bench_step_dispatch(fixtures, rounds):
+    from actions.buildsteps import Buildsteps
+    steps = [{'id': 'step{}'.format(i), 'desc': 'Step {}'.format(i),
+              'action': {'module': 'suite_actions.noop', 'args': {'value': i, 'paths': ['a', 'b']}}}
+             for i in range(1000)]
+    graph_steps = [dict(step, depends_on=['step{}'.format(i - 1)] if i % 10 else []) for i, step in enumerate(steps)]
+    results = {}
+    for name, script_steps in [('buildsteps.dispatch', steps), ('buildsteps.dispatch_graph', graph_steps)]:
+        config = fixtures.get_config(script_steps)
+        config.max_parallel_steps = 4
+
+        def run_steps():
+            build_steps = Buildsteps(config, steps_name='steps')
+            if not build_steps.run():
+                raise Exception(build_steps.error)
+        results[name] = (time_rounds(run_steps, rounds), len(steps))
+    return results
+
+
+def bench_pak_list(fixtures, rounds):
+    from actions.pak import Pak, PakManifest
+    content_dir = fixtures.get_pak_content_dir()
+    config = fixtures.get_config()
+    pak = Pak(config, content_dir=content_dir, content_paths=['Game'], pak_name='Suite')
+    list_path = os.path.join(fixtures.dir_path, 'Suite_pak_list.txt')
+    manifest_path = os.path.join(fixtures.dir_path, 'Suite_pak_manifest.json')
+
+    def new_manifest():
+        manifest = PakManifest(manifest_path, pak.content_dir, pak.asset_root_path)
+        manifest.load()
+        return manifest
+
+    def cold():
+        pak.update_pak_list(list_path, PakManifest(manifest_path, pak.content_dir, pak.asset_root_path))
+
+    def warm():
+        manifest = new_manifest()
+        pak.update_pak_list(list_path, manifest)
+        manifest.save()
+
+    results = {'pak.list_cold': (time_rounds(cold, rounds), fixtures.pak_files)}
+    warm()
+    results['pak.list_warm'] = (time_rounds(warm, rounds), fixtures.pak_files)
+    return results
+
+
+def bench_load_configuration(fixtures, rounds):
+    from config import ProjectConfig
+    script_json = fixtures.get_script([{'desc': 'Step {}'.format(i), 'action': {'module': 'suite_actions.noop'}}
+                                       for i in range(1000)])
+
+    def load():
+        if not ProjectConfig().load_configuration(script_json, ensure_engine=False):
+            raise Exception('Failed to load the synthetic configuration')
+    return {'config.load_configuration': (time_rounds(load, rounds), 1)}
+
+
+def bench_build_meta(fixtures, rounds):
+    from build_meta import BuildMeta
+    meta_name = os.path.join(fixtures.dir_path, 'suite_meta')
+    build_meta = BuildMeta(meta_name)
+    for i in range(1000):
+        setattr(build_meta, 'value{}'.format(i), {'build': i, 'paths': ['a', 'b', 'c']})
+    build_meta.save_meta()
+    return {'build_meta.load': (time_rounds(lambda: BuildMeta(meta_name), rounds), 1),
+            'build_meta.save': (time_rounds(build_meta.save_meta, rounds), 1)}
+
+
+def bench_download(fixtures, rounds):
+    del fixtures  # The download benchmark makes its own server
+    size_mb = 64
+    return {'download.{}'.format(name.replace(' ', '_')): (timings, size_mb)
+            for name, timings in run_download_benchmark(size_mb, 4, rounds)}
+
+
+suite_benchmarks = [bench_replace_tags, bench_conditions, bench_step_dispatch, bench_pak_list,
+                    bench_load_configuration, bench_build_meta, bench_download]
+
+
+def get_git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL, universal_newlines=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return ''
+
+
+def run_suite(rounds, pak_files, name_filter):
+    """
+    Run the benchmark suite
+    :return: Results dict, ready to be saved as json
+    """
+    results = {}
+    fixtures = SuiteFixtures(pak_files)
+    old_cwd = os.getcwd()
+    # Steps write their build meta to the working directory
+    os.chdir(fixtures.dir_path)
+    try:
+        for bench_func in suite_benchmarks:
+            bench_name = bench_func.__name__[len('bench_'):]
+            if name_filter != '' and name_filter not in bench_name:
+                continue
+            try:
+                with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                    bench_results = bench_func(fixtures, rounds)
+            except ImportError as e:
+                # Benchmarks of modules which can't be imported on this platform
+                results[bench_name] = {'skipped': str(e)}
+                continue
+            for name, (timings, ops) in bench_results.items():
+                results[name] = {'best_s': min(timings),
+                                 'median_s': statistics.median(timings),
+                                 'mean_s': statistics.mean(timings),
+                                 'rounds': len(timings),
+                                 'ops': ops}
+    finally:
+        os.chdir(old_cwd)
+        fixtures.cleanup()
+    return {'revision': get_git_revision(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'results': results}
+
+
+@benchmark.command()
+@click.option('--output', '-o',
+              type=click.STRING,
+              default='benchmark_results.json',
+              show_default=True,
+              help='The json file to save the results to')
+@click.option('--compare',
+              type=click.STRING,
+              default='',
+              help='A results json of an earlier run (ex. another commit) to compare against')
+@click.option('--rounds', '-r',
+              type=click.INT,
+              default=5,
+              show_default=True,
+              help='The number of times to run each benchmark')
+@click.option('--pak_files',
+              type=click.INT,
+              default=100000,
+              show_default=True,
+              help='The number of files in the generated pak content tree')
+@click.option('--filter', 'name_filter',
+              type=click.STRING,
+              default='',
+              help='Only run benchmarks whose name contains this')
+def suite(output, compare, rounds, pak_files, name_filter):
+    """ Run every orchestration micro benchmark on synthetic fixtures and save the results as json """
+    suite_results = run_suite(rounds, pak_files, name_filter)
+    with open(output, 'w') as fp:
+        json.dump(suite_results, fp, indent=4)
+
+    previous = {}
+    if compare != '':
+        with open(compare, 'r') as fp:
+            previous = json.load(fp)['results']
+
+    click.secho('\n{:<36} {:>10} {:>10} {:>12} {:>10}'.format('Benchmark', 'Best (s)', 'Median (s)', 'Per op (us)',
+                                                               'Change'))
+    for name, result in suite_results['results'].items():
+        if 'skipped' in result:
+            click.secho('{:<36} skipped: {}'.format(name, result['skipped']), fg='yellow')
+            continue
+        change = ''
+        color = None
+        if 'best_s' in previous.get(name, {}):
+            ratio = result['best_s'] / previous[name]['best_s'] - 1.0
+            change = '{:+.1%}'.format(ratio)
+            color = 'red' if ratio > 0.1 else ('green' if ratio < -0.1 else None)
+        click.secho('{:<36} {:>10.4f} {:>10.4f} {:>12.2f} {:>10}'.format(
+            name, result['best_s'], result['median_s'], result['best_s'] / result['ops'] * 1000000, change), fg=color)
+    click.secho('\nResults saved to {}'.format(output))
+
+
+if __name__ == "__main__":
+    benchmark()
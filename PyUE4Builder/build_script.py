@@ -1,15 +1,25 @@
 #!/usr/bin/env python
 
 import os
+import sys
+
+if __name__ == "__main__":
+    # Hand the command to the builder daemon if one is running, before importing anything else
+    from utility.daemon import run_in_daemon
+    run_in_daemon('build_script', sys.argv[1:])
+
 import click
 import json
+import contextlib
+import hashlib
+import subprocess
 from config import ProjectConfig, project_configurations, platform_types
-from utility.common import launch, print_title, print_action, error_exit, \
+from build_meta import BuildMeta
+from utility.common import print_title, print_action, print_warning, error_exit, \
     get_visual_studio_version, register_project_engine
-from actions.build import Build
-from actions.package import Package
-from actions.git import Git
-from actions.buildsteps import Buildsteps
+from utility.process import run_process
+from utility.trace import tracer
+from actions.registry import action_registry
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -18,7 +28,47 @@ __credits__ = ["Ryan Sheffer", "VREAL"]
 is_automated = os.environ.get("PYUE4BUILDER_AUTOMATED", "0") == "1"
 
 
+def list_actions(ctx, param, value):
+    """
+    Print the available actions and their arguments, then exit
+    """
+    del param  # Unused
+    if not value or ctx.resilient_parsing:
+        return
+    for module_name in action_registry.get_action_names():
+        click.secho('\n{} ({})'.format(module_name, action_registry.get_class_name(module_name)), fg='green')
+        doc = action_registry.get_action_doc(module_name)
+        if doc != '':
+            click.secho('\n'.join('    {}'.format(line) for line in doc.splitlines()))
+        for arg_name, arg_doc in action_registry.get_arg_docs(module_name).items():
+            click.secho('    {}: '.format(arg_name), fg='cyan', nl=False)
+            click.secho(arg_doc)
+    ctx.exit()
+
+
 @click.command()
+@click.option('--list_actions',
+              is_flag=True,
+              callback=list_actions,
+              expose_value=False,
+              is_eager=True,
+              help='List the actions build steps can use with the documentation of their arguments, and exit.')
+@click.option('--plan/--no-plan',
+              default=False,
+              show_default=True,
+              help='Resolve the whole build without launching any tools or changing anything: evaluate step '
+                   'conditions, replace tags, verify every action and list the command lines which would be run. '
+                   'The plan is written as json to stdout (or --plan_file), the rest of the output goes to stderr. '
+                   'Exits with an error if any step would fail verification.')
+@click.option('--plan_file',
+              type=click.STRING,
+              default='',
+              help='Write the plan json to this path instead of stdout.')
+@click.option('--trace',
+              type=click.STRING,
+              default='',
+              help='If set, a Chrome trace_event json file of where the build spent its time is written to this path, '
+                   'and a summary table is printed at the end of the run.')
 @click.option('--pause_always/--error_pause_only',
               default=True,
               show_default=True,
@@ -66,7 +116,7 @@ is_automated = os.environ.get("PYUE4BUILDER_AUTOMATED", "0") == "1"
               default='',
               help='The desired engine path, absolute or relative. Blank will try to find the engine for you.')
 def build_script(engine, script, configuration, buildtype, build, platform, clean,
-                 automated, buildexplicit, pause_always):
+                 automated, buildexplicit, pause_always, trace, plan, plan_file):
     """
     The Main call for build script execution.
     :param engine: The desired engine path, absolute or relative.
@@ -82,17 +132,27 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
                           the package build building the editor before trying to package. By setting this to true, it is
                           expected that the user has setup the proper state before building.
     :param pause_always: Pause always or only pause on error?
+    :param trace: Path of the Chrome trace file to write, or empty for no trace.
+    :param plan: Only write the plan of the build, nothing is built.
+    :param plan_file: Path to write the plan to, or empty for stdout.
     """
+    # Actions are only imported once they are needed
+    build_class = action_registry.get_action_class('actions.build')
+    buildsteps_class = action_registry.get_action_class('actions.buildsteps')
+    package_class = action_registry.get_action_class('actions.package')
+
     # Fixup for old build type 'Game'.
     if buildtype == 'Game':
         buildtype = 'Editor'
 
     global is_automated
-    if automated:
-        is_automated = automated
+    is_automated = automated or os.environ.get("PYUE4BUILDER_AUTOMATED", "0") == "1"
+
+    if trace != '':
+        tracer.write_on_exit(os.path.abspath(trace))
 
     # Ensure Visual Studio is installed
-    if get_visual_studio_version() == -1:
+    if not plan and get_visual_studio_version() == -1:
         error_exit('Cannot run build, visual studio install not found!', not is_automated)
 
     if not os.path.isfile(script):
@@ -106,6 +166,21 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
             return
 
     config = ProjectConfig(configuration, platform, False, clean, automated)
+    if plan:
+        # Keep stdout for the plan json
+        with contextlib.redirect_stdout(sys.stderr):
+            if not config.load_configuration(script_json, engine, False):
+                error_exit('Failed to load configuration. See errors above.', False)
+            build_plan = make_build_plan(config, buildtype, build, buildexplicit)
+        if plan_file != '':
+            with open(plan_file, 'w') as fp:
+                json.dump(build_plan, fp, indent=4)
+        else:
+            click.echo(json.dumps(build_plan, indent=4))
+        if len(get_plan_errors(build_plan)):
+            sys.exit(1)
+        return
+
     if not config.load_configuration(script_json, engine, buildexplicit):
         error_exit('Failed to load configuration. See errors above.', not config.automated)
 
@@ -118,7 +193,8 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
 
     # Ensure the engine exists and we can build
     if not buildexplicit:
-        engine_branch_switched = ensure_engine(config, engine)
+        with tracer.span('ensure_engine'):
+            engine_branch_switched = ensure_engine(config, engine)
         if engine_branch_switched:
             config.clean = True
     click.secho('\nProject File Path: {}\nEngine Path: {}'.format(config.uproject_dir_path, config.UE4EnginePath))
@@ -129,9 +205,10 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
     # Ensure the unreal header tool exists. It is important for all Unreal projects
     if not buildexplicit and (config.engine_major_version < 5 or (config.engine_major_version == 5 and config.engine_minor_version < 3)):
         if not os.path.isfile(os.path.join(config.UE4EnginePath, 'Engine\\Binaries\\Win64\\UnrealHeaderTool.exe')):
-            b = Build(config, build_name='UnrealHeaderTool')
-            if not b.run():
-                error_exit(b.error, not config.automated)
+            b = build_class(config, build_name='UnrealHeaderTool')
+            with tracer.span('UnrealHeaderTool'):
+                if not b.run():
+                    error_exit(b.error, not config.automated)
 
     # Build required engine tools
     if config.should_build_engine_tools and not buildexplicit:
@@ -139,15 +216,28 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
         if buildtype == "Package" and not engine_branch_switched:
             config.clean = False  # Don't clean if packaging, waste of time
 
-        b = Build(config, build_names=config.build_engine_tools)
-        if not b.run():
-            error_exit(b.error, not config.automated)
+        # Skip the tools if nothing they are built from changed since they were last built. A clean or an engine
+        # branch switch always rebuilds them.
+        build_meta = BuildMeta('project_build_meta')
+        if are_engine_tools_up_to_date(config, build_meta, clean_revert or engine_branch_switched):
+            print_action('Engine tools are up to date, skipping their build')
+        else:
+            build_meta.engine_tools_fingerprint = ''
+            build_meta.save_meta()
+
+            b = build_class(config, build_names=config.build_engine_tools)
+            with tracer.span('Engine tools'):
+                if not b.run():
+                    error_exit(b.error, not config.automated)
+
+            build_meta.engine_tools_fingerprint = get_engine_tools_fingerprint(config)
+            build_meta.save_meta()
 
         config.clean = clean_revert
 
     # If a specific set of steps if being requested, only build those
     if build != '':
-        steps = Buildsteps(config, steps_name=build)
+        steps = buildsteps_class(config, steps_name=build)
         if not steps.run():
             error_exit(steps.error, not config.automated)
     else:
@@ -156,15 +246,15 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
                 error_exit('Cannot build the Editor while the editor is running!', not config.automated)
 
             if 'game_editor_steps' in config.script:
-                steps = Buildsteps(config, steps_name='game_editor_steps')
+                steps = buildsteps_class(config, steps_name='game_editor_steps')
                 if not steps.run():
                     error_exit(steps.error, not config.automated)
             elif 'editor_steps' in config.script:
-                steps = Buildsteps(config, steps_name='editor_steps')
+                steps = buildsteps_class(config, steps_name='editor_steps')
                 if not steps.run():
                     error_exit(steps.error, not config.automated)
             else:
-                b = Build(config, build_name='{}Editor'.format(config.uproject_name))
+                b = build_class(config, build_name='{}Editor'.format(config.uproject_name))
                 if not b.run():
                     error_exit(b.error, not config.automated)
 
@@ -174,24 +264,183 @@ def build_script(engine, script, configuration, buildtype, build, platform, clea
             # to compile the blueprints. Usually you would be starting a package build from the editor, so it makes
             # sense. Explicit builds ignore this however.
             if not buildexplicit:
-                b = Build(config, build_name='{}Editor'.format(config.uproject_name))
+                b = build_class(config, build_name='{}Editor'.format(config.uproject_name))
                 if not b.run():
                     error_exit(b.error, not config.automated)
 
             if 'package_steps' in config.script:
-                steps = Buildsteps(config, steps_name='package_steps')
+                steps = buildsteps_class(config, steps_name='package_steps')
                 if not steps.run():
                     error_exit(steps.error, not config.automated)
             else:
-                package = Package(config)
+                package = package_class(config)
                 if not package.run():
                     error_exit(package.error, not config.automated)
 
+    from utility.filesystem import deferred_deletions
+    if deferred_deletions.pending():
+        print_action('Waiting for {} background deletions to finish'.format(deferred_deletions.pending()))
+    for deletion_error in deferred_deletions.wait():
+        print_warning(deletion_error)
+
     print_action('SUCCESS!')
     if not config.automated and pause_always:
         click.pause()
 
 
+def make_build_plan(config, buildtype, build, buildexplicit):
+    """
+    Resolve everything the build would do without launching any tools, following the same decisions as the build.
+    The engine is not synced or checked for dependencies, the plan is made against the engine as it is.
+    :param config: The loaded project configuration
+    :return: The plan, a json serializable dict
+    """
+    build_plan = {'project': config.uproject_file_path,
+                  'engine': config.UE4EnginePath,
+                  'engine_version': '{}.{}.{}'.format(config.engine_major_version, config.engine_minor_version,
+                                                      config.engine_patch_version),
+                  'version': config.version_str,
+                  'platform': config.platform,
+                  'configuration': config.configuration,
+                  'buildtype': buildtype,
+                  'build': build,
+                  'clean': config.clean,
+                  'actions': []}
+    if config.UE4EnginePath == '':
+        build_plan['error'] = 'No engine found. A build would try to sync or ask for the engine first.'
+        return build_plan
+
+    build_class = action_registry.get_action_class('actions.build')
+    buildsteps_class = action_registry.get_action_class('actions.buildsteps')
+    package_class = action_registry.get_action_class('actions.package')
+
+    def plan_action(desc, action):
+        action_plan = {'desc': desc, 'action': type(action).__name__}
+        verify_error = action.verify()
+        if len(action.warnings):
+            action_plan['warnings'] = action.warnings
+        if verify_error != '':
+            action_plan.update(status='error', error=verify_error)
+        else:
+            action_plan['status'] = 'run'
+            action_plan.update(action.plan())
+        build_plan['actions'].append(action_plan)
+
+    needs_header_tool = config.engine_major_version < 5 or \
+        (config.engine_major_version == 5 and config.engine_minor_version < 3)
+    if not buildexplicit and needs_header_tool:
+        if not os.path.isfile(os.path.join(config.UE4EnginePath, 'Engine\\Binaries\\Win64\\UnrealHeaderTool.exe')):
+            plan_action('UnrealHeaderTool', build_class(config, build_name='UnrealHeaderTool'))
+
+    if config.should_build_engine_tools and not buildexplicit:
+        clean_revert = config.clean
+        if buildtype == "Package":
+            config.clean = False
+        if are_engine_tools_up_to_date(config, BuildMeta('project_build_meta'), clean_revert):
+            build_plan['actions'].append({'desc': 'Engine tools', 'action': 'Build', 'status': 'up_to_date'})
+        else:
+            plan_action('Engine tools', build_class(config, build_names=config.build_engine_tools))
+        config.clean = clean_revert
+
+    if build != '':
+        plan_action(build, buildsteps_class(config, steps_name=build))
+    elif buildtype == "Editor":
+        if config.editor_running:
+            build_plan['error'] = 'Cannot build the Editor while the editor is running!'
+        elif 'game_editor_steps' in config.script:
+            plan_action('game_editor_steps', buildsteps_class(config, steps_name='game_editor_steps'))
+        elif 'editor_steps' in config.script:
+            plan_action('editor_steps', buildsteps_class(config, steps_name='editor_steps'))
+        else:
+            plan_action('Editor', build_class(config, build_name='{}Editor'.format(config.uproject_name)))
+    elif buildtype == "Package":
+        if not buildexplicit:
+            plan_action('Editor', build_class(config, build_name='{}Editor'.format(config.uproject_name)))
+        if 'package_steps' in config.script:
+            plan_action('package_steps', buildsteps_class(config, steps_name='package_steps'))
+        else:
+            plan_action('Package', package_class(config))
+    return build_plan
+
+
+def get_plan_errors(plan):
+    """
+    :param plan: A build plan, or the plan of one of its actions or steps
+    :return: List of the errors in the plan which would fail the build
+    """
+    errors = []
+    if 'error' in plan and plan.get('status') != 'allowed_failure':
+        errors.append(plan['error'])
+    for child_plan in plan.get('actions', []) + plan.get('steps', []):
+        errors.extend(get_plan_errors(child_plan))
+    return errors
+
+
+def get_engine_tools_fingerprint(config):
+    """
+    Fingerprint everything the engine tools are built from: the engine revision, local changes and new files in the
+    engine source and the build receipts of the tools under Engine/Binaries.
+    :param config: The project configuration
+    :return: The fingerprint, or empty string if any of the tools have not been built or the state is unknown
+    """
+    hasher = hashlib.sha256()
+    hasher.update(json.dumps([config.build_engine_tools, config.platform, config.configuration]).encode())
+
+    if os.path.isdir(os.path.join(config.UE4EnginePath, '.git')):
+        try:
+            head = subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=config.UE4EnginePath)
+            # Modified and new files are fingerprinted by size and time, they can change again without the status
+            # changing. New files count, ex. a new plugin module is built into the tools.
+            status = subprocess.check_output(['git', 'status', '--porcelain', '-z', '--untracked-files=all', '--',
+                                              'Engine/Source', 'Engine/Plugins', 'Engine/Config'],
+                                             cwd=config.UE4EnginePath)
+        except (OSError, subprocess.CalledProcessError):
+            return ''
+        hasher.update(head)
+        hasher.update(status)
+        for entry in status.decode('utf-8', errors='replace').split('\0'):
+            file_path = os.path.join(config.UE4EnginePath, entry[3:])
+            if len(entry) > 3 and os.path.isfile(file_path):
+                stat_info = os.stat(file_path)
+                hasher.update('{}|{}|{}'.format(entry, stat_info.st_size, stat_info.st_mtime_ns).encode())
+    else:
+        # Engines not synced with git, fall back on the engine version
+        version_path = os.path.join(config.UE4EnginePath, 'Engine', 'Build', 'Build.version')
+        if not os.path.isfile(version_path):
+            return ''
+        with open(version_path, 'rb') as fp:
+            hasher.update(fp.read())
+
+    binaries_path = os.path.join(config.UE4EnginePath, 'Engine', 'Binaries', config.platform)
+    for tool_name in config.build_engine_tools:
+        # Only Development receipts go without the platform and configuration, another configurations receipt
+        # left from an earlier build must not stand in for this one
+        if config.configuration == 'Development':
+            receipt_path = os.path.join(binaries_path, '{}.target'.format(tool_name))
+        else:
+            receipt_path = os.path.join(binaries_path, '{}-{}-{}.target'.format(tool_name, config.platform,
+                                                                               config.configuration))
+        if not os.path.isfile(receipt_path):
+            return ''
+        stat_info = os.stat(receipt_path)
+        hasher.update('{}|{}|{}'.format(receipt_path, stat_info.st_size, stat_info.st_mtime_ns).encode())
+    return hasher.hexdigest()
+
+
+def are_engine_tools_up_to_date(config, build_meta, rebuild):
+    """
+    Check if the engine tools were last built from what the engine is now, so building them can be skipped
+    :param config: The project configuration
+    :param build_meta: The project build meta, holding the fingerprint of the last tools build
+    :param rebuild: True if the tools are rebuilt anyway, ex. on a clean or an engine branch switch
+    :return: True if the tools are up to date
+    """
+    if rebuild:
+        return False
+    tools_fingerprint = get_engine_tools_fingerprint(config)
+    return tools_fingerprint != '' and tools_fingerprint == getattr(build_meta, 'engine_tools_fingerprint', '')
+
+
 def ensure_engine(config, engine_override):
     """
     Pre-work step of ensuring we have a valid engine and enough components exist to do work
@@ -264,15 +513,20 @@ def ensure_engine(config, engine_override):
 
     # Before doing anything, make sure we have all build dependencies ready
     if can_pull_engine:
-        git_action = Git(config)
+        git_action = action_registry.get_action_class('actions.git')(config)
         git_action.branch_name = config.git_engine_branch
         git_action.similar_branches = config.git_engine_similar_branches
         git_action.repo_name = config.git_engine_repo
         git_action.output_folder = engine_path
         git_action.disable_strict_hostkey_check = True
         git_action.force_repull = False
-        if not git_action.run():
-            error_exit(git_action.error, not config.automated)
+        git_action.depth = config.git_engine_depth
+        git_action.filter = config.git_engine_filter
+        git_action.single_branch = config.git_engine_single_branch
+        git_action.sparse_paths = config.git_engine_sparse_paths
+        with tracer.span('Engine git sync'):
+            if not git_action.run():
+                error_exit(git_action.error, not config.automated)
         engine_branch_switched = git_action.branch_switched
 
     if not config.setup_engine_paths(engine_path):
@@ -302,8 +556,12 @@ def ensure_engine(config, engine_override):
         for extra_exclude in config.extra_dependency_excludes:
             add_dep_exclude(extra_exclude, cmd_args)
 
-        if launch(config.UE4GitDependenciesPath, cmd_args) != 0:
-            error_exit('Engine dependencies Failed to Sync!', not config.automated)
+        with tracer.span('GitDependencies sync'):
+            result = run_process(config.UE4GitDependenciesPath, cmd_args,
+                                 log_path=os.path.join(config.logs_path, 'GitDependencies.log'))
+        if result.exit_code != 0:
+            error_exit('Engine dependencies Failed to Sync!\n{}'.format(result.get_failure_summary()),
+                       not config.automated)
 
         if not os.path.isfile(config.UE4UBTPath):
             # The unreal build tool does not exist, we need to build it first
@@ -313,8 +571,12 @@ def ensure_engine(config, engine_override):
             extra_args = []
             if config.engine_major_version == 4 and config.engine_minor_version <= 25:
                 extra_args.append('-VS{}'.format(get_visual_studio_version(config.get_suitable_vs_versions())))
-            if launch(config.UE4GenProjFilesPath, extra_args) != 0:
-                error_exit('Failed to build UnrealBuildTool.exe!', not config.automated)
+            with tracer.span('UnrealBuildTool bootstrap'):
+                result = run_process(config.UE4GenProjFilesPath, extra_args,
+                                     log_path=os.path.join(config.logs_path, 'GenerateProjectFiles.log'))
+            if result.exit_code != 0:
+                error_exit('Failed to build UnrealBuildTool.exe!\n{}'.format(result.get_failure_summary()),
+                           not config.automated)
     return engine_branch_switched
 
 if __name__ == "__main__":
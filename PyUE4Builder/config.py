@@ -5,8 +5,8 @@ import re
 import json
 from copy import deepcopy
 from pathlib import Path
-from winregistry import WinRegistry as Reg
 from utility.common import check_engine_dir_valid, is_editor_running
+from utility.frozen import freeze, thaw
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -51,6 +51,9 @@ class ProjectConfig(object):
         # Path to where package builds are placed
         self.builds_path = ''
 
+        # Path to where the output of tools run during the build is logged
+        self.logs_path = ''
+
         # The name of the uproject
         self.uproject_name = ''
         # This is the path to the project directory
@@ -78,6 +81,18 @@ class ProjectConfig(object):
         # Allows disabling the automatic building of engine tools to specify them yourself in your build script.
         self.should_build_engine_tools = True
 
+        # If true, build actions with several targets (like the engine tools) build them all in one UnrealBuildTool
+        # run instead of one run per target. Requires engine 4.22 or newer, older engines build one at a time.
+        self.batch_build_targets = False
+
+        # The maximum number of build steps run at once when steps declare depends_on. 0 uses the number of CPUs.
+        self.max_parallel_steps = 0
+
+        # Where results of build steps marked with "cache" are recorded, and the size cap of that store in bytes.
+        # Relative paths are relative to the current working directory, like the build meta.
+        self.step_cache_dir = 'step_cache'
+        self.step_cache_max_bytes = 16 * 1024 * 1024
+
         # The path (relative or absolute) of the uproject file.
         self.project_path = ''
 
@@ -98,6 +113,13 @@ class ProjectConfig(object):
         self.git_engine_similar_branches = []
         self.git_engine_branch = ''  # The branch to use in git repo
         self.git_engine_repo = ''  # ex: git@github.com:MyProject/UnrealEngine.git
+        # Reduce the size of fresh engine pulls. A history depth of 0 fetches all history, a filter like blob:none
+        # only fetches file contents as they are checked out, single branch skips the remotes other branches and
+        # sparse paths limits the checked out directories.
+        self.git_engine_depth = 0
+        self.git_engine_filter = ''
+        self.git_engine_single_branch = False
+        self.git_engine_sparse_paths = []
 
         # Registry keys and values related to unreal engine paths and our special engine name
         # If set to nothing, no registery checks or registration of the engine will be performed.
@@ -136,14 +158,15 @@ class ProjectConfig(object):
             return False
 
         try:
-            self.script = deepcopy(script_json)
+            # The script is read only so it can be shared with every action without copying it
+            self.script = freeze(script_json)
             for k, v in self.script["config"].items():
                 if k == 'git_proj_branch':
-                    setattr(self, 'git_engine_branch', deepcopy(v))
+                    setattr(self, 'git_engine_branch', thaw(v))
                 elif k == 'git_repo':
-                    setattr(self, 'git_engine_repo', deepcopy(v))
+                    setattr(self, 'git_engine_repo', thaw(v))
                 else:
-                    setattr(self, k, deepcopy(v))
+                    setattr(self, k, thaw(v))
         except Exception as e:
             print_error(e)
             return False
@@ -169,6 +192,7 @@ class ProjectConfig(object):
             pass
 
         self.builds_path = os.path.join(self.uproject_dir_path, 'builds')
+        self.logs_path = os.path.join(self.uproject_dir_path, 'Saved', 'Logs', 'PyUE4Builder')
 
         found_engine = self.setup_engine_paths(custom_engine_path)
         if ensure_engine and not found_engine:
@@ -189,18 +213,11 @@ class ProjectConfig(object):
             self.UE4EnginePath = custom_engine_path
         if self.UE4EngineKeyName != '' and not os.path.isdir(self.UE4EnginePath):
             # search the registry and see if the engine is registered elsewhere
-            reg = Reg()
-            try:
-                registered_engines = reg.read_key(self.UE4EngineBuildsReg)['values']
-                for engine in registered_engines:
-                    if engine['value'] == self.UE4EngineKeyName:
-                        # this is it!
-                        self.UE4EnginePath = engine['data']
-                        break
-                else:
-                    self.UE4EnginePath = ''
-                    result = False
-            except Exception:
+            from utility.platforms import get_platform_backend
+            registered_engines = get_platform_backend().get_registered_engines(self.UE4EngineBuildsReg)
+            if self.UE4EngineKeyName in registered_engines:
+                self.UE4EnginePath = registered_engines[self.UE4EngineKeyName]
+            else:
                 # No keys exist do a fresh installation!
                 self.UE4EnginePath = ''
                 result = False
@@ -273,6 +290,14 @@ class ProjectConfig(object):
                 return [2015]
         return []
 
+    def view(self):
+        """
+        Create a view of this configuration to hand to an action. The action can read and change the view as it
+        likes without the changes reaching this configuration, and nothing is copied up front.
+        :return: ConfigView of this configuration
+        """
+        return ConfigView(self)
+
     def check_environment(self):
         """
         Check that the environment is sound for building
@@ -303,3 +328,26 @@ class ProjectConfig(object):
                     version_number = m.group('version')
                     break
         return version_number
+
+
+class ConfigView(ProjectConfig):
+    """
+    A copy on write view of a configuration.
+    Settings are read from the base configuration, settings set on the view only change the view. Modifiable
+    settings (lists, dicts, sets) are copied into the view the first time they are read, so changing them in place
+    doesn't reach the base either. The script is frozen at load so it is shared as is.
+    """
+    def __init__(self, base_config):
+        # ProjectConfig.__init__ is deliberately not called, every setting not set on the view comes from the base
+        self.__dict__['base_config'] = base_config
+
+    def __getattr__(self, name):
+        # Only called for settings which are not set on the view itself
+        base_config = self.__dict__.get('base_config')
+        if base_config is None or name.startswith('__'):
+            raise AttributeError(name)
+        value = getattr(base_config, name)
+        if type(value) in (list, dict, set):
+            value = deepcopy(value)
+            self.__dict__[name] = value
+        return value
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import click
+import subprocess
+from utility.common import print_action, error_exit
+from utility.daemon import BuilderDaemon, send_daemon_request, daemon_info_path
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def get_daemon_status():
+    """
+    :return: The status dict of the running daemon, or None if no daemon is running
+    """
+    try:
+        for message in send_daemon_request({'command': 'status'}):
+            if 'status' in message:
+                return message['status']
+    except (OSError, ValueError):
+        pass
+    return None
+
+
+@click.group()
+def daemon():
+    """
+    The builder daemon keeps a builder process running so build_script.py and tools.py commands don't have to start
+    and load everything from scratch. While it runs, those commands are sent to it and their output is streamed back.
+    """
+    pass
+
+
+@daemon.command()
+@click.option('--port', '-p',
+              type=click.INT,
+              default=0,
+              show_default=True,
+              help='The local port to listen on, 0 picks a free port.')
+@click.option('--detach/--no-detach',
+              default=False,
+              show_default=True,
+              help='Run the daemon in the background, its output is written to a daemon.log next to its info file.')
+def start(port, detach):
+    """ Start the daemon, it runs until stopped """
+    status = get_daemon_status()
+    if status is not None:
+        error_exit('The daemon is already running (pid {}, port {})'.format(status['pid'], status['port']), False)
+
+    if detach:
+        log_path = os.path.join(os.path.dirname(daemon_info_path), 'daemon.log')
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        popen_args = {}
+        if sys.platform == 'win32':
+            popen_args['creationflags'] = subprocess.DETACHED_PROCESS | subprocess.CREATE_NEW_PROCESS_GROUP
+        else:
+            popen_args['start_new_session'] = True
+        with open(log_path, 'a') as log_file:
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), 'start', '--port', str(port)],
+                             stdin=subprocess.DEVNULL, stdout=log_file, stderr=subprocess.STDOUT,
+                             cwd=os.path.dirname(os.path.abspath(__file__)), **popen_args)
+        for _ in range(100):
+            status = get_daemon_status()
+            if status is not None:
+                click.secho('Daemon started (pid {}, port {})'.format(status['pid'], status['port']))
+                return
+            time.sleep(0.1)
+        error_exit('The daemon did not start, see {}'.format(log_path), False)
+
+    builder_daemon = BuilderDaemon(port)
+    print_action('Starting builder daemon')
+    try:
+        builder_daemon.serve()
+    except KeyboardInterrupt:
+        pass
+    click.secho('Daemon stopped')
+
+
+@daemon.command()
+def stop():
+    """ Stop the daemon once the command it is running finishes """
+    try:
+        for _ in send_daemon_request({'command': 'stop'}):
+            pass
+    except (OSError, ValueError):
+        error_exit('The daemon is not running', False)
+    # The daemon removes its info once it has stopped
+    while os.path.isfile(daemon_info_path):
+        time.sleep(0.1)
+    click.secho('Daemon stopped')
+
+
+@daemon.command()
+def status():
+    """ Print the status of the daemon """
+    daemon_status = get_daemon_status()
+    if daemon_status is None:
+        error_exit('The daemon is not running', False)
+    click.secho('Daemon running (pid {}, port {}) for {}s, {} commands run'.format(
+        daemon_status['pid'], daemon_status['port'], daemon_status['uptime_s'], daemon_status['jobs_run']))
+    current_job = daemon_status['current_job']
+    if current_job is not None:
+        click.secho('Running: {} {} in {}'.format(current_job['command'], ' '.join(current_job['args']),
+                                                 current_job['cwd']))
+
+
+if __name__ == "__main__":
+    daemon()
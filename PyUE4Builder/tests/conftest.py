@@ -0,0 +1,13 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+# The builder imports its modules from the PyUE4Builder folder, like the scripts do when run from there
+builder_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if builder_path not in sys.path:
+    sys.path.insert(0, builder_path)
@@ -0,0 +1,70 @@
+#!/usr/bin/env python
+
+import os
+import subprocess
+from types import SimpleNamespace
+import pytest
+from build_script import get_engine_tools_fingerprint, are_engine_tools_up_to_date
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def git(engine_dir, *args):
+    subprocess.check_call(['git', '-c', 'user.name=Builder', '-c', 'user.email=builder@localhost'] + list(args),
+                          cwd=engine_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+
+@pytest.fixture
+def engine_config(tmp_path):
+    """
+    The configuration of a git synced engine with its tools built for Win64 Development
+    """
+    engine_dir = tmp_path / 'UnrealEngine'
+    source_dir = engine_dir / 'Engine' / 'Source'
+    source_dir.mkdir(parents=True)
+    (source_dir / 'Engine.Build.cs').write_text('engine')
+    try:
+        git(str(engine_dir), 'init', '-q')
+        git(str(engine_dir), 'add', '-A')
+        git(str(engine_dir), 'commit', '-q', '-m', 'Engine')
+    except OSError:
+        pytest.skip('git is not installed')
+    binaries_dir = engine_dir / 'Engine' / 'Binaries' / 'Win64'
+    binaries_dir.mkdir(parents=True)
+    for tool_name in ['ShaderCompileWorker', 'UnrealPak']:
+        (binaries_dir / '{}.target'.format(tool_name)).write_text('{}')
+    return SimpleNamespace(UE4EnginePath=str(engine_dir), build_engine_tools=['ShaderCompileWorker', 'UnrealPak'],
+                           platform='Win64', configuration='Development')
+
+
+def test_fingerprint_new_source_file(engine_config):
+    fingerprint = get_engine_tools_fingerprint(engine_config)
+    assert fingerprint != ''
+    assert get_engine_tools_fingerprint(engine_config) == fingerprint
+    module_dir = os.path.join(engine_config.UE4EnginePath, 'Engine', 'Plugins', 'MyPlugin', 'Source', 'MyModule')
+    os.makedirs(module_dir)
+    with open(os.path.join(module_dir, 'MyModule.Build.cs'), 'w') as fp:
+        fp.write('module')
+    assert get_engine_tools_fingerprint(engine_config) != fingerprint
+
+
+def test_fingerprint_other_configuration_receipt(engine_config):
+    # Only Development receipts of the tools exist
+    engine_config.configuration = 'Debug'
+    assert get_engine_tools_fingerprint(engine_config) == ''
+    binaries_dir = os.path.join(engine_config.UE4EnginePath, 'Engine', 'Binaries', 'Win64')
+    with open(os.path.join(binaries_dir, 'ShaderCompileWorker-Win64-Debug.target'), 'w') as fp:
+        fp.write('{}')
+    assert get_engine_tools_fingerprint(engine_config) == ''
+    with open(os.path.join(binaries_dir, 'UnrealPak-Win64-Debug.target'), 'w') as fp:
+        fp.write('{}')
+    assert get_engine_tools_fingerprint(engine_config) != ''
+
+
+def test_engine_tools_up_to_date(engine_config):
+    build_meta = SimpleNamespace(engine_tools_fingerprint=get_engine_tools_fingerprint(engine_config))
+    assert are_engine_tools_up_to_date(engine_config, build_meta, False)
+    assert not are_engine_tools_up_to_date(engine_config, build_meta, True)
+    assert not are_engine_tools_up_to_date(engine_config, SimpleNamespace(), False)
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import os
+import json
+import contextlib
+from config import ProjectConfig
+from actions.buildsteps import Buildsteps
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+tool_action_source = '''import sys
+from actions.action import Action
+
+
+class Tool(Action):
+    def __init__(self, config, **kwargs):
+        super().__init__(config, **kwargs)
+        self.value = kwargs['value']
+
+    def run(self):
+        result = self.run_tool(sys.executable, ['-c', 'pass'], 'Tool', quiet=True)
+        return result.exit_code == 0
+'''
+
+
+def make_script(dir_path, steps):
+    """
+    A script of a minimal project and engine, enough to load its configuration without an engine install
+    """
+    project_dir = os.path.join(dir_path, 'MyGame')
+    engine_dir = os.path.join(dir_path, 'UnrealEngine')
+    os.makedirs(os.path.join(project_dir, 'Config'))
+    with open(os.path.join(project_dir, 'MyGame.uproject'), 'w') as fp:
+        fp.write('{}')
+    os.makedirs(os.path.join(engine_dir, 'Engine', 'Build'))
+    build_version = json.dumps({'MajorVersion': 4, 'MinorVersion': 27, 'PatchVersion': 2})
+    for version_path in {os.path.join(engine_dir, 'Engine', 'Build', 'Build.version'),
+                         os.path.join(engine_dir, 'Engine\\Build\\Build.version')}:
+        with open(version_path, 'w') as fp:
+            fp.write(build_version)
+    return {'config': {'project_path': os.path.join(project_dir, 'MyGame.uproject'),
+                       'engine_path_name': engine_dir,
+                       'UE4EngineKeyName': ''},
+            'steps': steps}
+
+
+def test_parallel_sub_steps(tmp_path, monkeypatch):
+    """
+    Sub build steps running at the same time, themselves running their steps at the same time, must keep each
+    others persisted meta and write their own logs
+    """
+    actions_dir = tmp_path / 'steps_test_actions'
+    actions_dir.mkdir()
+    (actions_dir / '__init__.py').write_text('')
+    (actions_dir / 'tool.py').write_text(tool_action_source)
+    monkeypatch.syspath_prepend(str(tmp_path))
+    monkeypatch.chdir(tmp_path)
+
+    sub_names = ['Sub{}'.format(i) for i in range(3)]
+    tool_ids = ['a', 'b']
+    steps = [{'id': name, 'depends_on': [], 'action': {'module': 'actions.buildsteps', 'args': {'steps_name': name}}}
+             for name in sub_names]
+    script_json = make_script(str(tmp_path), steps)
+    for name in sub_names:
+        script_json[name] = [{'id': tool_id, 'depends_on': [],
+                              'action': {'module': 'steps_test_actions.tool',
+                                         'args': {'value': '{}{}'.format(name, tool_id)},
+                                         'persist_meta': {'value_{}{}'.format(name, tool_id): 'value'}}}
+                             for tool_id in tool_ids]
+    config = ProjectConfig()
+    config.load_configuration(script_json, ensure_engine=False)
+    config.logs_path = str(tmp_path / 'logs')
+    config.max_parallel_steps = len(sub_names) * len(tool_ids)
+
+    steps_action = Buildsteps(config, steps_name='steps')
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        assert steps_action.run(), steps_action.error
+
+    with open('project_build_meta.json', 'r') as fp:
+        build_meta = json.load(fp)
+    for name in sub_names:
+        for tool_id in tool_ids:
+            assert build_meta.get('value_{}{}'.format(name, tool_id)) == '{}{}'.format(name, tool_id)
+    assert sorted(os.listdir(config.logs_path)) == sorted('{}-{}-Tool.log'.format(name, tool_id)
+                                                          for name in sub_names for tool_id in tool_ids)
@@ -0,0 +1,27 @@
+#!/usr/bin/env python
+
+from types import SimpleNamespace
+import pytest
+from utility.conditions import ConditionNode, compile_condition
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def test_condition_node_is_abstract():
+    with pytest.raises(TypeError):
+        ConditionNode('text')
+
+
+@pytest.mark.parametrize('condition, expected', [
+    ('automated', ''),
+    ('not automated, clean', 'not automated'),
+    ('version >= 2 and platform == "Win64"', ''),
+    ('version < 2 or platform != "Win64"', 'version < 2 or platform != "Win64"'),
+    ('missing_name', ''),
+])
+def test_condition_check(condition, expected):
+    config = SimpleNamespace(automated=True, clean=True, platform='Win64')
+    meta = SimpleNamespace(version=3)
+    assert compile_condition(condition).check((meta, config)) == expected
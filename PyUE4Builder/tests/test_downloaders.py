@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+import os
+import re
+import hashlib
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import pytest
+from utility.downloaders import download_file
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+file_data = bytes(range(256)) * 4096
+segment_size = len(file_data) // 4
+
+
+class DownloadRequestHandler(BaseHTTPRequestHandler):
+    """
+    Serves the files of its server, with byte ranges if the server accepts them
+    """
+    def log_message(self, *args):
+        pass
+
+    def send_file_head(self):
+        """
+        :return: The bytes of the file to send, None if there is no such file
+        """
+        data = self.server.files.get(self.path.lstrip('/'))
+        if data is None:
+            self.send_error(404)
+            return None
+        start = 0
+        end = len(data) - 1
+        range_match = re.match(r'bytes=(\d+)-(\d*)$', self.headers.get('Range', ''))
+        if self.server.accepts_ranges and range_match:
+            start = int(range_match.group(1))
+            end = int(range_match.group(2) or end)
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {}-{}/{}'.format(start, end, len(data)))
+        else:
+            self.send_response(200)
+        if self.server.accepts_ranges:
+            self.send_header('Accept-Ranges', 'bytes')
+        self.send_header('Content-Length', str(end + 1 - start))
+        self.send_header('ETag', '"1"')
+        self.end_headers()
+        return data[start:end + 1]
+
+    def do_HEAD(self):
+        self.send_file_head()
+
+    def do_GET(self):
+        server = self.server
+        with server.lock:
+            server.ranges.append(self.headers.get('Range'))
+        body = self.send_file_head()
+        if body is None:
+            return
+        # Sending less than the Content-Length and closing is how a dropped connection looks to the client
+        with server.lock:
+            send_size = len(body) if server.response_limit < 0 else min(len(body), server.response_limit)
+            if server.byte_budget >= 0:
+                send_size = min(send_size, server.byte_budget)
+                server.byte_budget -= send_size
+            server.bytes_sent += send_size
+        self.wfile.write(body[:send_size])
+
+
+class DownloadServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, files):
+        super().__init__(('127.0.0.1', 0), DownloadRequestHandler)
+        self.files = files
+        self.lock = threading.Lock()
+        self.accepts_ranges = True
+        # The most bytes sent by a response, and by all responses together, -1 for no limit
+        self.response_limit = -1
+        self.byte_budget = -1
+        # The Range header of each GET, None if it had none
+        self.ranges = []
+        self.bytes_sent = 0
+
+    def get_url(self, file_name):
+        return 'http://127.0.0.1:{}/{}'.format(self.server_address[1], file_name)
+
+
+@pytest.fixture
+def server():
+    download_server = DownloadServer({'data.bin': file_data})
+    thread = threading.Thread(target=download_server.serve_forever, daemon=True)
+    thread.start()
+    yield download_server
+    download_server.shutdown()
+    download_server.server_close()
+
+
+def download(server, output_folder, **kwargs):
+    return download_file(server.get_url('data.bin'), str(output_folder), simple_loading=True, segments=4,
+                         progress_interval=0.05, min_segment_size=segment_size, **kwargs)
+
+
+def read_file(file_path):
+    with open(file_path, 'rb') as fp:
+        return fp.read()
+
+
+def test_segmented_download(server, tmp_path):
+    file_path = download(server, tmp_path)
+    assert read_file(file_path) == file_data
+    assert os.listdir(str(tmp_path)) == ['data.bin']
+    assert sorted(server.ranges) == sorted('bytes={}-{}'.format(start, start + segment_size - 1)
+                                           for start in range(0, len(file_data), segment_size))
+
+
+def test_dropped_connections_reconnect(server, tmp_path):
+    server.response_limit = segment_size // 3
+    file_path = download(server, tmp_path, retries=0)
+    assert read_file(file_path) == file_data
+    assert server.bytes_sent == len(file_data)
+
+
+def test_resume_interrupted_download(server, tmp_path, capsys):
+    interrupted_size = segment_size + segment_size // 2
+    server.byte_budget = interrupted_size
+    with pytest.raises(ConnectionError):
+        download(server, tmp_path, retries=0)
+    assert not os.path.exists(str(tmp_path / 'data.bin'))
+    assert os.path.getsize(str(tmp_path / 'data.bin.part')) == len(file_data)
+
+    server.byte_budget = -1
+    server.bytes_sent = 0
+    capsys.readouterr()
+    file_path = download(server, tmp_path)
+    assert 'Resuming download at {} bytes'.format(interrupted_size) in capsys.readouterr().out
+    assert server.bytes_sent == len(file_data) - interrupted_size
+    assert read_file(file_path) == file_data
+    assert os.listdir(str(tmp_path)) == ['data.bin']
+
+
+def test_truncated_part_restarts(server, tmp_path, capsys):
+    server.byte_budget = segment_size
+    with pytest.raises(ConnectionError):
+        download(server, tmp_path, retries=0)
+    # The progress of the segments doesn't describe a partial file which isn't whole anymore
+    with open(str(tmp_path / 'data.bin.part'), 'r+b') as fp:
+        fp.truncate(segment_size // 2)
+
+    server.byte_budget = -1
+    server.bytes_sent = 0
+    capsys.readouterr()
+    file_path = download(server, tmp_path)
+    assert 'Resuming download' not in capsys.readouterr().out
+    assert server.bytes_sent == len(file_data)
+    assert read_file(file_path) == file_data
+
+
+def test_checksum(server, tmp_path):
+    checksum = hashlib.sha256(file_data).hexdigest()
+    file_path = download(server, tmp_path, checksum=checksum.upper())
+    assert read_file(file_path) == file_data
+
+
+def test_checksum_mismatch(server, tmp_path):
+    with pytest.raises(ValueError):
+        download(server, tmp_path, checksum=hashlib.sha256(b'other').hexdigest())
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_no_range_support_single_download(server, tmp_path):
+    server.accepts_ranges = False
+    file_path = download(server, tmp_path)
+    assert read_file(file_path) == file_data
+    assert server.ranges == [None]
+    assert os.listdir(str(tmp_path)) == ['data.bin']
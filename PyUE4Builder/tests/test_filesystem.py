@@ -0,0 +1,80 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import subprocess
+import pytest
+from utility.filesystem import delete_tree, delete_trees, DeferredDeletions
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def make_symlink(target_dir, link_path):
+    try:
+        os.symlink(target_dir, link_path, target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('Symlinks can not be made here (ex. no Windows privilege)')
+
+
+def make_junction(target_dir, link_path):
+    if sys.platform != 'win32':
+        pytest.skip('Junctions only exist on Windows')
+    subprocess.check_call(['cmd', '/c', 'mklink', '/J', link_path, target_dir], stdout=subprocess.DEVNULL)
+
+
+@pytest.fixture(params=['symlink', 'junction'])
+def linked_dir(request, tmp_path):
+    """
+    A directory with a file in it and a link to the directory
+    :return: (link path, target file)
+    """
+    target_dir = tmp_path / 'target'
+    target_dir.mkdir()
+    target_file = target_dir / 'keep.txt'
+    target_file.write_text('keep')
+    link_path = str(tmp_path / 'link')
+    if request.param == 'symlink':
+        make_symlink(str(target_dir), link_path)
+    else:
+        make_junction(str(target_dir), link_path)
+    return link_path, str(target_file)
+
+
+def test_delete_tree_link_root(linked_dir):
+    link_path, target_file = linked_dir
+    delete_tree(link_path)
+    assert os.path.isfile(target_file)
+    assert not os.path.lexists(link_path)
+
+
+def test_delete_trees_link_root(linked_dir, tmp_path):
+    link_path, target_file = linked_dir
+    other_dir = tmp_path / 'other'
+    (other_dir / 'sub').mkdir(parents=True)
+    (other_dir / 'sub' / 'file.txt').write_text('delete')
+    delete_trees([link_path, str(other_dir)])
+    assert os.path.isfile(target_file)
+    assert not os.path.lexists(link_path)
+    assert not os.path.exists(str(other_dir))
+
+
+def test_delete_tree_link_inside(linked_dir, tmp_path):
+    link_path, target_file = linked_dir
+    root_dir = tmp_path / 'root'
+    root_dir.mkdir()
+    inner_link = str(root_dir / 'link')
+    os.rename(link_path, inner_link)
+    delete_tree(str(root_dir))
+    assert os.path.isfile(target_file)
+    assert not os.path.exists(str(root_dir))
+
+
+def test_deferred_delete_link_root(linked_dir):
+    link_path, target_file = linked_dir
+    deletions = DeferredDeletions()
+    deletions.delete_tree(link_path)
+    assert deletions.wait() == []
+    assert os.path.isfile(target_file)
+    assert not os.path.lexists(link_path)
@@ -0,0 +1,16 @@
+#!/usr/bin/env python
+
+import pytest
+from benchmark import measure_import_time, import_time_budget_ms
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+@pytest.mark.parametrize('command_args', [['build_script.py', '--help'], ['tools.py', '--help']])
+def test_import_time_budget(command_args):
+    # The best of a few runs, a single run can be slowed down by whatever else the machine is doing
+    total = min(measure_import_time(command_args)[0] for _ in range(3))
+    assert total * 1000 <= import_time_budget_ms, '{} spent {:.1f} ms importing, the budget is {:.1f} ms'.format(
+        ' '.join(command_args), total * 1000, import_time_budget_ms)
@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+
+import pytest
+from utility.platforms import PlatformBackend, InstallIniPlatformBackend
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def test_install_ini_register_engine(tmp_path):
+    install_ini_path = tmp_path / 'Epic' / 'UnrealEngine' / 'Install.ini'
+    backend = InstallIniPlatformBackend(str(install_ini_path))
+    assert backend.get_registered_engines('') == {}
+    backend.register_engine('', 'MyEngine', '/engines/MyEngine')
+    assert backend.get_registered_engines('') == {'MyEngine': '/engines/MyEngine'}
+    backend.register_engine('', 'myengine', '/engines/Other')
+    assert InstallIniPlatformBackend(str(install_ini_path)).get_registered_engines('') == {
+        'MyEngine': '/engines/MyEngine', 'myengine': '/engines/Other'}
+
+
+def test_unsupported_register_engine(capsys):
+    with pytest.raises(SystemExit) as exit_info:
+        PlatformBackend().register_engine('', 'MyEngine', '/engines/MyEngine')
+    assert exit_info.value.code == 1
+    assert 'Registering the engine /engines/MyEngine is not supported' in capsys.readouterr().out
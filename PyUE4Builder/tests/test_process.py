@@ -0,0 +1,50 @@
+#!/usr/bin/env python
+
+import sys
+import threading
+import pytest
+from utility.process import run_process
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+# Uses a known amount of memory and CPU time
+busy_source = '''import time
+block = bytearray(128 * 1024 * 1024)
+end = time.process_time() + 0.2
+while time.process_time() < end:
+    pass
+'''
+
+
+def test_run_process_exit_code(tmp_path):
+    log_path = str(tmp_path / 'tool.log')
+    result = run_process(sys.executable, ['-c', 'import sys\nprint("out")\nsys.exit(3)'], log_path=log_path,
+                         silent=True, quiet=True)
+    assert result.exit_code == 3
+    assert list(result.tail) == ['out']
+
+
+def test_run_process_usage():
+    result = run_process(sys.executable, ['-c', busy_source], silent=True, quiet=True)
+    assert result.exit_code == 0
+    assert result.cpu_time >= 0.2
+    assert result.peak_rss >= 128 * 1024 * 1024
+
+
+@pytest.mark.skipif(sys.platform == 'win32', reason='Windows queries the usage of each process on its own')
+def test_run_process_overlapping_usage():
+    results = []
+
+    def run():
+        results.append(run_process(sys.executable, ['-c', 'import time\ntime.sleep(0.5)'], silent=True, quiet=True))
+
+    threads = [threading.Thread(target=run) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert [result.exit_code for result in results] == [0, 0]
+    # Both finished while the other was waited on, neither usage can be told apart
+    assert [result.cpu_time for result in results] == [None, None]
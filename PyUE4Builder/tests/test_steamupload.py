@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+
+from types import SimpleNamespace
+import pytest
+from actions.steamupload import Steamupload, STEAMWORKS_USER_ENV_VAR, STEAMWORKS_PASS_ENV_VAR
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer"]
+
+
+@pytest.fixture
+def steam_upload(tmp_path, monkeypatch):
+    """
+    A Steamupload action on a machine without Steamworks credentials
+    """
+    monkeypatch.delenv(STEAMWORKS_USER_ENV_VAR, raising=False)
+    monkeypatch.delenv(STEAMWORKS_PASS_ENV_VAR, raising=False)
+    config = SimpleNamespace(clean=False, uproject_dir_path=str(tmp_path), uproject_name='MyGame',
+                             builds_path=str(tmp_path / 'builds'), version_str='1.0')
+    return Steamupload(config, build_name='WindowsNoEditor', builder_exe_path='steamcmd.exe')
+
+
+def test_plan_without_credentials(steam_upload):
+    command = steam_upload.plan()['commands'][0]
+    assert command[1:4] == ['+login', '<unset>', '********']
+
+
+def test_plan_hides_password(steam_upload, monkeypatch):
+    monkeypatch.setenv(STEAMWORKS_USER_ENV_VAR, 'builder')
+    monkeypatch.setenv(STEAMWORKS_PASS_ENV_VAR, 'secret')
+    command = steam_upload.plan()['commands'][0]
+    assert command[1:4] == ['+login', 'builder', '********']
+    assert 'secret' not in command
+
+
+def test_run_without_credentials(steam_upload):
+    assert not steam_upload.run()
+    assert STEAMWORKS_USER_ENV_VAR in steam_upload.error
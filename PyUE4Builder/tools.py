@@ -2,12 +2,19 @@
 
 import os
 import sys
+
+if __name__ == "__main__":
+    # Hand the command to the builder daemon if one is running, before importing anything else
+    from utility.daemon import run_in_daemon
+    run_in_daemon('tools', sys.argv[1:])
+
 import click
 import json
 import time
 import shutil
 import subprocess
-from utility.common import launch, print_action, get_visual_studio_version, error_exit, push_directory
+from utility.common import launch, print_action, get_visual_studio_version, error_exit
+from utility.process import run_process
 from config import ProjectConfig
 from copy import deepcopy
 
@@ -71,8 +78,11 @@ def genproj_func(config: ProjectConfig, run_it):
     if config.engine_major_version == 4 and config.engine_minor_version <= 25:
         cmd_args.append('-VS{}'.format(get_visual_studio_version(config.get_suitable_vs_versions())))
 
-    if launch(config.UE4UBTPath, cmd_args) != 0:
-        error_exit('Failed to generate project files, see errors...', not config.automated)
+    result = run_process(config.UE4UBTPath, cmd_args,
+                         log_path=os.path.join(config.logs_path, 'GenerateProjectFiles.log'))
+    if result.exit_code != 0:
+        error_exit('Failed to generate project files, see errors...\n{}'.format(result.get_failure_summary()),
+                   not config.automated)
 
     if run_it:
         launch(os.path.join(config.uproject_dir_path, config.uproject_name + '.sln'),
@@ -94,8 +104,10 @@ def genloc_func(config: ProjectConfig):
                 '-Run=GatherText',
                 '-config={}'.format(config.proj_localization_script),
                 '-log']
-    if launch(config.UE4EditorPath, cmd_args) != 0:
-        error_exit('Failed to generate localization, see errors...', not config.automated)
+    result = run_process(config.UE4EditorPath, cmd_args, log_path=os.path.join(config.logs_path, 'GatherText.log'))
+    if result.exit_code != 0:
+        error_exit('Failed to generate localization, see errors...\n{}'.format(result.get_failure_summary()),
+                   not config.automated)
 
     if not config.automated:
         click.pause()
@@ -269,8 +281,10 @@ def fix_redirects(config: ProjectConfig):
                 '-autocheckout',
                 '-projectonly',
                 '-unattended']
-    if launch(config.UE4EditorPath, cmd_args) != 0:
-        error_exit('Failed to fixup redirectors, see errors...', not config.automated)
+    result = run_process(config.UE4EditorPath, cmd_args, log_path=os.path.join(config.logs_path, 'ResavePackages.log'))
+    if result.exit_code != 0:
+        error_exit('Failed to fixup redirectors, see errors...\n{}'.format(result.get_failure_summary()),
+                   not config.automated)
 
     if not config.automated:
         click.pause()
@@ -283,23 +297,27 @@ def compile_all_blueprints(config: ProjectConfig):
                 '-autocheckout',
                 '-projectonly',
                 '-unattended']
-    if launch(config.UE4EditorPath, cmd_args) != 0:
-        error_exit('Failed to compile all blueprints, see errors...', not config.automated)
+    result = run_process(config.UE4EditorPath, cmd_args,
+                         log_path=os.path.join(config.logs_path, 'CompileAllBlueprints.log'))
+    if result.exit_code != 0:
+        error_exit('Failed to compile all blueprints, see errors...\n{}'.format(result.get_failure_summary()),
+                   not config.automated)
 
     if not config.automated:
         click.pause()
 
 
 def do_project_build(extra_args=None):
-    args = [os.path.join(os.path.dirname(__file__), 'build_script.py'),
-            '-s', '{}'.format(script_file_path), '-t', 'Editor']
+    args = ['-s', '{}'.format(script_file_path), '-t', 'Editor']
     if extra_args is not None:
         args.extend(extra_args)
-    result = launch(os.path.join(os.environ.get("PYTHON_HOME", ".").replace('"', ''), "python.exe"),
-                    args,
-                    False,
-                    should_wait=True)
-    return result == 0
+    from utility import daemon
+    if daemon.current_daemon is not None:
+        # Already running in the builder daemon, build in this process instead of starting another
+        return daemon.invoke_command('build_script', args) == 0
+    args.insert(0, os.path.join(os.path.dirname(__file__), 'build_script.py'))
+    result = run_process(os.path.join(os.environ.get("PYTHON_HOME", ".").replace('"', ''), "python.exe"), args)
+    return result.exit_code == 0
 
 
 @tools.command()
@@ -347,23 +365,27 @@ def tools_select(config: ProjectConfig):
 
 
 class ProjectBuildCheck(object):
-    repos_to_check = {}
     cache_file_name = 'project_cache.json'
-    engine_dir = ''
-    engine_branch = ''
+
+    # Attributes which are not saved to the cache file
+    uncached_attributes = ['from_file', 'repos_to_check', 'engine_dir', 'engine_branch', 'fetched_repos']
 
     def __init__(self, config: ProjectConfig):
         self.from_file = False
         self.repo_rev = ''
         self.engine_repo_rev = ''
         self.other_repos = {}
-        ProjectBuildCheck.populate_check_repos(config)
-        self.load_cache()
-        ProjectBuildCheck.engine_dir = config.UE4EnginePath
+        # The state of this check only, the builder daemon runs many checks in one process
+        self.repos_to_check = {}
+        self.engine_dir = config.UE4EnginePath
+        # Repo directories already fetched by this check, each repo only needs to be fetched once
+        self.fetched_repos = set()
         if 'git_engine_branch' in config.script['config']:
-            ProjectBuildCheck.engine_branch = config.script['config']['git_engine_branch']
+            self.engine_branch = config.script['config']['git_engine_branch']
         else:
-            ProjectBuildCheck.engine_branch = config.script['config']['git_proj_branch']
+            self.engine_branch = config.script['config']['git_proj_branch']
+        self.populate_check_repos(config)
+        self.load_cache()
 
     def load_cache(self):
         try:
@@ -376,87 +398,125 @@ class ProjectBuildCheck(object):
             pass
         except ValueError:
             pass
-        for other_repo in ProjectBuildCheck.repos_to_check.keys():
+        for other_repo in self.repos_to_check.keys():
             if other_repo not in self.other_repos:
                 self.other_repos[other_repo] = ''
 
     def update_repo_rev_cache(self):
-        with push_directory(ProjectBuildCheck.engine_dir, False):
-            self.engine_repo_rev = ProjectBuildCheck.get_cwd_repo_rev(ProjectBuildCheck.engine_branch)
+        self.fetch_repos()
+        self.engine_repo_rev = ProjectBuildCheck.get_repo_rev(self.engine_dir, self.engine_branch)
         if os.path.exists('.git'):
-            self.repo_rev = ProjectBuildCheck.get_cwd_repo_rev('master')
-        for to_dir, branch in ProjectBuildCheck.repos_to_check.items():
-            with push_directory(os.path.join(os.getcwd(), to_dir), False):
-                self.other_repos[to_dir] = ProjectBuildCheck.get_cwd_repo_rev(branch)
+            self.repo_rev = ProjectBuildCheck.get_repo_rev(os.getcwd(), 'master')
+        for to_dir, branch in self.repos_to_check.items():
+            self.other_repos[to_dir] = ProjectBuildCheck.get_repo_rev(os.path.abspath(to_dir), branch)
 
     def save_cache(self):
         with open(ProjectBuildCheck.cache_file_name, 'w') as fp:
-            out = deepcopy(self.__dict__)
-            del out['from_file']
+            out = {k: deepcopy(v) for k, v in self.__dict__.items() if k not in self.uncached_attributes}
             json.dump(out, fp, indent=4)
 
     def was_loaded(self):
         return self.from_file
 
+    def get_repo_dirs(self):
+        """
+        :return: The absolute directories of every repo this checker looks at which exist
+        """
+        repo_dirs = []
+        if os.path.isdir(self.engine_dir):
+            repo_dirs.append(self.engine_dir)
+        if os.path.exists('.git'):
+            repo_dirs.append(os.getcwd())
+        for to_dir in self.repos_to_check.keys():
+            if os.path.isdir(to_dir):
+                repo_dirs.append(os.path.abspath(to_dir))
+        return repo_dirs
+
+    def fetch_repos(self):
+        """
+        Fetch every repo not yet fetched by this check, all at the same time
+        """
+        repo_dirs = [repo_dir for repo_dir in self.get_repo_dirs() if repo_dir not in self.fetched_repos]
+        if len(repo_dirs) == 0:
+            return
+        # Only the repo checks use a pool, keep it out of the startup of every other command
+        from concurrent.futures import ThreadPoolExecutor
+        with ThreadPoolExecutor(max_workers=len(repo_dirs)) as pool:
+            for repo_dir in pool.map(ProjectBuildCheck.fetch_repo, repo_dirs):
+                self.fetched_repos.add(repo_dir)
+
+    @staticmethod
+    def fetch_repo(repo_dir):
+        subprocess.check_output(["git", "fetch", "--quiet"], cwd=repo_dir)
+        return repo_dir
+
     @staticmethod
-    def get_cwd_repo_rev(branch_name):
-        subprocess.check_output(["git", "fetch"])
-        return subprocess.check_output(["git", "rev-parse", "--short", branch_name]).decode("utf-8").strip()
+    def get_repo_rev(repo_dir, branch_name):
+        return subprocess.check_output(["git", "rev-parse", "--short", branch_name],
+                                       cwd=repo_dir).decode("utf-8").strip()
 
     @staticmethod
-    def get_cwd_repo_status():
-        return subprocess.check_output(["git", "status"]).decode("utf-8")
+    def get_repo_status(repo_dir):
+        return subprocess.check_output(["git", "status"], cwd=repo_dir).decode("utf-8")
 
     @staticmethod
-    def get_cwd_branch_name():
-        branches = subprocess.check_output(["git", "branch"]).decode("utf-8").splitlines()
+    def get_repo_branch_name(repo_dir):
+        branches = subprocess.check_output(["git", "branch"], cwd=repo_dir).decode("utf-8").splitlines()
         for branch in branches:
             if branch.strip().startswith('*'):
                 return branch.replace('*', '', 1).strip()
         return ''
 
-    @staticmethod
-    def populate_check_repos(config: ProjectConfig):
+    def populate_check_repos(self, config: ProjectConfig):
         for step in config.script['pre_build_steps']:
             if step['action']['module'] == 'actions.git':
-                ProjectBuildCheck.repos_to_check['{}\\{}'.format(config.uproject_name,
-                                                                 step['action']['args']['output_folder'])] = \
-                    step['action']['args']['branch']
+                repo_specs = [step['action']['args']]
+            elif step['action']['module'] == 'actions.gitsync':
+                repo_specs = [dict(step['action']['args'], **repo_spec)
+                              for repo_spec in step['action']['args']['repos']]
+            else:
+                continue
+            for repo_spec in repo_specs:
+                self.repos_to_check['{}\\{}'.format(config.uproject_name,
+                                                      repo_spec['output_folder'])] = repo_spec['branch']
 
     def check_repos(self):
         # Check the engine repo
-        if not os.path.isdir(ProjectBuildCheck.engine_dir):
+        if not os.path.isdir(self.engine_dir):
             return False
-        with push_directory(ProjectBuildCheck.engine_dir, False):
-            if self.get_cwd_branch_name() != self.engine_branch:
-                return False
-            if self.engine_repo_rev != self.get_cwd_repo_rev('origin/{}'.format(self.engine_branch)):
+        for to_dir in self.repos_to_check.keys():
+            if not os.path.isdir(to_dir):
                 return False
+        self.fetch_repos()
+
+        if self.get_repo_branch_name(self.engine_dir) != self.engine_branch:
+            return False
+        if self.engine_repo_rev != self.get_repo_rev(self.engine_dir,
+                                                     'origin/{}'.format(self.engine_branch)):
+            return False
         # Check the local repo against our cached value
         if os.path.exists('.git'):
-            if self.repo_rev != self.get_cwd_repo_rev('origin/master'):
+            if self.repo_rev != self.get_repo_rev(os.getcwd(), 'origin/master'):
                 return False
-        for to_dir, branch in ProjectBuildCheck.repos_to_check.items():
-            if not os.path.isdir(os.path.join(os.getcwd(), to_dir)):
+        for to_dir, branch in self.repos_to_check.items():
+            repo_dir = os.path.abspath(to_dir)
+            if self.get_repo_branch_name(repo_dir) != branch:
+                return False
+            if self.other_repos[to_dir] != self.get_repo_rev(repo_dir, 'origin/{}'.format(branch)):
                 return False
-            with push_directory(os.path.join(os.getcwd(), to_dir), False):
-                if self.get_cwd_branch_name() != branch:
-                    return False
-                if self.other_repos[to_dir] != self.get_cwd_repo_rev('origin/{}'.format(branch)):
-                    return False
         return True
 
     fetch_result_OOD = '- out of date -'
     fetch_result_commit = '- can commit -'
     fetch_result_none = ''
 
-    def fetch_status_info_result(self, repo_name, cur_rev, other_rev):
+    def fetch_status_info_result(self, repo_dir, repo_name, cur_rev, other_rev):
         info_out = ''
         result = self.fetch_result_none
         if cur_rev != other_rev:
             info_out += 'out-of_date'
             result = self.fetch_result_OOD
-        status = self.get_cwd_repo_status()
+        status = self.get_repo_status(repo_dir)
         if 'nothing to commit, working tree clean' not in status:
             status = status.split('\n')
             info_out += '{}Needs commit:\n'.format('' if len(info_out) == 0 else ' - ')
@@ -471,7 +531,7 @@ class ProjectBuildCheck(object):
         return result
 
     @staticmethod
-    def ask_do_commit():
+    def ask_do_commit(repo_dir):
         ask_do_commit = click.confirm('Make Commit?', default=False)
         if ask_do_commit:
             git_filter = click.prompt('Type optional filter', default='*')
@@ -481,11 +541,11 @@ class ProjectBuildCheck(object):
             for message in messages:
                 git_cmd.append('-m')
                 git_cmd.append('- {}'.format(message.strip()))
-            print(subprocess.check_output(["git", "add", git_filter]).decode("utf-8"))
-            print(subprocess.check_output(["git", "status"]).decode("utf-8"))
+            print(subprocess.check_output(["git", "add", git_filter], cwd=repo_dir).decode("utf-8"))
+            print(subprocess.check_output(["git", "status"], cwd=repo_dir).decode("utf-8"))
             if click.confirm('All Good?', default=False):
-                print(subprocess.check_output(git_cmd).decode("utf-8"))
-                print(subprocess.check_output(["git", "push"]).decode("utf-8"))
+                print(subprocess.check_output(git_cmd, cwd=repo_dir).decode("utf-8"))
+                print(subprocess.check_output(["git", "push"], cwd=repo_dir).decode("utf-8"))
                 return True
             else:
                 print('Skipping so you can fix...')
@@ -494,41 +554,45 @@ class ProjectBuildCheck(object):
     def check_and_print_repo_status(self):
         cache_updated = False
         ask_about_commits = click.confirm('Would you like to make commits?', default=False)
+        self.fetch_repos()
         # Check the engine repo
-        with push_directory(ProjectBuildCheck.engine_dir, False):
-            engine_rev = ProjectBuildCheck.get_cwd_repo_rev('origin/{}'.format(ProjectBuildCheck.engine_branch))
-            self.fetch_status_info_result('Engine', self.engine_repo_rev, engine_rev)
+        engine_rev = ProjectBuildCheck.get_repo_rev(self.engine_dir,
+                                                    'origin/{}'.format(self.engine_branch))
+        self.fetch_status_info_result(self.engine_dir, 'Engine', self.engine_repo_rev, engine_rev)
         # Check the local repo against our cached value
         if os.path.exists('.git'):
-            result = self.fetch_status_info_result('Project', self.repo_rev,
-                                                   ProjectBuildCheck.get_cwd_repo_rev('origin/master'))
+            project_dir = os.getcwd()
+            result = self.fetch_status_info_result(project_dir, 'Project', self.repo_rev,
+                                                   ProjectBuildCheck.get_repo_rev(project_dir, 'origin/master'))
             if ask_about_commits:
                 if result == self.fetch_result_commit:
-                    if self.ask_do_commit():
-                        self.repo_rev = ProjectBuildCheck.get_cwd_repo_rev('origin/master')
+                    if self.ask_do_commit(project_dir):
+                        self.repo_rev = ProjectBuildCheck.get_repo_rev(project_dir, 'origin/master')
                         cache_updated = True
                 elif result == self.fetch_result_OOD:
                     if click.confirm('Update cached rev?', default=False):
-                        self.repo_rev = ProjectBuildCheck.get_cwd_repo_rev('origin/master')
+                        self.repo_rev = ProjectBuildCheck.get_repo_rev(project_dir, 'origin/master')
                         cache_updated = True
-        for to_dir, branch in ProjectBuildCheck.repos_to_check.items():
-            if not os.path.isdir(os.path.join(os.getcwd(), to_dir)):
+        for to_dir, branch in self.repos_to_check.items():
+            if not os.path.isdir(to_dir):
                 print('"{}" sub repo doesn\'t exist!'.format(to_dir))
-            with push_directory(os.path.join(os.getcwd(), to_dir), False):
-                path_splits = os.path.split(to_dir)
-                branch_path = 'origin/{}'.format(branch)
-                result = self.fetch_status_info_result(path_splits[len(path_splits) - 1].title(),
-                                                       self.other_repos[to_dir],
-                                                       ProjectBuildCheck.get_cwd_repo_rev(branch_path))
-                if ask_about_commits:
-                    if result == self.fetch_result_commit:
-                        if self.ask_do_commit():
-                            self.other_repos[to_dir] = ProjectBuildCheck.get_cwd_repo_rev(branch_path)
-                            cache_updated = True
-                    elif result == self.fetch_result_OOD:
-                        if click.confirm('Update cached rev?', default=False):
-                            self.other_repos[to_dir] = ProjectBuildCheck.get_cwd_repo_rev(branch_path)
-                            cache_updated = True
+                continue
+            repo_dir = os.path.abspath(to_dir)
+            path_splits = os.path.split(to_dir)
+            branch_path = 'origin/{}'.format(branch)
+            result = self.fetch_status_info_result(repo_dir,
+                                                   path_splits[len(path_splits) - 1].title(),
+                                                   self.other_repos[to_dir],
+                                                   ProjectBuildCheck.get_repo_rev(repo_dir, branch_path))
+            if ask_about_commits:
+                if result == self.fetch_result_commit:
+                    if self.ask_do_commit(repo_dir):
+                        self.other_repos[to_dir] = ProjectBuildCheck.get_repo_rev(repo_dir, branch_path)
+                        cache_updated = True
+                elif result == self.fetch_result_OOD:
+                    if click.confirm('Update cached rev?', default=False):
+                        self.other_repos[to_dir] = ProjectBuildCheck.get_repo_rev(repo_dir, branch_path)
+                        cache_updated = True
         if cache_updated:
             self.save_cache()
 
@@ -1,13 +1,11 @@
 #!/usr/bin/env python
 
 import os
-import winreg
 import click
 import sys
 import subprocess
-import platform
 from contextlib import contextmanager
-from winregistry import WinRegistry as Reg
+from utility.processes import get_process_scanner
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
@@ -123,30 +121,7 @@ def is_editor_running(engine_path=''):
     :param engine_path: If set to non '' will only care about executables under a specific engine path
     :return: True if the engine is running
     """
-    if platform.system() != 'Windows':
-        raise Exception('is_editor_running designed for windows. Please fix me!')
-
-    for line in subprocess.check_output(['tasklist']).splitlines():
-        process_line = bytes.decode(line).split()
-        if len(process_line) < 1:
-            continue
-        if 'ue4editor' in process_line[0].lower():
-            if engine_path != '':
-                # Only care about a specific engine exe
-                exe_name = process_line[0]
-                process_paths_cmd = 'wmic process where "name=\'{}\'" get ProcessID, ExecutablePath'.format(exe_name)
-                process_paths = subprocess.check_output(process_paths_cmd, universal_newlines=True)
-                for exe_path_info in process_paths.splitlines():
-                    exe_path_line = exe_path_info.split()
-                    if len(exe_path_line) < 1:
-                        continue
-                    exe_path = exe_path_line[0]
-                    if exe_name in exe_path:
-                        if os.path.normpath(engine_path) in os.path.normpath(exe_path):
-                            return True
-            else:
-                return True
-    return False
+    return len(get_process_scanner().find_processes(['ue4editor', 'unrealeditor'], engine_path)) != 0
 
 
 def check_engine_dir_valid(dir_path):
@@ -188,53 +163,13 @@ def get_visual_studio_version(supported_versions=None):
     :return: An integer representing the version by year. e.g. 15.0 will return 2017.
              If no version is found, returns -1.
     """
-    versions_found = set()
-    highest_version = -1
-    try:
-        # First try for 2015 to 2017
-        try:
-            hkey = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, "SOFTWARE\\WOW6432Node\\Microsoft\\VisualStudio\\SxS\\VS7")
-            try:
-                winreg.QueryValueEx(hkey, '15.0')
-                versions_found.add(2017)
-                if highest_version == -1:
-                    highest_version = 2017
-            except FileNotFoundError:
-                pass
-            try:
-                winreg.QueryValueEx(hkey, '14.0')
-                versions_found.add(2015)
-                if highest_version == -1:
-                    highest_version = 2015
-            except FileNotFoundError:
-                pass
-            hkey.Close()
-        except FileNotFoundError:
-            pass
-        # Now try for 2019
-        try:
-            hkey2019 = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, "SOFTWARE\\WOW6432Node\\Microsoft\\VisualStudio\\16.0")
-            versions_found.add(2019)
-            highest_version = 2019
-            hkey2019.Close()
-        except FileNotFoundError:
-            pass
-        # Now try for 2022
-        try:
-            hkey2022 = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE, "SOFTWARE\\WOW6432Node\\Microsoft\\VisualStudio\\17.0")
-            versions_found.add(2022)
-            highest_version = 2022
-            hkey2022.Close()
-        except FileNotFoundError:
-            pass
-    except OSError:
-        return -1
-
+    from utility.platforms import get_platform_backend
+    versions_found = get_platform_backend().get_visual_studio_versions()
     if len(versions_found) == 0:
         return -1
 
     if supported_versions is None or len(supported_versions) == 0:
-        return highest_version
+        return max(versions_found)
 
     supported = set(supported_versions)
     allowed_versions = supported.intersection(versions_found)
@@ -251,55 +186,28 @@ def register_project_engine(config, prompt_path=True):
     Register the projects engine
     :return: True on success
     """
-    reg = Reg()
-    # try:
-    #     registered_engines = reg.read_key(config.UE4EngineBuildsReg)['values']
-    #     for engine in registered_engines:
-    #         eng_val = engine['value']  # type:str
-    #         if eng_val.startswith('{') and eng_val.endswith('}'):
-    #             click.secho("Removing arbitrary Engine Association {0}".format(eng_val))
-    #             reg.delete_value(config.UE4EngineBuildsReg, engine['value'])
-    # except Exception:
-    #     # No entries yet, all good!
-    #     pass
+    from utility.platforms import get_platform_backend
+    backend = get_platform_backend()
 
     if check_engine_dir_valid(config.UE4EnginePath):
         # Check if the engine is already registered
-        try:
-            registered_engines = reg.read_key(config.UE4EngineBuildsReg)['values']
-            for engine in registered_engines:
-                if engine['value'] == config.UE4EngineKeyName:
-                    # Check if the data matches the engine path, if not, update the key
-                    if engine['data'] != config.UE4EnginePath:
-                        click.secho('Updating engine registry key {0}:{1} to {2}'.format(config.UE4EngineKeyName,
-                                                                                         engine['data'],
-                                                                                         config.UE4EnginePath))
-                        click.secho('This is probably because the engine has been moved.')
-                        reg.write_value(config.UE4EngineBuildsReg,
-                                        config.UE4EngineKeyName,
-                                        config.UE4EnginePath,
-                                        'REG_SZ')
-                    return True
-        except Exception:
-            pass
+        registered_engines = backend.get_registered_engines(config.UE4EngineBuildsReg)
+        if config.UE4EngineKeyName in registered_engines:
+            # Check if the data matches the engine path, if not, update the key
+            if registered_engines[config.UE4EngineKeyName] != config.UE4EnginePath:
+                click.secho('Updating engine registry key {0}:{1} to {2}'.format(
+                    config.UE4EngineKeyName, registered_engines[config.UE4EngineKeyName], config.UE4EnginePath))
+                click.secho('This is probably because the engine has been moved.')
+                backend.register_engine(config.UE4EngineBuildsReg, config.UE4EngineKeyName, config.UE4EnginePath)
+            return True
 
         click.secho('Setting engine registry key {0} to {1}'.format(config.UE4EngineKeyName, config.UE4EnginePath))
-        try:
-            reg.create_key(config.UE4EngineBuildsReg)
-        except Exception:
-            pass
-        reg.write_value(config.UE4EngineBuildsReg,
-                        config.UE4EngineKeyName,
-                        config.UE4EnginePath,
-                        'REG_SZ')
+        backend.register_engine(config.UE4EngineBuildsReg, config.UE4EngineKeyName, config.UE4EnginePath)
     elif prompt_path:
         my_engine_path = input('Enter Engine Path: ')
         if check_engine_dir_valid(my_engine_path):
             click.secho('Setting engine registry key {0} to {1}'.format(config.UE4EngineKeyName, my_engine_path))
-            reg.write_value(config.UE4EngineBuildsReg,
-                            config.UE4EngineKeyName,
-                            my_engine_path,
-                            'REG_SZ')
+            backend.register_engine(config.UE4EngineBuildsReg, config.UE4EngineKeyName, my_engine_path)
         else:
             print_error("Could not find engine path, make sure you type the full path!")
             return False
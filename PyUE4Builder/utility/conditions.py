@@ -0,0 +1,281 @@
+#!/usr/bin/env python
+
+import re
+import operator
+import functools
+from abc import ABC, abstractmethod
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+# The value of names which are neither in the meta nor the config
+unknown_value = object()
+
+condition_token_pattern = re.compile(r'\s*(?:(==|!=|<=|>=|<|>|\(|\)|,)|'
+                                     r'(\'[^\']*\'|"[^"]*")|'
+                                     r'(-?\d+(?:\.\d+)?)(?![\w.])|'
+                                     r'([A-Za-z_][\w]*))')
+
+comparison_operators = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge
+}
+
+keyword_literals = {'true': True, 'false': False}
+
+
+class ConditionNode(ABC):
+    """
+    A node of a compiled condition.
+    test returns True or False, or None if the node depends on a name which doesn't exist. Like conditions have always
+    done, parts of a condition naming something which doesn't exist (yet) are ignored.
+    """
+    def __init__(self, text):
+        self.text = text
+
+    def value(self, sources):
+        return self.test(sources)
+
+    @abstractmethod
+    def test(self, sources):
+        """
+        :param sources: The objects to read values from, names are looked up in each in order
+        :return: True or False, or None if the node depends on a name which doesn't exist
+        """
+
+
+class ConditionName(ConditionNode):
+    def __init__(self, text):
+        super().__init__(text)
+        self.name = text
+
+    def value(self, sources):
+        for source in sources:
+            value = getattr(source, self.name, unknown_value)
+            if value is not unknown_value:
+                return value
+        return unknown_value
+
+    def test(self, sources):
+        value = self.value(sources)
+        return None if value is unknown_value else bool(value)
+
+
+class ConditionLiteral(ConditionNode):
+    def __init__(self, text, literal):
+        super().__init__(text)
+        self.literal = literal
+
+    def value(self, sources):
+        return self.literal
+
+    def test(self, sources):
+        return bool(self.literal)
+
+
+class ConditionNot(ConditionNode):
+    def __init__(self, text, operand):
+        super().__init__(text)
+        self.operand = operand
+
+    def test(self, sources):
+        result = self.operand.test(sources)
+        return None if result is None else not result
+
+
+class ConditionAnd(ConditionNode):
+    def __init__(self, text, operands):
+        super().__init__(text)
+        self.operands = operands
+
+    def test(self, sources):
+        result = None
+        for operand in self.operands:
+            operand_result = operand.test(sources)
+            if operand_result is False:
+                return False
+            if operand_result:
+                result = True
+        return result
+
+
+class ConditionOr(ConditionNode):
+    def __init__(self, text, operands):
+        super().__init__(text)
+        self.operands = operands
+
+    def test(self, sources):
+        result = None
+        for operand in self.operands:
+            operand_result = operand.test(sources)
+            if operand_result:
+                return True
+            if operand_result is False:
+                result = False
+        return result
+
+
+class ConditionCompare(ConditionNode):
+    def __init__(self, text, left, op, right):
+        super().__init__(text)
+        self.left = left
+        self.op = op
+        self.right = right
+
+    def test(self, sources):
+        left = self.left.value(sources)
+        right = self.right.value(sources)
+        if left is unknown_value or right is unknown_value:
+            return None
+        try:
+            return comparison_operators[self.op](left, right)
+        except TypeError:
+            raise ValueError('Unable to compare {!r} {} {!r} in ({})'.format(left, self.op, right, self.text))
+
+
+class Condition(object):
+    """
+    A step condition compiled into an expression tree.
+    Conditions are names of meta or config values combined with and, or, not and parentheses, and comparisons of
+    those values with ==, !=, <, <=, >, >= against numbers, quoted strings, true/false or other values.
+    Terms listed without an operator, or separated by commas, must all be true, ex. "not automated, clean".
+    """
+    def __init__(self, text):
+        self.text = text
+        self.tokens = []  # (kind, value, start, end)
+        self.index = 0
+        self.tokenize()
+        if not len(self.tokens):
+            raise ValueError('Condition is empty')
+        self.root = self.parse_or()
+        if self.index != len(self.tokens):
+            raise ValueError('Unexpected "{}" in condition ({})'.format(self.tokens[self.index][1], text))
+        self.tokens = None
+
+    def tokenize(self):
+        position = 0
+        while position < len(self.text):
+            if self.text[position:].strip() == '':
+                break
+            match = condition_token_pattern.match(self.text, position)
+            if match is None:
+                raise ValueError('Unexpected character "{}" in condition ({})'.format(
+                    self.text[position:].strip()[0], self.text))
+            kind = match.lastindex
+            value = match.group(kind)
+            self.tokens.append((kind, value, match.start(kind), match.end()))
+            position = match.end()
+
+    def peek(self):
+        if self.index < len(self.tokens):
+            return self.tokens[self.index]
+        return None, None, len(self.text), len(self.text)
+
+    def is_word(self, word):
+        kind, value, _, _ = self.peek()
+        return kind == 4 and value.lower() == word
+
+    def expect_operand(self):
+        kind, value, _, _ = self.peek()
+        if kind is None:
+            raise ValueError('Condition ({}) ends early'.format(self.text))
+        if kind == 1 and value != '(':
+            raise ValueError('Unexpected "{}" in condition ({})'.format(value, self.text))
+
+    def starts_operand(self):
+        kind, value, _, _ = self.peek()
+        if kind is None or (kind == 1 and value != '('):
+            return False
+        return not self.is_word('and') and not self.is_word('or')
+
+    def get_text(self, start):
+        return self.text[start:self.tokens[self.index - 1][3]].strip()
+
+    def parse_or(self):
+        start = self.peek()[2]
+        operands = [self.parse_and()]
+        while self.is_word('or'):
+            self.index += 1
+            operands.append(self.parse_and())
+        return operands[0] if len(operands) == 1 else ConditionOr(self.get_text(start), operands)
+
+    def parse_and(self):
+        start = self.peek()[2]
+        operands = [self.parse_not()]
+        while True:
+            if self.is_word('and') or self.peek()[1] == ',':
+                self.index += 1
+                if self.peek()[1] == ',' or (self.peek()[0] is None and self.tokens[self.index - 1][1] == ','):
+                    continue  # Stray commas, ex. a trailing one
+            elif not self.starts_operand():
+                break
+            operands.append(self.parse_not())
+        return operands[0] if len(operands) == 1 else ConditionAnd(self.get_text(start), operands)
+
+    def parse_not(self):
+        start = self.peek()[2]
+        if self.is_word('not'):
+            self.index += 1
+            operand = self.parse_not()
+            return ConditionNot(self.get_text(start), operand)
+        return self.parse_compare()
+
+    def parse_compare(self):
+        start = self.peek()[2]
+        left = self.parse_operand()
+        kind, value, _, _ = self.peek()
+        if kind == 1 and value in comparison_operators:
+            self.index += 1
+            right = self.parse_operand()
+            return ConditionCompare(self.get_text(start), left, value, right)
+        return left
+
+    def parse_operand(self):
+        self.expect_operand()
+        kind, value, start, _ = self.peek()
+        self.index += 1
+        if kind == 1:
+            node = self.parse_or()
+            if self.peek()[1] != ')':
+                raise ValueError('Missing ")" in condition ({})'.format(self.text))
+            self.index += 1
+            node.text = self.get_text(start)
+            return node
+        if kind == 2:
+            return ConditionLiteral(value, value[1:-1])
+        if kind == 3:
+            return ConditionLiteral(value, float(value) if '.' in value else int(value))
+        if value.lower() in keyword_literals:
+            return ConditionLiteral(value, keyword_literals[value.lower()])
+        if value.lower() in ('and', 'or', 'not'):
+            raise ValueError('Unexpected "{}" in condition ({})'.format(value, self.text))
+        return ConditionName(value)
+
+    def check(self, sources):
+        """
+        :param sources: The objects to read values from, names are looked up in each in order, ex. (meta, config)
+        :return: Empty string if the condition is met, or the part of the condition which was not met
+        """
+        if self.root.test(sources) is not False:
+            return ''
+        # Point at the first unmet term of a list of terms, the whole condition otherwise
+        if isinstance(self.root, ConditionAnd):
+            for operand in self.root.operands:
+                if operand.test(sources) is False:
+                    return operand.text
+        return self.root.text
+
+
+@functools.lru_cache(maxsize=4096)
+def compile_condition(condition):
+    """
+    :param condition: A step condition string
+    :raise ValueError: If the condition is not valid
+    :return: The cached Condition of the string
+    """
+    return Condition(condition)
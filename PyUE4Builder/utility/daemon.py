@@ -0,0 +1,334 @@
+#!/usr/bin/env python
+
+import io
+import os
+import sys
+import json
+import socket
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+# The commands of the builder the daemon can run, by name to the module of their click command
+daemon_commands = {
+    'build_script': 'build_script',
+    'tools': 'tools'
+}
+
+# Set to 1 to always run commands in their own process, even with a daemon running
+no_daemon_env_var = 'PYUE4BUILDER_NO_DAEMON'
+
+# Where the running daemon of this install of the builder leaves its port and token for clients
+daemon_info_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '__pycache__',
+                                'daemon.json')
+
+# The daemon running in this process, if this is the daemon process
+current_daemon = None
+
+
+def read_daemon_info():
+    """
+    :return: Dict of the port, token and pid of the daemon, or None if no daemon was started
+    """
+    try:
+        with open(daemon_info_path, 'r') as fp:
+            return json.load(fp)
+    except (IOError, ValueError):
+        return None
+
+
+def send_daemon_request(request, timeout=2.0):
+    """
+    Send a request to the running daemon and yield the messages it answers with
+    :param request: The request dict, the token is added to it
+    :param timeout: Seconds to wait for the daemon to accept the connection and the request
+    :raise OSError: If there is no daemon to connect to or it stops answering
+    :return: Generator of the message dicts, the first one is the daemons acceptance of the request
+    """
+    daemon_info = read_daemon_info()
+    if daemon_info is None:
+        raise ConnectionRefusedError('No daemon is running')
+    request = dict(request, token=daemon_info['token'])
+    with socket.create_connection(('127.0.0.1', daemon_info['port']), timeout=timeout) as connection:
+        connection.sendall(json.dumps(request).encode('utf-8') + b'\n')
+        with connection.makefile('r', encoding='utf-8') as reader:
+            first_message = True
+            for line in reader:
+                message = json.loads(line)
+                if first_message:
+                    if not message.get('accepted', False):
+                        raise ConnectionRefusedError(message.get('error', 'The daemon refused the request'))
+                    # Commands can run for hours, only the connection has to be quick
+                    connection.settimeout(None)
+                    first_message = False
+                yield message
+            if first_message:
+                raise ConnectionResetError('The daemon closed the connection')
+
+
+def run_in_daemon(command, args):
+    """
+    Run a command of the builder in the daemon if one is running, streaming its output here.
+    Exits with the exit code of the command if the daemon ran it, returns if it has to run in this process.
+    :param command: The name of the command, see daemon_commands
+    :param args: The command line arguments of the command
+    """
+    if os.environ.get(no_daemon_env_var, '0') == '1' or not os.path.isfile(daemon_info_path):
+        return
+
+    # Windows consoles only show colors through colorama, which the client doesn't import to stay quick
+    request = {'command': command,
+               'args': args,
+               'cwd': os.getcwd(),
+               'env': dict(os.environ),
+               'color': sys.stdout.isatty() and sys.platform != 'win32'}
+    accepted = False
+    exit_code = None
+    try:
+        for message in send_daemon_request(request):
+            accepted = True
+            if 'out' in message:
+                sys.stdout.write(message['out'])
+                sys.stdout.flush()
+            elif 'err' in message:
+                sys.stderr.write(message['err'])
+                sys.stderr.flush()
+            elif 'exit_code' in message:
+                exit_code = message['exit_code']
+    except (OSError, ValueError) as e:
+        if not accepted:
+            return  # No daemon is answering, the info is left over from one which is gone
+        if isinstance(e, BrokenPipeError):
+            sys.exit(1)  # Our own output was closed, ex. piped into head
+        sys.stderr.write('Lost the connection to the builder daemon: {}\n'.format(e))
+    except KeyboardInterrupt:
+        sys.stderr.write('\nThe command keeps running in the builder daemon, stop the daemon to stop it.\n')
+    sys.exit(exit_code if exit_code is not None else 1)
+
+
+def invoke_command(command, args):
+    """
+    Run a command of the builder in this process, like running it from the command line
+    :param command: The name of the command, see daemon_commands
+    :param args: The command line arguments of the command
+    :return: The exit code of the command
+    """
+    import click
+    import importlib
+    from utility.common import print_error
+    click_command = getattr(importlib.import_module(daemon_commands[command]), command)
+    try:
+        result = click_command.main(args=args, prog_name='{}.py'.format(command), standalone_mode=False)
+        return result if isinstance(result, int) else 0
+    except SystemExit as e:
+        if e.code is None or isinstance(e.code, int):
+            return e.code or 0
+        print_error(e.code)
+        return 1
+    except click.exceptions.ClickException as e:
+        e.show()
+        return e.exit_code
+    except click.exceptions.Abort:
+        print_error('Aborted! The daemon has no input to answer prompts with, set {}=1 to run the command in '
+                    'its own process.'.format(no_daemon_env_var))
+        return 1
+    except Exception as e:
+        print_error('{}'.format(e))
+        return 1
+
+
+class DaemonConnection(object):
+    """
+    The connection of a daemon client. The client may go away, the command it asked for keeps running without it.
+    """
+    def __init__(self, connection):
+        import threading
+        self.connection = connection
+        self.send_lock = threading.Lock()
+        self.client_gone = False
+
+    def send(self, message):
+        data = json.dumps(message).encode('utf-8') + b'\n'
+        with self.send_lock:
+            if self.client_gone:
+                return
+            try:
+                self.connection.sendall(data)
+            except OSError:
+                self.client_gone = True
+
+
+class DaemonStream(io.TextIOBase):
+    """
+    A text stream sending what is written to it to the client of a daemon request
+    """
+    def __init__(self, connection, key, color):
+        super().__init__()
+        self.connection = connection
+        self.key = key
+        self.show_color = color
+
+    @property
+    def encoding(self):
+        return 'utf-8'
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        if not isinstance(text, str):
+            # Tells click this is a text stream
+            raise TypeError('write() argument must be str, not {}'.format(type(text).__name__))
+        if text != '':
+            self.connection.send({self.key: text})
+        return len(text)
+
+    def isatty(self):
+        # Lets click keep colors when the client is showing them in a terminal
+        return self.show_color
+
+
+class BuilderDaemon(object):
+    """
+    A long running builder process which runs commands for clients connecting over a local socket.
+    Everything loaded by one command stays loaded for the next: imported modules and actions, compiled step
+    conditions and tags, the process scanner and platform lookups. Commands change the working directory,
+    environment and standard streams of the process, so only one runs at a time.
+    """
+    def __init__(self, port=0):
+        import time
+        import secrets
+        import threading
+        self.port = port
+        self.token = secrets.token_hex(16)
+        self.job_lock = threading.Lock()
+        self.started = time.time()
+        self.jobs_run = 0
+        self.current_job = None
+        self.server = None
+
+    def serve(self):
+        """
+        Serve requests until the daemon is stopped
+        """
+        import socketserver
+        global current_daemon
+
+        daemon = self
+
+        class DaemonRequestHandler(socketserver.StreamRequestHandler):
+            def handle(self):
+                daemon.handle_connection(self.connection, self.rfile)
+
+        class DaemonServer(socketserver.ThreadingTCPServer):
+            # A stop waits for the running command to finish
+            daemon_threads = False
+            block_on_close = True
+
+        self.server = DaemonServer(('127.0.0.1', self.port), DaemonRequestHandler)
+        self.port = self.server.server_address[1]
+        current_daemon = self
+        # Processes started by commands, ex. a tools command building the project, must not wait on this daemon
+        os.environ[no_daemon_env_var] = '1'
+        self.write_info()
+        try:
+            self.server.serve_forever()
+        finally:
+            self.server.server_close()
+            self.remove_info()
+            current_daemon = None
+
+    def stop(self):
+        import threading
+        if self.server is not None:
+            threading.Thread(target=self.server.shutdown).start()
+
+    def write_info(self):
+        os.makedirs(os.path.dirname(daemon_info_path), exist_ok=True)
+        temp_path = '{}.{}.tmp'.format(daemon_info_path, os.getpid())
+        with open(os.open(temp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w') as fp:
+            json.dump({'port': self.port, 'token': self.token, 'pid': os.getpid()}, fp)
+        os.replace(temp_path, daemon_info_path)
+
+    def remove_info(self):
+        daemon_info = read_daemon_info()
+        if daemon_info is not None and daemon_info.get('pid') == os.getpid():
+            try:
+                os.remove(daemon_info_path)
+            except OSError:
+                pass
+
+    def get_status(self):
+        import time
+        return {'pid': os.getpid(),
+                'port': self.port,
+                'uptime_s': round(time.time() - self.started, 1),
+                'jobs_run': self.jobs_run,
+                'current_job': self.current_job}
+
+    def handle_connection(self, connection, reader):
+        import hmac
+        connection = DaemonConnection(connection)
+        try:
+            request = json.loads(reader.readline().decode('utf-8'))
+        except (OSError, ValueError):
+            return
+        if not isinstance(request, dict) or not hmac.compare_digest(str(request.get('token', '')), self.token):
+            connection.send({'accepted': False, 'error': 'Invalid daemon token'})
+            return
+
+        command = request.get('command')
+        if command == 'status':
+            connection.send({'accepted': True})
+            connection.send({'status': self.get_status()})
+        elif command == 'stop':
+            connection.send({'accepted': True})
+            self.stop()
+        elif command in daemon_commands:
+            connection.send({'accepted': True})
+            exit_code = self.run_job(request, connection)
+            connection.send({'exit_code': exit_code})
+        else:
+            connection.send({'accepted': False, 'error': 'Unknown command {}'.format(command)})
+
+    def run_job(self, request, connection):
+        """
+        Run a command for a client with the working directory and environment of the client
+        :return: The exit code of the command
+        """
+        from utility.trace import tracer
+        if not self.job_lock.acquire(blocking=False):
+            running_job = self.current_job
+            connection.send({'err': 'Waiting for the builder daemon to finish {}...\n'.format(
+                '{} {}'.format(running_job['command'], ' '.join(running_job['args'])) if running_job else 'a command')})
+            self.job_lock.acquire()
+        old_cwd = os.getcwd()
+        old_environ = dict(os.environ)
+        old_streams = sys.stdin, sys.stdout, sys.stderr
+        try:
+            self.current_job = {'command': request['command'], 'args': request.get('args', []), 'cwd': request['cwd']}
+            os.environ.clear()
+            os.environ.update(request.get('env', {}))
+            os.environ[no_daemon_env_var] = '1'
+            os.chdir(request['cwd'])
+            sys.stdin = io.StringIO('')
+            sys.stdout = DaemonStream(connection, 'out', request.get('color', False))
+            sys.stderr = DaemonStream(connection, 'err', request.get('color', False))
+            try:
+                return invoke_command(request['command'], request.get('args', []))
+            finally:
+                # Written at exit when not in a daemon
+                tracer.finish()
+                tracer.reset()
+        except OSError as e:
+            connection.send({'err': '{}\n'.format(e)})
+            return 1
+        finally:
+            sys.stdin, sys.stdout, sys.stderr = old_streams
+            os.chdir(old_cwd)
+            os.environ.clear()
+            os.environ.update(old_environ)
+            self.current_job = None
+            self.jobs_run += 1
+            self.job_lock.release()
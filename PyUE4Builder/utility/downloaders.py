@@ -1,50 +1,300 @@
 #!/usr/bin/env python
 
 import os
-from urllib.request import urlopen
+import json
+import time
+import hashlib
+import threading
+from urllib.request import urlopen, Request
+from urllib.error import URLError
 
 __author__ = "Ryan Sheffer"
 __copyright__ = "Copyright 2020, Sheffer Online Services"
 __credits__ = ["Ryan Sheffer", "VREAL"]
 
 
-def download_file(file_url, output_folder='.', simple_loading=False):
+class DownloadState(object):
     """
-    Download a file and show a fancy output
+    The progress of a download, saved next to the partial file so an interrupted download can be resumed.
+    Each segment is [start, end, bytes downloaded], end is inclusive like the HTTP Range header.
+    """
+    def __init__(self, file_path, file_url, file_size, validator):
+        self.file_path = file_path
+        self.file_url = file_url
+        self.file_size = file_size
+        # The ETag or Last-Modified of the file, a partial download of another version of the file can't be resumed
+        self.validator = validator
+        self.segments = []
+
+    def load(self):
+        """
+        Load the state of an earlier download of the same file
+        :return: True if there is a download to resume
+        """
+        try:
+            with open(self.file_path, 'r') as fp:
+                json_s = json.load(fp)
+            if json_s['file_url'] == self.file_url and json_s['file_size'] == self.file_size and \
+                    json_s['validator'] == self.validator:
+                self.segments = json_s['segments']
+                return True
+        except (IOError, ValueError, KeyError):
+            pass
+        return False
+
+    def save(self):
+        with open(self.file_path, 'w') as fp:
+            json.dump({'file_url': self.file_url,
+                       'file_size': self.file_size,
+                       'validator': self.validator,
+                       'segments': self.segments}, fp)
+
+    def split(self, num_segments, min_segment_size):
+        """
+        Split the file into segments to download at the same time
+        :param num_segments: The maximum number of segments
+        :param min_segment_size: The smallest segment to make, small files are downloaded with fewer segments
+        """
+        num_segments = max(1, min(num_segments, self.file_size // max(1, min_segment_size)))
+        segment_size = self.file_size // num_segments
+        self.segments = []
+        for index in range(num_segments):
+            start = index * segment_size
+            end = self.file_size - 1 if index == num_segments - 1 else start + segment_size - 1
+            self.segments.append([start, end, 0])
+
+    def get_downloaded(self):
+        return sum(segment[2] for segment in self.segments)
+
+
+def get_file_info(file_url):
+    """
+    Ask the server about a file without downloading it
+    :param file_url: The URL of the file
+    :return: (file size or -1 if unknown, True if byte ranges are supported, ETag or Last-Modified validator)
+    """
+    try:
+        with urlopen(Request(file_url, method='HEAD')) as u:
+            headers = u.info()
+    except URLError:
+        # Not every server answers HEAD requests, download without resume or segments
+        return -1, False, ''
+    file_size = int(headers.get('Content-Length', -1))
+    accepts_ranges = headers.get('Accept-Ranges', '').lower() == 'bytes'
+    validator = headers.get('ETag', '') or headers.get('Last-Modified', '')
+    return file_size, accepts_ranges, validator
+
+
+def hash_file_contents(file_path, algorithm):
+    hasher = hashlib.new(algorithm)
+    with open(file_path, 'rb') as fp:
+        while True:
+            buff = fp.read(1024 * 1024)
+            if not buff:
+                break
+            hasher.update(buff)
+    return hasher.hexdigest()
+
+
+class ProgressPrinter(object):
+    """
+    Prints the progress of a download from a timer thread, so the download loop itself only counts bytes
+    """
+    def __init__(self, file_size, simple_loading, interval, get_downloaded):
+        """
+        :param get_downloaded: Callable returning the number of bytes downloaded so far
+        """
+        self.file_size = file_size
+        self.simple_loading = simple_loading
+        self.interval = interval
+        self.get_downloaded = get_downloaded
+        self.start_time = time.perf_counter()
+        self.start_downloaded = 0
+        self.stop_event = threading.Event()
+        self.thread = None
+
+    def print_status(self):
+        file_size_dl = self.get_downloaded()
+        elapsed = max(time.perf_counter() - self.start_time, 0.001)
+        speed = (file_size_dl - self.start_downloaded) / elapsed / (1024 * 1024)
+        if self.file_size > 0:
+            status = r"%10d  [%3.2f%%] %.1f MB/s" % (file_size_dl, file_size_dl * 100.0 / self.file_size, speed)
+        else:
+            status = r"%10d  %.1f MB/s" % (file_size_dl, speed)
+        if self.simple_loading:
+            print(status, flush=True)
+        else:
+            # Clear the previous page before printing, add the required number of backspaces
+            # NOTE: This works in the terminal, rarely works in a UI text field pulling characters from the stream
+            status += chr(8) * len(status)
+            print(status, end='', flush=True)
+
+    def run(self):
+        while not self.stop_event.wait(self.interval):
+            self.print_status()
+
+    def start(self):
+        self.start_time = time.perf_counter()
+        self.start_downloaded = self.get_downloaded()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def stop(self, print_final=True):
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join()
+        if print_final:
+            self.print_status()
+
+
+# Response reads start at the min block size and double while reads fill the buffer, up to the max block size
+min_block_size = 64 * 1024
+max_block_size = 4 * 1024 * 1024
+
+
+def copy_response(u, fp, on_data, max_bytes=-1):
+    """
+    Write a response body to a file. Data is read into one reused buffer, so no bytes objects are created per read.
+    :param u: The response to read
+    :param fp: The file to write to, at its current position
+    :param on_data: Called with the number of bytes written after every write
+    :param max_bytes: The maximum number of bytes to copy, -1 copies all of the response
+    :return: The number of bytes copied
+    """
+    buffer = memoryview(bytearray(max_block_size))
+    block_sz = min_block_size
+    total = 0
+    while max_bytes < 0 or total < max_bytes:
+        read_sz = block_sz if max_bytes < 0 else min(block_sz, max_bytes - total)
+        bytes_read = u.readinto(buffer[:read_sz])
+        if not bytes_read:
+            break
+        fp.write(buffer[:bytes_read])
+        total += bytes_read
+        on_data(bytes_read)
+        if bytes_read == read_sz and block_sz < max_block_size:
+            block_sz *= 2
+    return total
+
+
+def download_segment(file_url, part_path, segment, retries):
+    """
+    Download a byte range of a file into its place in the partial file, resuming from where the segment got to
+    :param file_url: The URL of the file
+    :param part_path: The preallocated partial file to write into
+    :param segment: [start, end, bytes downloaded], the bytes downloaded are updated as the segment downloads
+    :param retries: The number of times to reconnect after a dropped connection
+    """
+    def on_data(bytes_read):
+        segment[2] += bytes_read
+
+    attempt = 0
+    while segment[0] + segment[2] <= segment[1]:
+        position = segment[0] + segment[2]
+        if attempt > retries:
+            raise ConnectionError('Download of {} keeps stopping at byte {}'.format(file_url, position))
+        try:
+            request = Request(file_url, headers={'Range': 'bytes={}-{}'.format(position, segment[1])})
+            with urlopen(request) as u, open(part_path, 'r+b') as fp:
+                if u.status != 206:
+                    raise URLError('Server ignored the byte range request of {}'.format(file_url))
+                fp.seek(position)
+                if copy_response(u, fp, on_data, segment[1] + 1 - position) == 0:
+                    # The connection ended without sending anything
+                    attempt += 1
+        except (URLError, ConnectionError, TimeoutError):
+            attempt += 1
+            if attempt > retries:
+                raise
+
+
+def download_stream(file_url, part_path, downloaded):
+    """
+    Download a whole file on a single connection, used when the server doesn't support byte ranges
+    :param downloaded: [bytes downloaded], updated as the file downloads
+    """
+    def on_data(bytes_read):
+        downloaded[0] += bytes_read
+
+    with urlopen(file_url) as u, open(part_path, 'wb') as fp:
+        copy_response(u, fp, on_data)
+
+
+def download_file(file_url, output_folder='.', simple_loading=False, segments=4, checksum='',
+                  checksum_algorithm='sha256', retries=3, progress_interval=0.5, min_segment_size=4 * 1024 * 1024):
+    """
+    Download a file and show a fancy output.
+    If the server supports byte ranges, the file is downloaded in several segments at once and an interrupted
+    download is resumed by the next call instead of starting over.
     :param file_url: The URL of the file to download
     :param output_folder: The folder to output to, defaults to current working directory
     :param simple_loading: Should the loading output have no animation?
+    :param segments: The maximum number of connections to download the file with
+    :param checksum: If set, the expected hex digest of the file. A download which doesn't match is deleted.
+    :param checksum_algorithm: The hashlib algorithm of the checksum
+    :param retries: The number of times each segment reconnects after a dropped connection before giving up
+    :param progress_interval: The minimum seconds between progress updates
+    :param min_segment_size: Files are not split into segments smaller than this many bytes
+    :raise ValueError: If the downloaded file doesn't match the checksum
+    :return: The path of the downloaded file
     """
     if not os.path.isdir(output_folder):
         os.makedirs(output_folder)
     file_name = file_url.split('/')[-1]
-    u = urlopen(file_url)
     file_name_out = os.path.join(output_folder, file_name)
-    if os.path.isfile(file_name_out):
-        os.unlink(file_name_out)
-    with open(file_name_out, 'wb') as fp:
-        file_size = int(dict(u.info())["Content-Length"])
-        print("Downloading: {} Bytes: {}".format(file_name, file_size))
-
-        file_size_dl = 0
-        block_sz = 8192
-        simple_loading_sz = 524288
-        cur_simple_loading = 0
-        while True:
-            buff = u.read(block_sz)
-            if not buff:
-                break
+    part_path = file_name_out + '.part'
+    file_size, accepts_ranges, validator = get_file_info(file_url)
+    print("Downloading: {} Bytes: {}".format(file_name, file_size))
+
+    if not accepts_ranges or file_size <= 0:
+        downloaded = [0]
+        progress = ProgressPrinter(file_size, simple_loading, progress_interval, lambda: downloaded[0])
+        progress.start()
+        try:
+            download_stream(file_url, part_path, downloaded)
+        finally:
+            progress.stop()
+    else:
+        state = DownloadState(part_path + '.json', file_url, file_size, validator)
+        if state.load() and os.path.isfile(part_path) and os.path.getsize(part_path) == file_size:
+            print('Resuming download at {} bytes'.format(state.get_downloaded()))
+        else:
+            state.split(segments, min_segment_size)
+            with open(part_path, 'wb') as fp:
+                fp.truncate(file_size)
+        state.save()
 
-            file_size_dl += len(buff)
-            fp.write(buff)
-            status = r"%10d  [%3.2f%%]" % (file_size_dl, file_size_dl * 100.0 / file_size)
-            if simple_loading:
-                if file_size_dl > cur_simple_loading or file_size_dl >= file_size:
-                    cur_simple_loading += simple_loading_sz
-                    print(status, flush=True)
-            else:
-                # Clear the previous page before printing, add the required number of backspaces
-                # NOTE: This works in the terminal, rarely works in a UI text field pulling characters from the stream
-                status += chr(8) * len(status)
-                print(status, end='', flush=True)
+        errors = []
+
+        def run_segment(segment):
+            try:
+                download_segment(file_url, part_path, segment, retries)
+            except Exception as e:
+                errors.append(e)
+
+        progress = ProgressPrinter(file_size, simple_loading, progress_interval, state.get_downloaded)
+        progress.start()
+        threads = [threading.Thread(target=run_segment, args=(segment,), daemon=True) for segment in state.segments]
+        for thread in threads:
+            thread.start()
+        try:
+            for thread in threads:
+                while thread.is_alive():
+                    thread.join(progress_interval)
+                    state.save()
+        finally:
+            progress.stop()
+            # Always record how far the segments got so the download can be resumed
+            state.save()
+        if len(errors):
+            raise errors[0]
+        os.unlink(state.file_path)
     print('')
+
+    if checksum != '':
+        file_checksum = hash_file_contents(part_path, checksum_algorithm)
+        if file_checksum.lower() != checksum.lower():
+            os.unlink(part_path)
+            raise ValueError('Checksum of {} is {}, expected {}'.format(file_name, file_checksum, checksum))
+    os.replace(part_path, file_name_out)
+    return file_name_out
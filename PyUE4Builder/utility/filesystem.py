@@ -0,0 +1,387 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import mmap
+import stat
+import errno
+import shutil
+import hashlib
+import threading
+import contextlib
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def scan_directories(root_path, include_hidden=True):
+    """
+    Walk a directory tree lazily using os.scandir, one directory at a time.
+    Only directories are descended into, symlinked directories are not followed.
+    :param root_path: The directory to walk. If it doesn't exist nothing is yielded.
+    :param include_hidden: If false, files and directories starting with '.' are skipped
+    :return: Generator of (directory path, list of os.DirEntry of the files in that directory)
+    """
+    dirs_to_scan = [root_path]
+    while dirs_to_scan:
+        dir_path = dirs_to_scan.pop()
+        file_entries = []
+        sub_dirs = []
+        try:
+            with os.scandir(dir_path) as it:
+                for entry in it:
+                    if not include_hidden and entry.name.startswith('.'):
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        sub_dirs.append(entry.path)
+                    else:
+                        file_entries.append(entry)
+        except (FileNotFoundError, NotADirectoryError):
+            continue
+        # Reverse so sub directories are walked in the order they were found
+        dirs_to_scan.extend(reversed(sub_dirs))
+        yield dir_path, file_entries
+
+
+def scan_files(root_path, include_hidden=True):
+    """
+    Lazily yield every file below a directory, see scan_directories
+    :param root_path: The directory to walk
+    :param include_hidden: If false, files and directories starting with '.' are skipped
+    :return: Generator of os.DirEntry
+    """
+    for _, file_entries in scan_directories(root_path, include_hidden):
+        yield from file_entries
+
+
+def hash_file(file_path):
+    """
+    Hash the contents of a file. The file is memory mapped so it is hashed without being copied into python
+    memory, and the hash runs without holding the GIL so several files can be hashed on threads at once.
+    :param file_path: The file to hash
+    :return: The hex digest of the file contents
+    """
+    hasher = hashlib.blake2b(digest_size=20)
+    with open(file_path, 'rb') as fp:
+        if os.fstat(fp.fileno()).st_size > 0:
+            with mmap.mmap(fp.fileno(), 0, access=mmap.ACCESS_READ) as mapped_file:
+                hasher.update(mapped_file)
+    return hasher.hexdigest()
+
+
+def hash_files(file_paths, max_workers=0):
+    """
+    Hash many files in parallel, see hash_file
+    :param file_paths: The files to hash
+    :param max_workers: The number of files to hash at once, 0 uses the number of CPUs
+    :return: List of hex digests in the order of file_paths
+    """
+    if max_workers <= 0:
+        max_workers = os.cpu_count() or 1
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        return list(pool.map(hash_file, file_paths))
+
+
+def files_match(src_path, dst_path, compare_hash=False):
+    """
+    Check if a destination file is already a copy of a source file
+    :param src_path: The source file
+    :param dst_path: The destination file, it does not need to exist
+    :param compare_hash: If true, files of the same size are compared by content hash instead of modified time
+    :return: True if the destination has the same size and modified time (or content) as the source
+    """
+    try:
+        dst_stat = os.stat(dst_path)
+    except OSError:
+        return False
+    src_stat = os.stat(src_path)
+    if src_stat.st_size != dst_stat.st_size:
+        return False
+    if compare_hash:
+        return hash_file(src_path) == hash_file(dst_path)
+    return src_stat.st_mtime_ns == dst_stat.st_mtime_ns
+
+
+def reflink_file(src_path, dst_path):
+    """
+    Create a copy on write clone of a file, sharing the data blocks of the source until either is modified.
+    Supported on Linux filesystems with FICLONE (Btrfs, XFS). Other platforms and filesystems are not supported.
+    :param src_path: The source file
+    :param dst_path: The new file to create
+    :return: True if the clone was made, False if reflinks are not supported for these files
+    """
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    ficlone = 0x40049409
+    with open(src_path, 'rb') as src_fp, open(dst_path, 'wb') as dst_fp:
+        try:
+            fcntl.ioctl(dst_fp.fileno(), ficlone, src_fp.fileno())
+            cloned = True
+        except OSError as e:
+            if e.errno not in (errno.EOPNOTSUPP, errno.EXDEV, errno.EINVAL, errno.ENOTTY, errno.EBADF):
+                raise
+            cloned = False
+    if not cloned:
+        os.unlink(dst_path)
+        return False
+    shutil.copystat(src_path, dst_path)
+    return True
+
+
+def copy_file(src_path, dst_path, link_mode=''):
+    """
+    Copy a file, replacing the destination if it exists
+    :param src_path: The source file
+    :param dst_path: The destination file, its directory must exist
+    :param link_mode: '' to always copy, 'hardlink' to hard link the destination to the source or 'reflink' to
+                      make a copy on write clone. Links fall back to a copy if the filesystem can't make them,
+                      ex. when the source and destination are on different drives.
+    :return: The way the file was placed, 'copied', 'hardlinked' or 'reflinked'
+    """
+    with contextlib.suppress(FileNotFoundError):
+        os.unlink(dst_path)
+    if link_mode == 'hardlink':
+        try:
+            os.link(src_path, dst_path)
+            return 'hardlinked'
+        except OSError:
+            pass
+    elif link_mode == 'reflink':
+        if reflink_file(src_path, dst_path):
+            return 'reflinked'
+    shutil.copy2(src_path, dst_path)
+    return 'copied'
+
+
+def remove_file(file_path):
+    """
+    Delete a file, clearing the read-only flag if that stops it from being deleted
+    :param file_path: The file to delete. Missing files are ignored.
+    """
+    try:
+        os.unlink(file_path)
+    except FileNotFoundError:
+        pass
+    except PermissionError:
+        os.chmod(file_path, stat.S_IWRITE)
+        os.unlink(file_path)
+
+
+def remove_dir(dir_path):
+    """
+    Delete an empty directory, clearing the read-only flag if that stops it from being deleted
+    :param dir_path: The directory to delete. Missing directories are ignored.
+    """
+    try:
+        os.rmdir(dir_path)
+    except FileNotFoundError:
+        pass
+    except PermissionError:
+        os.chmod(dir_path, stat.S_IWRITE)
+        os.rmdir(dir_path)
+
+
+def is_link_entry(entry):
+    """
+    :return: True if a directory entry is a symlink or junction which must be removed without following it
+    """
+    return entry.is_symlink() or (hasattr(entry, 'is_junction') and entry.is_junction())
+
+
+def is_link_path(path):
+    """
+    :return: True if a path is a symlink or junction (or any other reparse point on Windows), which must be removed
+             without following it
+    """
+    try:
+        stat_info = os.lstat(path)
+    except OSError:
+        return False
+    if stat.S_ISLNK(stat_info.st_mode):
+        return True
+    return bool(getattr(stat_info, 'st_file_attributes', 0) & getattr(stat, 'FILE_ATTRIBUTE_REPARSE_POINT', 0))
+
+
+def remove_link(link_path):
+    """
+    Delete a symlink or junction, leaving what it points at alone
+    :param link_path: The link to delete
+    """
+    if os.name == 'nt' and os.path.isdir(link_path):
+        remove_dir(link_path)  # Windows directory links and junctions are removed like directories
+    else:
+        remove_file(link_path)
+
+
+def delete_tree(root_path, max_workers=0):
+    """
+    Delete a directory tree. Sub directories are scanned and their files deleted on a thread pool, which is much
+    faster than shutil.rmtree for trees with many files. Read-only files are deleted, links are not followed.
+    :param root_path: The directory to delete. If it doesn't exist nothing is done.
+    :param max_workers: The number of directories to clear at once, 0 uses the number of CPUs
+    :raise OSError: The first error hit, after everything else which could be deleted was deleted
+    :return: (files deleted, bytes freed)
+    """
+    return delete_trees([root_path], max_workers)
+
+
+def delete_trees(root_paths, max_workers=0):
+    """
+    Delete several directory trees at once, sharing one thread pool between them. See delete_tree.
+    :param root_paths: The directories to delete. Those which don't exist are ignored.
+    :param max_workers: The number of directories to clear at once, 0 uses the number of CPUs
+    :raise OSError: The first error hit, after everything else which could be deleted was deleted
+    :return: (files deleted, bytes freed)
+    """
+    if max_workers <= 0:
+        max_workers = os.cpu_count() or 1
+    errors = []
+
+    def clear_dir(dir_path):
+        """
+        Delete the files of a directory
+        :return: (sub directories, files deleted, bytes freed)
+        """
+        sub_dirs = []
+        files_deleted = 0
+        bytes_freed = 0
+        try:
+            with os.scandir(dir_path) as it:
+                entries = list(it)
+        except FileNotFoundError:
+            return sub_dirs, files_deleted, bytes_freed
+        for entry in entries:
+            try:
+                if is_link_entry(entry):
+                    remove_link(entry.path)
+                elif entry.is_dir():
+                    sub_dirs.append(entry.path)
+                else:
+                    file_size = entry.stat(follow_symlinks=False).st_size
+                    remove_file(entry.path)
+                    files_deleted += 1
+                    bytes_freed += file_size
+            except OSError as e:
+                errors.append(e)
+        return sub_dirs, files_deleted, bytes_freed
+
+    # Roots which are links are removed as links, descending into them would delete what they point at
+    link_roots = [root_path for root_path in root_paths if is_link_path(root_path)]
+    for link_root in link_roots:
+        try:
+            remove_link(link_root)
+        except OSError as e:
+            errors.append(e)
+    root_paths = [root_path for root_path in root_paths if root_path not in link_roots and os.path.isdir(root_path)]
+    if not len(root_paths):
+        if len(errors):
+            raise errors[0]
+        return 0, 0
+    # Every directory found, parents before their children
+    all_dirs = list(root_paths)
+    total_files = 0
+    total_bytes = 0
+    with ThreadPoolExecutor(max_workers=max_workers) as pool:
+        pending = {pool.submit(clear_dir, root_path) for root_path in root_paths}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                sub_dirs, files_deleted, bytes_freed = future.result()
+                total_files += files_deleted
+                total_bytes += bytes_freed
+                all_dirs.extend(sub_dirs)
+                pending.update(pool.submit(clear_dir, sub_dir) for sub_dir in sub_dirs)
+
+    for dir_path in reversed(all_dirs):
+        try:
+            remove_dir(dir_path)
+        except OSError as e:
+            errors.append(e)
+    if len(errors):
+        raise errors[0]
+    return total_files, total_bytes
+
+
+class DeferredDeletions(object):
+    """
+    Deletes directory trees in the background. A tree is first renamed aside so its path is free to be used again
+    straight away, then deleted while the build carries on. Call wait before exiting to make sure all are deleted.
+    """
+    aside_marker = '.pending-delete-'
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.threads = []
+        self.errors = []
+        self.count = 0
+
+    def get_aside_path(self, dir_path):
+        with self.lock:
+            self.count += 1
+            count = self.count
+        return '{}{}{}-{}'.format(os.path.normpath(dir_path), self.aside_marker, os.getpid(), count)
+
+    def delete_tree(self, dir_path, max_workers=0):
+        """
+        Rename a directory aside and delete it in the background
+        :param dir_path: The directory to delete
+        :param max_workers: See utility.filesystem.delete_tree
+        :raise OSError: If the directory could not be renamed, ex. a file in it is held open by another process
+        """
+        dir_path = os.path.normpath(dir_path)
+        aside_paths = []
+        if is_link_path(dir_path):
+            remove_link(dir_path)  # Only the link goes, what it points at is left alone
+        elif os.path.isdir(dir_path):
+            aside_path = self.get_aside_path(dir_path)
+            os.rename(dir_path, aside_path)
+            aside_paths.append(aside_path)
+        # Also finish off trees left behind by earlier runs which exited before deleting them
+        parent_dir = os.path.dirname(dir_path) or '.'
+        stale_prefix = os.path.basename(dir_path) + self.aside_marker
+        with os.scandir(parent_dir) as it:
+            for entry in it:
+                if entry.name.startswith(stale_prefix) and entry.path not in aside_paths and \
+                        not any(entry.path == thread.name for thread in self.threads):
+                    aside_paths.append(entry.path)
+
+        for aside_path in aside_paths:
+            thread = threading.Thread(target=self.delete_aside, args=(aside_path, max_workers), name=aside_path)
+            with self.lock:
+                self.threads.append(thread)
+            thread.start()
+
+    def delete_aside(self, aside_path, max_workers):
+        try:
+            delete_tree(aside_path, max_workers)
+        except OSError as e:
+            with self.lock:
+                self.errors.append('Unable to delete "{}": {}'.format(aside_path, e))
+
+    def pending(self):
+        """
+        :return: The number of trees still being deleted
+        """
+        with self.lock:
+            return len([thread for thread in self.threads if thread.is_alive()])
+
+    def wait(self):
+        """
+        Wait for all background deletions to finish
+        :return: List of error strings of trees which could not be fully deleted
+        """
+        with self.lock:
+            threads = list(self.threads)
+        for thread in threads:
+            thread.join()
+        with self.lock:
+            errors = self.errors
+            self.errors = []
+        return errors
+
+
+# Background deletions of this build process
+deferred_deletions = DeferredDeletions()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+def raise_frozen(self, *args, **kwargs):
+    raise TypeError('{} is read only, thaw it to get a modifiable copy'.format(type(self).__name__))
+
+
+class FrozenDict(dict):
+    """
+    A dict which can't be modified. Being a real dict it still works with json and everything reading dicts.
+    Copying it returns a normal modifiable dict.
+    """
+    __setitem__ = raise_frozen
+    __delitem__ = raise_frozen
+    __ior__ = raise_frozen
+    clear = raise_frozen
+    pop = raise_frozen
+    popitem = raise_frozen
+    setdefault = raise_frozen
+    update = raise_frozen
+
+    def __copy__(self):
+        return dict(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return dict, (dict(self),)
+
+
+class FrozenList(list):
+    """
+    A list which can't be modified. Copying it returns a normal modifiable list.
+    """
+    __setitem__ = raise_frozen
+    __delitem__ = raise_frozen
+    __iadd__ = raise_frozen
+    __imul__ = raise_frozen
+    append = raise_frozen
+    extend = raise_frozen
+    insert = raise_frozen
+    pop = raise_frozen
+    remove = raise_frozen
+    clear = raise_frozen
+    sort = raise_frozen
+    reverse = raise_frozen
+
+    def __copy__(self):
+        return list(self)
+
+    def __deepcopy__(self, memo):
+        return thaw(self)
+
+    def __reduce__(self):
+        return list, (list(self),)
+
+
+def freeze(value):
+    """
+    Make a read only copy of json like data, dicts and lists become FrozenDict and FrozenList
+    :param value: The value to freeze
+    :return: The frozen value, which can be shared without copying
+    """
+    if isinstance(value, dict):
+        frozen = FrozenDict()
+        for k, v in value.items():
+            dict.__setitem__(frozen, k, freeze(v))
+        return frozen
+    if isinstance(value, list):
+        frozen = FrozenList()
+        for v in value:
+            list.append(frozen, freeze(v))
+        return frozen
+    return value
+
+
+def thaw(value):
+    """
+    Make a modifiable copy of json like data, the reverse of freeze
+    :param value: The value to thaw, frozen or not
+    :return: A copy with normal dicts and lists
+    """
+    if isinstance(value, dict):
+        return {k: thaw(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [thaw(v) for v in value]
+    return value
@@ -0,0 +1,185 @@
+#!/usr/bin/env python
+
+import os
+import sys
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class PlatformBackend(object):
+    """
+    The platform specific parts of finding build tools and registering engines.
+    Backends only import their platform modules (ex. winreg) when they are first used, so the rest of the builder
+    imports and starts on any platform.
+    """
+    def get_visual_studio_versions(self):
+        """
+        :return: Set of the installed visual studio versions by year, ex. {2019, 2022}
+        """
+        return set()
+
+    def get_registered_engines(self, builds_key):
+        """
+        :param builds_key: The registry key engines are registered under (Windows only)
+        :return: Dict of registered engine key names to engine paths
+        """
+        return {}
+
+    def register_engine(self, builds_key, key_name, engine_path):
+        """
+        Register an engine so the project can be associated with it
+        :param builds_key: The registry key engines are registered under (Windows only)
+        :param key_name: The name to register the engine as
+        :param engine_path: The engine directory
+        """
+        from utility.common import error_exit
+        error_exit('Registering the engine {} is not supported on this platform ({}). Set UE4EngineKeyName to '
+                   'nothing to skip registering engines.'.format(engine_path, sys.platform), False)
+
+
+class WindowsPlatformBackend(PlatformBackend):
+    """
+    Visual studio installs and engine registrations are found in the Windows registry
+    """
+    def __init__(self):
+        # Registered engines by builds key, with the last write time of the key they were read at
+        self.registered_engines = {}
+
+    def get_visual_studio_versions(self):
+        import winreg
+        versions_found = set()
+        try:
+            # First try for 2015 to 2017
+            try:
+                hkey = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                                      "SOFTWARE\\WOW6432Node\\Microsoft\\VisualStudio\\SxS\\VS7")
+                for version_name, version in [('15.0', 2017), ('14.0', 2015)]:
+                    try:
+                        winreg.QueryValueEx(hkey, version_name)
+                        versions_found.add(version)
+                    except FileNotFoundError:
+                        pass
+                hkey.Close()
+            except FileNotFoundError:
+                pass
+            # Now try for 2019 and 2022
+            for version_name, version in [('16.0', 2019), ('17.0', 2022)]:
+                try:
+                    hkey = winreg.OpenKey(winreg.HKEY_LOCAL_MACHINE,
+                                          "SOFTWARE\\WOW6432Node\\Microsoft\\VisualStudio\\{}".format(version_name))
+                    versions_found.add(version)
+                    hkey.Close()
+                except FileNotFoundError:
+                    pass
+        except OSError:
+            return set()
+        return versions_found
+
+    @staticmethod
+    def get_key_write_time(key_path):
+        """
+        :param key_path: Full path of a registry key, ex. HKEY_CURRENT_USER\\SOFTWARE\\Epic Games
+        :return: The time the key was last written to, None if the key doesn't exist
+        """
+        import winreg
+        root_name, _, sub_key = key_path.partition('\\')
+        try:
+            with winreg.OpenKey(getattr(winreg, root_name), sub_key) as hkey:
+                return winreg.QueryInfoKey(hkey)[2]
+        except (OSError, AttributeError):
+            return None
+
+    def get_registered_engines(self, builds_key):
+        # Checking the write time is far cheaper than reading the values again, which matters to the daemon
+        write_time = self.get_key_write_time(builds_key)
+        if write_time is None:
+            return {}  # No keys exist yet
+        cached = self.registered_engines.get(builds_key)
+        if cached is not None and cached[0] == write_time:
+            return dict(cached[1])
+
+        from winregistry import WinRegistry as Reg
+        try:
+            registered_engines = Reg().read_key(builds_key)['values']
+        except Exception:
+            return {}
+        engines = {engine['value']: engine['data'] for engine in registered_engines}
+        self.registered_engines[builds_key] = (write_time, engines)
+        return dict(engines)
+
+    def register_engine(self, builds_key, key_name, engine_path):
+        from winregistry import WinRegistry as Reg
+        self.registered_engines.pop(builds_key, None)
+        reg = Reg()
+        try:
+            reg.create_key(builds_key)
+        except Exception:
+            pass
+        reg.write_value(builds_key, key_name, engine_path, 'REG_SZ')
+
+
+class InstallIniPlatformBackend(PlatformBackend):
+    """
+    Linux and Mac have no registry, the engine registers source builds in an Install.ini [Installations] section
+    of the users Epic settings instead. Building with visual studio is not possible.
+    """
+    def __init__(self, install_ini_path):
+        self.install_ini_path = install_ini_path
+        # The registered engines with the size and modification time of the Install.ini they were read at
+        self.registered_engines = None
+
+    def read_install_ini(self):
+        import configparser
+        install_ini = configparser.ConfigParser(interpolation=None)
+        install_ini.optionxform = str  # Engine key names are case sensitive
+        install_ini.read(self.install_ini_path)
+        return install_ini
+
+    def get_registered_engines(self, builds_key):
+        import configparser
+        try:
+            stat_info = os.stat(self.install_ini_path)
+        except OSError:
+            return {}
+        ini_state = (stat_info.st_size, stat_info.st_mtime_ns)
+        if self.registered_engines is not None and self.registered_engines[0] == ini_state:
+            return dict(self.registered_engines[1])
+        try:
+            install_ini = self.read_install_ini()
+        except configparser.Error:
+            return {}
+        engines = dict(install_ini.items('Installations')) if install_ini.has_section('Installations') else {}
+        self.registered_engines = (ini_state, engines)
+        return dict(engines)
+
+    def register_engine(self, builds_key, key_name, engine_path):
+        self.registered_engines = None
+        install_ini = self.read_install_ini()
+        if not install_ini.has_section('Installations'):
+            install_ini.add_section('Installations')
+        install_ini.set('Installations', key_name, engine_path)
+        os.makedirs(os.path.dirname(self.install_ini_path), exist_ok=True)
+        with open(self.install_ini_path, 'w') as fp:
+            install_ini.write(fp, space_around_delimiters=False)
+
+
+platform_backend = None
+
+
+def get_platform_backend():
+    """
+    :return: The shared platform backend for this platform
+    """
+    global platform_backend
+    if platform_backend is None:
+        if sys.platform == 'win32':
+            platform_backend = WindowsPlatformBackend()
+        elif sys.platform == 'darwin':
+            platform_backend = InstallIniPlatformBackend(os.path.expanduser(
+                '~/Library/Application Support/Epic/UnrealEngine/Install.ini'))
+        else:
+            platform_backend = InstallIniPlatformBackend(os.path.expanduser(
+                '~/.config/Epic/UnrealEngine/Install.ini'))
+    return platform_backend
@@ -0,0 +1,278 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import click
+import threading
+import subprocess
+from collections import deque
+from utility.trace import tracer
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class ProcessResult(object):
+    """
+    The outcome of a process run through run_process
+    """
+    def __init__(self, cmd, log_path, tail_lines):
+        self.cmd = cmd
+        self.exit_code = -1
+        self.wall_time = 0.0
+        self.stdout_bytes = 0
+        self.stderr_bytes = 0
+        # CPU seconds (user + system) and peak resident memory in bytes of the process, None if unknown
+        self.cpu_time = None
+        self.peak_rss = None
+        self.log_path = log_path
+        # The last lines of output, kept to help explain failures
+        self.tail = deque(maxlen=tail_lines)
+
+    def get_failure_summary(self):
+        """
+        Describe a failed process using the last lines of its output
+        :return: Summary string
+        """
+        summary = '"{}" exited with code {} after {:.1f}s.'.format(self.cmd, self.exit_code, self.wall_time)
+        if self.log_path != '':
+            summary += ' Full log: {}'.format(self.log_path)
+        if len(self.tail):
+            summary += '\nLast {} lines of output:\n{}'.format(len(self.tail), '\n'.join(self.tail))
+        return summary
+
+
+class OutputPipeReader(threading.Thread):
+    """
+    Reads a process output pipe as data arrives, echoing it to the console, teeing it to a log file and keeping
+    complete lines in the results tail.
+    """
+    def __init__(self, pipe, echo_stream, log_file, log_lock, result, is_stderr):
+        super().__init__(daemon=True)
+        self.pipe = pipe
+        self.echo_stream = echo_stream
+        self.log_file = log_file
+        self.log_lock = log_lock
+        self.result = result
+        self.is_stderr = is_stderr
+        self.partial_line = b''
+
+    def add_lines(self, data):
+        lines = (self.partial_line + data).split(b'\n')
+        self.partial_line = lines.pop()
+        for line in lines:
+            self.result.tail.append(line.rstrip(b'\r').decode('utf-8', errors='replace'))
+
+    def run(self):
+        # read1 returns whatever is available, so prompts without a trailing newline are still shown
+        read_chunk = self.pipe.read1 if hasattr(self.pipe, 'read1') else self.pipe.read
+        while True:
+            data = read_chunk(65536)
+            if not data:
+                break
+            if self.is_stderr:
+                self.result.stderr_bytes += len(data)
+            else:
+                self.result.stdout_bytes += len(data)
+            if self.echo_stream is not None:
+                echo_buffer = getattr(self.echo_stream, 'buffer', None)
+                if echo_buffer is not None:
+                    echo_buffer.write(data)
+                    echo_buffer.flush()
+                else:
+                    self.echo_stream.write(data.decode('utf-8', errors='replace'))
+                    self.echo_stream.flush()
+            if self.log_file is not None:
+                with self.log_lock:
+                    self.log_file.write(data)
+            self.add_lines(data)
+        if self.partial_line:
+            self.result.tail.append(self.partial_line.rstrip(b'\r').decode('utf-8', errors='replace'))
+        self.pipe.close()
+
+
+def get_windows_process_usage(handle):
+    """
+    Get the CPU time and peak memory of a finished windows process
+    :param handle: The process handle
+    :return: (cpu_time, peak_rss), either can be None if it could not be queried
+    """
+    import ctypes
+    from ctypes import wintypes
+
+    class ProcessMemoryCounters(ctypes.Structure):
+        _fields_ = [('cb', wintypes.DWORD),
+                    ('PageFaultCount', wintypes.DWORD),
+                    ('PeakWorkingSetSize', ctypes.c_size_t),
+                    ('WorkingSetSize', ctypes.c_size_t),
+                    ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                    ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                    ('PagefileUsage', ctypes.c_size_t),
+                    ('PeakPagefileUsage', ctypes.c_size_t)]
+
+    def filetime_seconds(filetime):
+        return ((filetime.dwHighDateTime << 32) + filetime.dwLowDateTime) / 10000000.0
+
+    cpu_time = None
+    peak_rss = None
+    creation_time, exit_time, kernel_time, user_time = (wintypes.FILETIME() for _ in range(4))
+    get_process_times = ctypes.windll.kernel32.GetProcessTimes
+    get_process_times.argtypes = [wintypes.HANDLE] + [ctypes.POINTER(wintypes.FILETIME)] * 4
+    if get_process_times(handle, ctypes.byref(creation_time), ctypes.byref(exit_time),
+                         ctypes.byref(kernel_time), ctypes.byref(user_time)):
+        cpu_time = filetime_seconds(kernel_time) + filetime_seconds(user_time)
+    counters = ProcessMemoryCounters()
+    counters.cb = ctypes.sizeof(counters)
+    get_memory_info = ctypes.windll.psapi.GetProcessMemoryInfo
+    get_memory_info.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessMemoryCounters), wintypes.DWORD]
+    if get_memory_info(handle, ctypes.byref(counters), counters.cb):
+        peak_rss = counters.PeakWorkingSetSize
+    return cpu_time, peak_rss
+
+
+def open_windows_process(pid):
+    """
+    Open a windows process to query its usage with, the process stays queryable after exiting while it is open
+    :param pid: The process id
+    :return: The process handle, or None if it could not be opened. Close it with close_windows_process
+    """
+    import ctypes
+    from ctypes import wintypes
+    process_query_limited_information = 0x1000
+    open_process = ctypes.windll.kernel32.OpenProcess
+    open_process.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+    open_process.restype = wintypes.HANDLE
+    return open_process(process_query_limited_information, False, pid) or None
+
+
+def close_windows_process(handle):
+    """
+    Close a handle from open_windows_process
+    :param handle: The process handle
+    """
+    import ctypes
+    from ctypes import wintypes
+    close_handle = ctypes.windll.kernel32.CloseHandle
+    close_handle.argtypes = [wintypes.HANDLE]
+    close_handle(handle)
+
+
+def get_children_usage():
+    """
+    Get the resource usage of the children of this process which have finished and been waited on
+    :return: (cpu_time, peak_rss), the CPU seconds of all of them and the peak memory of the largest
+    """
+    import resource
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime, usage.ru_maxrss * (1 if sys.platform == 'darwin' else 1024)
+
+
+# The usage of finished children is only known for all of them together, not per child. The usage of a wait is only
+# recorded when no other wait_process ran during it.
+waits_lock = threading.Lock()
+waits_running = 0
+waits_started = 0
+
+
+def wait_process(proc, result):
+    """
+    Wait for a process to finish, recording its exit code and resource usage on the result.
+    Off Windows the usage is left unknown when other processes finished at the same time (ex. parallel steps).
+    :param proc: The Popen process
+    :param result: The ProcessResult to fill in
+    """
+    global waits_running, waits_started
+    if sys.platform == 'win32':
+        # Opened before waiting so the handle is to this process, not one which reused its pid after it exited
+        handle = None
+        try:
+            handle = open_windows_process(proc.pid)
+        except Exception:
+            pass
+        try:
+            proc.wait()
+            if handle is not None:
+                try:
+                    result.cpu_time, result.peak_rss = get_windows_process_usage(handle)
+                except Exception:
+                    pass
+        finally:
+            if handle is not None:
+                close_windows_process(handle)
+    else:
+        with waits_lock:
+            waits_running += 1
+            waits_started += 1
+            wait_index = waits_started
+            alone = waits_running == 1
+            usage_before = get_children_usage()
+        try:
+            proc.wait()
+        finally:
+            with waits_lock:
+                waits_running -= 1
+                usage_after = get_children_usage()
+                alone = alone and waits_started == wait_index
+        if alone:
+            result.cpu_time = usage_after[0] - usage_before[0]
+            # The peak is of the largest child so far, it only tells the peak of this one if it is a new largest
+            if usage_after[1] > usage_before[1]:
+                result.peak_rss = usage_after[1]
+    result.exit_code = proc.returncode
+
+
+def run_process(cmd, args=None, log_path='', in_color='cyan', silent=False, quiet=False, tail_lines=50, cwd=None,
+                env=None):
+    """
+    Run a system command and wait for it, streaming its stdout and stderr as it is produced
+    :param cmd: The command to run
+    :param args: The arguments to pass to that command (a str list)
+    :param log_path: If set, all output is also written to this log file
+    :param in_color: The color to echo the command in
+    :param silent: Echo the system command to the current stdout?
+    :param quiet: If true, the commands output is not echoed to the console (it is still logged and tailed)
+    :param tail_lines: The number of last output lines to keep for failure reporting
+    :param cwd: The working directory of the command, defaults to the current working directory
+    :param env: The environment of the command, defaults to the current environment
+    :return: ProcessResult describing the exit code, wall time and output of the command
+    """
+    if args is None:
+        args = []
+
+    args_in = [cmd]
+    args_in.extend(args)
+
+    if not silent:
+        click.secho(' '.join(args_in), fg=in_color)
+
+    result = ProcessResult(cmd, log_path, tail_lines)
+    log_file = None
+    if log_path != '':
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        log_file = open(log_path, 'wb')
+        if not silent:
+            log_file.write('{}\n\n'.format(' '.join(args_in)).encode('utf-8'))
+    log_lock = threading.Lock()
+
+    start_time = time.perf_counter()
+    with tracer.span(os.path.basename(cmd), 'process') as trace_span:
+        try:
+            proc = subprocess.Popen(args_in, stdout=subprocess.PIPE, stderr=subprocess.PIPE, cwd=cwd, env=env)
+            readers = [OutputPipeReader(proc.stdout, None if quiet else sys.stdout, log_file, log_lock, result, False),
+                       OutputPipeReader(proc.stderr, None if quiet else sys.stderr, log_file, log_lock, result, True)]
+            for reader in readers:
+                reader.start()
+            wait_process(proc, result)
+            for reader in readers:
+                reader.join()
+        finally:
+            result.wall_time = time.perf_counter() - start_time
+            if log_file is not None:
+                log_file.close()
+        trace_span.args['exit_code'] = result.exit_code
+        tracer.add_process_usage(result.cpu_time, result.peak_rss)
+    return result
@@ -0,0 +1,216 @@
+#!/usr/bin/env python
+
+import os
+import sys
+import time
+import threading
+import subprocess
+from abc import ABC, abstractmethod
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class ProcessInfo(object):
+    """
+    A process in a process table snapshot. The executable path is only looked up when it is first asked for,
+    usually just for the few processes which matched by name.
+    """
+    def __init__(self, pid, name, exe_path_resolver):
+        self.pid = pid
+        self.name = name
+        self.exe_path_resolver = exe_path_resolver
+        self.resolved_exe_path = None
+
+    @property
+    def exe_path(self):
+        """
+        :return: The full path of the processes executable, or empty string if it can't be read (ex. access denied)
+        """
+        if self.resolved_exe_path is None:
+            self.resolved_exe_path = self.exe_path_resolver(self.pid)
+        return self.resolved_exe_path
+
+
+class ProcessScanner(ABC):
+    """
+    Base of the process table scanners. A snapshot of the process table is taken at most once per cache period,
+    every query in that period is answered from the same snapshot.
+    """
+    def __init__(self, cache_seconds=2.0):
+        self.cache_seconds = cache_seconds
+        self.lock = threading.Lock()
+        self.cached_processes = None
+        self.cached_time = 0.0
+
+    @abstractmethod
+    def take_snapshot(self):
+        """
+        List the running processes
+        :return: List of ProcessInfo
+        """
+
+    def get_processes(self):
+        """
+        :return: List of ProcessInfo of the running processes, possibly up to cache_seconds old
+        """
+        with self.lock:
+            if self.cached_processes is None or time.monotonic() - self.cached_time > self.cache_seconds:
+                self.cached_processes = self.take_snapshot()
+                self.cached_time = time.monotonic()
+            return self.cached_processes
+
+    def invalidate(self):
+        """
+        Forget the cached snapshot, ex. after starting or stopping a process
+        """
+        with self.lock:
+            self.cached_processes = None
+
+    def find_processes(self, name_parts, under_path=''):
+        """
+        Find running processes by name and optionally by the location of their executable
+        :param name_parts: List of strings, processes whose name contains any of them match (case insensitive)
+        :param under_path: If set, only processes whose executable is somewhere under this path match
+        :return: List of matching ProcessInfo
+        """
+        name_parts = [name_part.lower() for name_part in name_parts]
+        matches = [process for process in self.get_processes()
+                   if any(name_part in process.name.lower() for name_part in name_parts)]
+        if under_path != '':
+            under_path = os.path.normcase(os.path.normpath(under_path))
+            matches = [process for process in matches
+                       if under_path in os.path.normcase(os.path.normpath(process.exe_path))]
+        return matches
+
+
+class WindowsProcessScanner(ProcessScanner):
+    """
+    Lists processes with a single ToolHelp snapshot, executable paths are read with QueryFullProcessImageName.
+    No processes are spawned.
+    """
+    def take_snapshot(self):
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessEntry32(ctypes.Structure):
+            _fields_ = [('dwSize', wintypes.DWORD),
+                        ('cntUsage', wintypes.DWORD),
+                        ('th32ProcessID', wintypes.DWORD),
+                        ('th32DefaultHeapID', ctypes.c_size_t),
+                        ('th32ModuleID', wintypes.DWORD),
+                        ('cntThreads', wintypes.DWORD),
+                        ('th32ParentProcessID', wintypes.DWORD),
+                        ('pcPriClassBase', wintypes.LONG),
+                        ('dwFlags', wintypes.DWORD),
+                        ('szExeFile', wintypes.WCHAR * 260)]
+
+        kernel32 = ctypes.windll.kernel32
+        kernel32.CreateToolhelp32Snapshot.restype = wintypes.HANDLE
+        kernel32.CreateToolhelp32Snapshot.argtypes = [wintypes.DWORD, wintypes.DWORD]
+        kernel32.Process32FirstW.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessEntry32)]
+        kernel32.Process32NextW.argtypes = [wintypes.HANDLE, ctypes.POINTER(ProcessEntry32)]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+
+        th32cs_snapprocess = 0x00000002
+        snapshot = kernel32.CreateToolhelp32Snapshot(th32cs_snapprocess, 0)
+        if snapshot is None or snapshot == wintypes.HANDLE(-1).value:
+            raise OSError('Unable to take a snapshot of the running processes')
+        processes = []
+        try:
+            entry = ProcessEntry32()
+            entry.dwSize = ctypes.sizeof(ProcessEntry32)
+            has_entry = kernel32.Process32FirstW(snapshot, ctypes.byref(entry))
+            while has_entry:
+                processes.append(ProcessInfo(entry.th32ProcessID, entry.szExeFile, self.get_exe_path))
+                has_entry = kernel32.Process32NextW(snapshot, ctypes.byref(entry))
+        finally:
+            kernel32.CloseHandle(snapshot)
+        return processes
+
+    @staticmethod
+    def get_exe_path(pid):
+        import ctypes
+        from ctypes import wintypes
+
+        kernel32 = ctypes.windll.kernel32
+        kernel32.OpenProcess.restype = wintypes.HANDLE
+        kernel32.OpenProcess.argtypes = [wintypes.DWORD, wintypes.BOOL, wintypes.DWORD]
+        kernel32.QueryFullProcessImageNameW.argtypes = [wintypes.HANDLE, wintypes.DWORD, wintypes.LPWSTR,
+                                                        ctypes.POINTER(wintypes.DWORD)]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+
+        process_query_limited_information = 0x1000
+        handle = kernel32.OpenProcess(process_query_limited_information, False, pid)
+        if not handle:
+            return ''
+        try:
+            buffer = ctypes.create_unicode_buffer(32768)
+            size = wintypes.DWORD(len(buffer))
+            if not kernel32.QueryFullProcessImageNameW(handle, 0, buffer, ctypes.byref(size)):
+                return ''
+            return buffer.value
+        finally:
+            kernel32.CloseHandle(handle)
+
+
+class ProcFsProcessScanner(ProcessScanner):
+    """
+    Lists processes from the Linux /proc filesystem
+    """
+    def take_snapshot(self):
+        processes = []
+        for entry in os.scandir('/proc'):
+            if not entry.name.isdigit():
+                continue
+            try:
+                with open(os.path.join(entry.path, 'comm'), 'r') as fp:
+                    name = fp.read().strip()
+            except OSError:
+                continue  # The process exited while scanning
+            processes.append(ProcessInfo(int(entry.name), name, self.get_exe_path))
+        return processes
+
+    @staticmethod
+    def get_exe_path(pid):
+        try:
+            return os.readlink('/proc/{}/exe'.format(pid))
+        except OSError:
+            return ''
+
+
+class PsProcessScanner(ProcessScanner):
+    """
+    Lists processes with a single ps call, for platforms without /proc like macOS
+    """
+    def take_snapshot(self):
+        processes = []
+        exe_paths = {}
+        output = subprocess.check_output(['ps', '-axo', 'pid=,comm='], universal_newlines=True)
+        for line in output.splitlines():
+            line_parts = line.strip().split(None, 1)
+            if len(line_parts) != 2:
+                continue
+            pid = int(line_parts[0])
+            exe_paths[pid] = line_parts[1]
+            processes.append(ProcessInfo(pid, os.path.basename(line_parts[1]), exe_paths.get))
+        return processes
+
+
+process_scanner = None
+
+
+def get_process_scanner():
+    """
+    :return: The shared process scanner for this platform
+    """
+    global process_scanner
+    if process_scanner is None:
+        if sys.platform == 'win32':
+            process_scanner = WindowsProcessScanner()
+        elif os.path.isdir('/proc'):
+            process_scanner = ProcFsProcessScanner()
+        else:
+            process_scanner = PsProcessScanner()
+    return process_scanner
@@ -0,0 +1,131 @@
+#!/usr/bin/env python
+
+import os
+import json
+import hashlib
+import threading
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class StepCache(object):
+    """
+    A local store of successful build step results, keyed by a fingerprint of everything the step depends on.
+    Each result is a small json file holding the meta the step produced, so a step which would do the exact same
+    work again can be skipped and its meta replayed. The store is capped in size, the least recently used results
+    are evicted first.
+    """
+
+    # Config fields which are always part of a step fingerprint
+    default_config_fields = ['configuration', 'platform', 'UE4EnginePath', 'uproject_file_path']
+
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def hash_inputs(hasher, input_paths):
+        """
+        Add the state of the input paths to a fingerprint. Files are identified by path, size and modification time.
+        Directories include every file below them.
+        :param hasher: The hashlib object to update
+        :param input_paths: List of absolute file or directory paths
+        """
+        for input_path in input_paths:
+            if os.path.isfile(input_path):
+                stat_info = os.stat(input_path)
+                hasher.update('{}|{}|{}\n'.format(input_path, stat_info.st_size, stat_info.st_mtime_ns).encode())
+            elif os.path.isdir(input_path):
+                for root, dirs, files in os.walk(input_path):
+                    dirs.sort()
+                    for file_name in sorted(files):
+                        file_path = os.path.join(root, file_name)
+                        stat_info = os.stat(file_path)
+                        hasher.update('{}|{}|{}\n'.format(file_path, stat_info.st_size,
+                                                          stat_info.st_mtime_ns).encode())
+            else:
+                hasher.update('{}|missing\n'.format(input_path).encode())
+
+    def get_fingerprint(self, action_module, kwargs, config, config_fields, input_paths):
+        """
+        Create the fingerprint of a step
+        :param action_module: The imported module of the steps action
+        :param kwargs: The arguments of the action, with tags already replaced
+        :param config: The project configuration
+        :param config_fields: Extra config fields the step depends on
+        :param input_paths: Absolute paths to files or directories the step reads
+        :return: The fingerprint hex string
+        """
+        hasher = hashlib.sha256()
+        hasher.update(action_module.__name__.encode())
+        module_file = getattr(action_module, '__file__', None)
+        if module_file is not None and os.path.isfile(module_file):
+            with open(module_file, 'rb') as fp:
+                hasher.update(fp.read())
+        hasher.update(json.dumps(kwargs, sort_keys=True, default=str).encode())
+        for field in StepCache.default_config_fields + list(config_fields):
+            hasher.update('{}={}\n'.format(field, json.dumps(getattr(config, field, None), default=str)).encode())
+        self.hash_inputs(hasher, input_paths)
+        return hasher.hexdigest()
+
+    def get_result_path(self, fingerprint):
+        return os.path.join(self.cache_dir, '{}.json'.format(fingerprint))
+
+    def load_result(self, fingerprint):
+        """
+        Load a recorded result
+        :param fingerprint: The step fingerprint
+        :return: The result dict, or None if no success was recorded for this fingerprint
+        """
+        result_path = self.get_result_path(fingerprint)
+        try:
+            with open(result_path, 'r') as fp:
+                result = json.load(fp)
+            # Mark as recently used for eviction
+            os.utime(result_path)
+            return result
+        except (IOError, ValueError):
+            return None
+
+    def save_result(self, fingerprint, result):
+        """
+        Record a successful step result and evict old results if the store is over its size cap
+        :param fingerprint: The step fingerprint
+        :param result: json serializable result dict
+        :return: True if the result could be recorded
+        """
+        try:
+            result_str = json.dumps(result, indent=4)
+        except (TypeError, ValueError):
+            return False
+        with self.lock:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            with open(self.get_result_path(fingerprint), 'w') as fp:
+                fp.write(result_str)
+            self.evict()
+        return True
+
+    def evict(self):
+        """
+        Delete the least recently used results until the store fits within max_bytes
+        """
+        entries = []
+        total_bytes = 0
+        with os.scandir(self.cache_dir) as it:
+            for entry in it:
+                if entry.is_file() and entry.name.endswith('.json'):
+                    stat_info = entry.stat()
+                    entries.append((stat_info.st_mtime, stat_info.st_size, entry.path))
+                    total_bytes += stat_info.st_size
+        entries.sort()
+        for _, size, path in entries:
+            if total_bytes <= self.max_bytes:
+                break
+            try:
+                os.unlink(path)
+                total_bytes -= size
+            except OSError:
+                pass
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+import os
+import json
+import time
+import atexit
+import threading
+import click
+from contextlib import contextmanager
+
+__author__ = "Ryan Sheffer"
+__copyright__ = "Copyright 2020, Sheffer Online Services"
+__credits__ = ["Ryan Sheffer", "VREAL"]
+
+
+class TraceSpan(object):
+    """
+    A timed section of the build. Child process CPU time and peak memory of processes run within the span
+    (or any of its child spans) are accumulated onto it.
+    """
+    def __init__(self, name, category, parent, args):
+        self.name = name
+        self.category = category
+        self.parent = parent
+        self.args = args
+        self.thread_id = threading.get_ident()
+        self.start = time.perf_counter()
+        self.end = None
+        self.child_cpu_time = 0.0
+        self.child_peak_rss = 0
+
+    def get_duration(self):
+        return (self.end if self.end is not None else time.perf_counter()) - self.start
+
+
+class Tracer(object):
+    """
+    Records spans of the build process and exports them as a Chrome trace_event file and a summary table.
+    """
+    def __init__(self):
+        self.spans = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+        self.start = time.perf_counter()
+        self.output_path = ''
+        self.exit_registered = False
+
+    def reset(self):
+        """
+        Forget the recorded spans and the trace file to write, for processes which run several builds
+        """
+        with self.lock:
+            self.spans = []
+        self.start = time.perf_counter()
+        self.output_path = ''
+
+    def current_span(self):
+        """
+        :return: The innermost open span on this thread, or None
+        """
+        stack = getattr(self.local, 'stack', None)
+        return stack[-1] if stack else None
+
+    @contextmanager
+    def span(self, name, category='build', parent=None, **args):
+        """
+        Record a span for the duration of the with block
+        :param name: The name of the span
+        :param category: The category of the span, ex. step, process
+        :param parent: The parent span, defaults to the current span of this thread. Pass this when starting spans
+                       on worker threads so their process usage is also added to the span that started them.
+        :param args: Extra information to store with the span
+        """
+        if not hasattr(self.local, 'stack'):
+            self.local.stack = []
+        if parent is None:
+            parent = self.current_span()
+        trace_span = TraceSpan(name, category, parent, args)
+        with self.lock:
+            self.spans.append(trace_span)
+        self.local.stack.append(trace_span)
+        try:
+            yield trace_span
+        finally:
+            trace_span.end = time.perf_counter()
+            self.local.stack.pop()
+
+    def add_process_usage(self, cpu_time, peak_rss):
+        """
+        Add the resource usage of a finished child process to the current span and all its parents
+        :param cpu_time: User + system CPU seconds of the process, None if unknown
+        :param peak_rss: Peak resident memory of the process in bytes, None if unknown
+        """
+        trace_span = self.current_span()
+        with self.lock:
+            while trace_span is not None:
+                if cpu_time is not None:
+                    trace_span.child_cpu_time += cpu_time
+                if peak_rss is not None:
+                    trace_span.child_peak_rss = max(trace_span.child_peak_rss, peak_rss)
+                trace_span = trace_span.parent
+
+    def write_chrome_trace(self, file_path):
+        """
+        Write all spans as a Chrome trace_event json file. Open it in chrome://tracing or https://ui.perfetto.dev
+        :param file_path: The file to write
+        """
+        pid = os.getpid()
+        events = []
+        with self.lock:
+            spans = list(self.spans)
+        for trace_span in spans:
+            args = dict(trace_span.args)
+            args['child_cpu_time_s'] = round(trace_span.child_cpu_time, 3)
+            args['child_peak_rss_mb'] = round(trace_span.child_peak_rss / (1024 * 1024), 1)
+            events.append({'name': trace_span.name,
+                           'cat': trace_span.category,
+                           'ph': 'X',
+                           'ts': int((trace_span.start - self.start) * 1000000),
+                           'dur': int(trace_span.get_duration() * 1000000),
+                           'pid': pid,
+                           'tid': trace_span.thread_id,
+                           'args': args})
+        os.makedirs(os.path.dirname(os.path.abspath(file_path)), exist_ok=True)
+        with open(file_path, 'w') as fp:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, fp, indent=1)
+
+    def print_summary(self):
+        """
+        Print a flat table of spans grouped by name, slowest first
+        """
+        totals = {}
+        with self.lock:
+            spans = list(self.spans)
+        for trace_span in spans:
+            key = (trace_span.category, trace_span.name)
+            if key not in totals:
+                totals[key] = [0, 0.0, 0.0, 0]
+            totals[key][0] += 1
+            totals[key][1] += trace_span.get_duration()
+            totals[key][2] += trace_span.child_cpu_time
+            totals[key][3] = max(totals[key][3], trace_span.child_peak_rss)
+
+        rows = sorted(totals.items(), key=lambda item: item[1][1], reverse=True)
+        click.secho('\n{:<10} {:<50} {:>5} {:>10} {:>10} {:>10}'.format('Category', 'Span', 'Count', 'Wall (s)',
+                                                                      'CPU (s)', 'RSS (MB)'))
+        for (category, name), (count, wall, cpu, rss) in rows:
+            click.secho('{:<10} {:<50} {:>5} {:>10.2f} {:>10.2f} {:>10.1f}'.format(category[:10], name[:50], count,
+                                                                                 wall, cpu, rss / (1024 * 1024)))
+
+    def write_on_exit(self, file_path):
+        """
+        Write the trace and print the summary when the program exits, including exits from failed builds
+        :param file_path: The Chrome trace file to write
+        """
+        if not self.exit_registered:
+            atexit.register(self.finish)
+            self.exit_registered = True
+        self.output_path = file_path
+
+    def finish(self):
+        if self.output_path == '':
+            return
+        self.print_summary()
+        self.write_chrome_trace(self.output_path)
+        click.secho('\nTrace written to {}'.format(self.output_path))
+
+
+# The tracer of this build process
+tracer = Tracer()